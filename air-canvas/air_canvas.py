@@ -29,6 +29,8 @@ from mediapipe.tasks.python.vision import (
     RunningMode,
 )
 
+from camera_probe import open_camera
+
 # ─── Configuration ──────────────────────────────────────────────────────────
 # Color hotkeys: 2 fingers → Green, 3 → Red, 4 → Blue
 GESTURE_COLORS = {
@@ -55,6 +57,49 @@ DETECT_EVERY_N = 2
 MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hand_landmarker.task")
 
 
+# ─── Frame Buffers ──────────────────────────────────────────────────────────
+class FrameBuffers:
+    """
+    Per-frame arrays allocated once (again only if the frame size changes)
+    and filled in place with dst=/out=, so the loop allocates no full-size
+    images: capture, mirrored frame, RGB copy for MediaPipe, canvas mask.
+    """
+
+    def __init__(self):
+        self.capture = None
+        self.flipped = None
+        self.rgb = None
+        self.mask = None
+
+    def _ensure(self, shape):
+        if self.flipped is None or self.flipped.shape != shape:
+            self.flipped = np.empty(shape, dtype=np.uint8)
+            self.rgb = np.empty(shape, dtype=np.uint8)
+            self.mask = np.empty(shape[:2], dtype=bool)
+
+    def read(self, cap):
+        success, frame = cap.read() if self.capture is None else cap.read(self.capture)
+        if success:
+            self.capture = frame
+        return success, frame
+
+    def flip(self, frame):
+        self._ensure(frame.shape)
+        cv2.flip(frame, 1, dst=self.flipped)
+        return self.flipped
+
+    def to_rgb(self, frame):
+        self._ensure(frame.shape)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+        return self.rgb
+
+    def overlay(self, frame, canvas):
+        """Copy every non-black canvas pixel onto frame."""
+        self._ensure(frame.shape)
+        np.any(canvas, axis=2, out=self.mask)
+        np.copyto(frame, canvas, where=self.mask[..., None])
+
+
 # ─── Hand Detector ──────────────────────────────────────────────────────────
 class HandDetector:
     _CONNECTIONS = (
@@ -67,7 +112,7 @@ class HandDetector:
     )
     _TIP_IDS = frozenset((4, 8, 12, 16, 20))
 
-    def __init__(self, detection_conf=0.45, presence_conf=0.45, tracking_conf=0.4):
+    def __init__(self, detection_conf=0.45, presence_conf=0.45, tracking_conf=0.4, buffers=None):
         if not os.path.exists(MODEL_PATH):
             raise FileNotFoundError(
                 f"Hand landmarker model not found at {MODEL_PATH}\n"
@@ -88,11 +133,14 @@ class HandDetector:
         self.landmarker = HandLandmarker.create_from_options(options)
         self.landmarks = []
         self.handedness = "Right"
+        self.buffers = buffers or FrameBuffers()
         self._start_time = time.time()
 
     def detect(self, frame):
         h, w = frame.shape[:2]
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        # Converted into the shared RGB buffer; detect_for_video is synchronous,
+        # so the buffer is free again by the next frame
+        rgb = self.buffers.to_rgb(frame)
         mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
 
         ts_ms = int((time.time() - self._start_time) * 1000)
@@ -190,17 +238,15 @@ def draw_cursor(frame, pos, color, size, mode):
 
 # ─── Main ───────────────────────────────────────────────────────────────────
 def main():
-    cap = cv2.VideoCapture(0)
+    # Best backend / format / size / rate for this webcam, probed once and cached
+    cap = open_camera(0)
     if not cap.isOpened():
         print("ERROR: Cannot open webcam.")
         return
 
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-    cap.set(cv2.CAP_PROP_FPS, 60)
-    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-
-    detector = HandDetector(detection_conf=0.45, presence_conf=0.45, tracking_conf=0.4)
+    buffers = FrameBuffers()
+    detector = HandDetector(detection_conf=0.45, presence_conf=0.45, tracking_conf=0.4,
+                            buffers=buffers)
 
     canvas = None
     prev_x, prev_y = 0, 0
@@ -224,11 +270,11 @@ def main():
 
     try:
         while True:
-            success, frame = cap.read()
+            success, frame = buffers.read(cap)
             if not success:
                 break
 
-            frame = cv2.flip(frame, 1)
+            frame = buffers.flip(frame)
             h, w = frame.shape[:2]
 
             if canvas is None:
@@ -334,9 +380,8 @@ def main():
 
             prev_mode = mode
 
-            # ── Merge canvas onto frame (single-pass with numpy) ──────
-            mask = np.any(canvas != 0, axis=2)
-            frame[mask] = canvas[mask]
+            # ── Merge canvas onto frame (in place, preallocated mask) ─
+            buffers.overlay(frame, canvas)
 
             # ── UI ────────────────────────────────────────────────────
             mode_display = {
@@ -0,0 +1,286 @@
+"""
+Camera probe - find the capture settings a webcam really delivers.
+
+Asking for 1280x720@60 is only a request: many webcams silently fall back
+to 30 fps YUYV at that size, or reach 60 fps only with MJPG. The probe
+tries backend x FOURCC x resolution x frame-rate combinations, reads back
+what the driver actually negotiated, measures the delivered fps and the
+time each read blocks, and keeps the best one per device in
+camera_config.json. open_camera() applies the cached choice at startup
+(probing on first use, or again when the cached settings stop working).
+A startup probe that runs out of PROBE_BUDGET saves its best result so far
+marked incomplete, and the next start continues the sweep where it stopped.
+
+Usage:
+  python camera_probe.py              probe device 0 and print the results
+  python camera_probe.py --device 1   probe another device
+  python camera_probe.py --list       list the devices that open
+"""
+
+import json
+import os
+import sys
+import time
+
+import cv2
+
+# ─── Configuration ──────────────────────────────────────────────────────────
+TARGET_SIZE = (1280, 720)
+TARGET_FPS = 60
+
+RESOLUTIONS = ((1280, 720), (960, 540), (640, 480))
+FRAME_RATES = (60, 30)
+FOURCCS = ("MJPG", "YUYV")
+
+MAX_DEVICES = 5
+WARMUP_FRAMES = 5
+BENCH_FRAMES = 45
+BENCH_SECONDS = 1.5
+GOOD_ENOUGH_FPS = 0.9        # fraction of TARGET_FPS that ends the probe early at full size
+PROBE_BUDGET = 15.0          # seconds the startup probe may take; the best result so far wins
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "camera_config.json")
+
+
+def _backends():
+    """Capture backends worth trying on this platform, preferred first."""
+    if sys.platform == "win32":
+        names = ("CAP_DSHOW", "CAP_MSMF")
+    elif sys.platform == "darwin":
+        names = ("CAP_AVFOUNDATION",)
+    else:
+        names = ("CAP_V4L2",)
+    return [(name[4:], getattr(cv2, name)) for name in names if hasattr(cv2, name)] + [("ANY", cv2.CAP_ANY)]
+
+
+def _fourcc_str(value):
+    value = int(value)
+    return "".join(chr((value >> 8 * i) & 0xFF) for i in range(4)).strip("\0") or "?"
+
+
+# ─── Probing ────────────────────────────────────────────────────────────────
+def list_devices(max_devices=MAX_DEVICES):
+    """Indices of the capture devices that open and deliver a frame."""
+    found = []
+    for index in range(max_devices):
+        cap = cv2.VideoCapture(index, _backends()[0][1])
+        try:
+            if cap.isOpened() and cap.read()[0]:
+                found.append(index)
+        finally:
+            cap.release()
+    return found
+
+
+def _open(index, backend, fourcc, width, height, fps):
+    cap = cv2.VideoCapture(index, backend)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    # FOURCC first: some drivers only accept the size once the format is set
+    cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    cap.set(cv2.CAP_PROP_FPS, fps)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+def _benchmark(cap):
+    """(delivered fps, mean ms a read blocks, frame width, frame height), or None if reads fail."""
+    frame = None
+    for _ in range(WARMUP_FRAMES):
+        ok, frame = cap.read(frame) if frame is not None else cap.read()
+        if not ok:
+            return None
+    frames, blocked = 0, 0.0
+    start = time.perf_counter()
+    while frames < BENCH_FRAMES and time.perf_counter() - start < BENCH_SECONDS:
+        t = time.perf_counter()
+        ok, frame = cap.read(frame)
+        if not ok:
+            return None
+        blocked += time.perf_counter() - t
+        frames += 1
+    elapsed = time.perf_counter() - start
+    h, w = frame.shape[:2]
+    return frames / elapsed, blocked / frames * 1000, w, h
+
+
+def _score(result):
+    """Sort key: frame rate up to the target first, then size up to the target, then latency."""
+    pixels = min(result["width"] * result["height"], TARGET_SIZE[0] * TARGET_SIZE[1])
+    return (round(min(result["measured_fps"], TARGET_FPS)), pixels, -result["latency_ms"])
+
+
+def _candidates():
+    return [(backend_name, backend, fourcc, width, height, fps)
+            for backend_name, backend in _backends()
+            for width, height in RESOLUTIONS
+            for fps in FRAME_RATES
+            for fourcc in FOURCCS]
+
+
+def probe(index=0, verbose=False):
+    """Benchmark every candidate setting of device `index`; returns the results, best first."""
+    return _sweep(index, verbose)[0]
+
+
+def _sweep(index, verbose=False, budget=None, start=0):
+    """
+    Benchmark the candidates from position `start`; returns (results best
+    first, position to continue from, or None once the sweep is complete).
+    With a `budget` (seconds) no new candidate starts after it.
+    """
+    results, seen, unusable = [], set(), set()
+    deadline = time.perf_counter() + budget if budget is not None else None
+    candidates = _candidates()
+    for position in range(start, len(candidates)):
+        if deadline is not None and time.perf_counter() >= deadline:
+            return sorted(results, key=_score, reverse=True), position
+        backend_name, backend, fourcc, width, height, fps = candidates[position]
+        if backend_name in unusable:
+            continue
+        cap = _open(index, backend, fourcc, width, height, fps)
+        if cap is None:
+            unusable.add(backend_name)          # this backend cannot open the device
+            continue
+        try:
+            actual = (cap.getBackendName(), _fourcc_str(cap.get(cv2.CAP_PROP_FOURCC)),
+                      int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                      round(cap.get(cv2.CAP_PROP_FPS)))
+            if actual in seen:
+                continue                        # the driver fell back to a mode already measured
+            seen.add(actual)
+            bench = _benchmark(cap)
+        finally:
+            cap.release()
+        if bench is None:
+            continue
+        measured_fps, latency_ms, w, h = bench
+        result = {
+            "backend": backend_name, "fourcc": fourcc,
+            "requested": [width, height, fps],
+            "negotiated_fourcc": actual[1], "width": w, "height": h,
+            "reported_fps": actual[4],
+            "measured_fps": round(measured_fps, 1), "latency_ms": round(latency_ms, 1),
+        }
+        results.append(result)
+        if verbose:
+            _print_result(result)
+        if (w, h) == TARGET_SIZE and measured_fps >= TARGET_FPS * GOOD_ENOUGH_FPS:
+            break                               # nothing can beat the target mode
+    return sorted(results, key=_score, reverse=True), None
+
+
+def _print_result(r):
+    print(f"  {r['backend']:<6} {r['fourcc']:<4} asked {r['requested'][0]}x{r['requested'][1]}@{r['requested'][2]}"
+          f" -> {r['negotiated_fourcc']:<4} {r['width']}x{r['height']}"
+          f"  {r['measured_fps']:5.1f} fps  {r['latency_ms']:5.1f} ms/read")
+
+
+# ─── Cache ──────────────────────────────────────────────────────────────────
+def _load_cache():
+    try:
+        with open(CACHE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache):
+    try:
+        with open(CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"Could not save camera settings: {e}")
+
+
+def _remember(index, result, resume_at=None):
+    """Cache `result` for device `index`; `resume_at` marks a sweep cut short by the budget."""
+    cache = _load_cache()
+    best = dict(result, probed_at=int(time.time()), complete=resume_at is None)
+    best.pop("resume_at", None)
+    if resume_at is not None:
+        best["resume_at"] = resume_at
+    cache[str(index)] = best
+    _save_cache(cache)
+    return best
+
+
+def best_config(index=0, reprobe=False):
+    """The cached best settings for device `index`, probing (and caching) them when needed."""
+    cached = _load_cache().get(str(index))
+    if cached and not reprobe and cached.get("complete", True):
+        return cached
+    start, earlier = 0, []
+    if cached and not reprobe:
+        start, earlier = cached.get("resume_at", 0), [cached]
+        print(f"Continuing the camera {index} probe (up to {PROBE_BUDGET:.0f} s)...")
+    else:
+        print(f"Probing camera {index} (first run only, up to {PROBE_BUDGET:.0f} s)...")
+    results, resume_at = _sweep(index, budget=PROBE_BUDGET, start=start)
+    results = sorted(results + earlier, key=_score, reverse=True)
+    if not results:
+        return None
+    best = _remember(index, results[0], resume_at)
+    print(f"Camera {index}: {best['backend']} {best['negotiated_fourcc']} {best['width']}x{best['height']}"
+          f" at {best['measured_fps']} fps" + ("" if resume_at is None else " (probe continues next start)"))
+    return best
+
+
+def _open_config(index, config):
+    backend = dict(_backends()).get(config["backend"], cv2.CAP_ANY)
+    w, h, fps = config["requested"]
+    cap = _open(index, backend, config["fourcc"], w, h, fps)
+    if cap is not None and not cap.read()[0]:
+        cap.release()
+        return None
+    return cap
+
+
+def open_camera(index=0):
+    """
+    VideoCapture for device `index` with its best probed settings.
+    Re-probes once when the cached settings no longer deliver frames, and
+    falls back to a plain 1280x720@60 request when probing finds nothing.
+    """
+    config = best_config(index)
+    if config is not None:
+        cap = _open_config(index, config)
+        if cap is None:
+            config = best_config(index, reprobe=True)
+            cap = _open_config(index, config) if config is not None else None
+        if cap is not None:
+            return cap
+    # Nothing usable was probed: make the plain request and take what comes
+    cap = cv2.VideoCapture(index)
+    if cap.isOpened():
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, TARGET_SIZE[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, TARGET_SIZE[1])
+        cap.set(cv2.CAP_PROP_FPS, TARGET_FPS)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+# ─── CLI ────────────────────────────────────────────────────────────────────
+def main():
+    args = sys.argv[1:]
+    if "--list" in args:
+        devices = list_devices()
+        print("Cameras: " + (", ".join(map(str, devices)) if devices else "none found"))
+        return
+    index = int(args[args.index("--device") + 1]) if "--device" in args else 0
+    print(f"Probing camera {index}...")
+    results = probe(index, verbose=True)
+    if not results:
+        print("No working configuration found.")
+        return
+    _remember(index, results[0])
+    print("Best:")
+    _print_result(results[0])
+    print(f"Saved to {CACHE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
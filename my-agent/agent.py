@@ -0,0 +1,134 @@
+"""
+agent.py — Command-line client: hand a task to the running agent.
+
+Usage:
+    python agent.py "open notepad and type hello"
+    python agent.py --quiet "what's the weather in Tel Aviv?"
+
+The task is sent over local IPC (ipc.py) to the tray instance, which
+already has Qt, the API client and the input stack loaded, so it starts
+at once. Progress is streamed to stderr and the final reply is printed to
+stdout. Ctrl+C cancels the task.
+
+If no instance is running, main.py is started in the background first
+(--no-start disables this).
+
+Exit status: 0 done · 1 failed · 2 agent unreachable · 130 cancelled
+
+This script imports only the standard library and ipc.py, so it starts in
+milliseconds. Keep it that way — no Qt, anthropic or pyautogui here.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import ipc
+
+HERE = Path(__file__).parent
+START_TIMEOUT = 30.0   # seconds to wait for a freshly launched instance
+
+_EXIT_CODES = {"done": 0, "failed": 1, "cancelled": 130}
+
+
+def _launch_instance() -> None:
+    """Start main.py detached from this console, without a console window on Windows."""
+    python = Path(sys.executable)
+    pythonw = python.with_name("pythonw.exe")
+    if os.name == "nt":
+        exe = pythonw if pythonw.exists() else python
+        flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        subprocess.Popen([str(exe), "main.py"], cwd=HERE, creationflags=flags, close_fds=True)
+    else:
+        subprocess.Popen([str(python), "main.py"], cwd=HERE, start_new_session=True,
+                         stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _refused() -> bool:
+    """True only if the port actively refuses connections, i.e. no instance is alive."""
+    try:
+        socket.create_connection((ipc.HOST, ipc.PORT), timeout=2.0).close()
+    except ConnectionRefusedError:
+        return True
+    except OSError:
+        return False   # a timeout or the like: an instance may be alive but busy
+    return False
+
+
+def _ensure_instance() -> None:
+    if _refused():
+        try:
+            ipc.TOKEN_FILE.unlink()   # stale: nothing is listening
+        except OSError:
+            pass
+        _launch_instance()
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if ipc.TOKEN_FILE.exists():
+            try:
+                sock, stream, _ = ipc.connect(timeout=0.5)
+            except ipc.NotRunning:
+                pass
+            else:
+                stream.close()
+                sock.close()
+                return
+        time.sleep(0.1)
+    raise ipc.IpcError(f"The agent did not start within {START_TIMEOUT:.0f} s.")
+
+
+def _print_progress(event: dict) -> None:
+    kind = event.get("event")
+    if kind == "queued":
+        print(f"[task {event.get('task')}] queued", file=sys.stderr, flush=True)
+    elif kind == "state":
+        print(f"[task {event.get('task')}] {event.get('state')}", file=sys.stderr, flush=True)
+    elif kind == "action":
+        print(f"  ⚙ {event.get('text', '')}", file=sys.stderr, flush=True)
+    elif kind == "error":
+        print(f"  ✖ {event.get('text', '')}", file=sys.stderr, flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("task", nargs="+", help="what the agent should do")
+    parser.add_argument("--quiet", "-q", action="store_true", help="print only the final reply")
+    parser.add_argument("--json", action="store_true", help="print the final result as JSON")
+    parser.add_argument("--no-start", action="store_true", help="fail instead of starting main.py")
+    args = parser.parse_args()
+    text = " ".join(args.task)
+
+    on_event = None if args.quiet or args.json else _print_progress
+    try:
+        try:
+            result = ipc.run_task(text, on_event)
+        except ipc.NotRunning:
+            if args.no_start:
+                raise
+            if on_event is not None:
+                print("Starting the agent…", file=sys.stderr, flush=True)
+            _ensure_instance()
+            result = ipc.run_task(text, on_event)
+    except ipc.IpcError as e:
+        print(f"agent: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        print("\nagent: cancelled", file=sys.stderr)
+        return 130
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    elif result.get("result"):
+        print(result["result"])
+    elif result.get("error"):
+        print(result["error"], file=sys.stderr)
+    return _EXIT_CODES.get(result.get("state"), 1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,21 +3,86 @@ agent_core.py — Reasoning loop.
 
 The AgentWorker thread implements the full perception → reasoning → action cycle:
 
-  1. User sends a message
-  2. Thread wakes up, clears the abort flag
+  1. User sends a message → it becomes a Task in the worker's FIFO (tasks.py)
+  2. Thread takes the next task, clears the abort flag
   3. Reasoning loop:
-       a. Send conversation history + tool schema to Claude
+       a. Send conversation history + the task's tool subset to Claude
        b. If Claude calls a tool  → execute it via tools.py (which delegates to
           vision.py or controller.py) → feed result back → repeat
        c. If Claude returns text  → emit to UI → done
-  4. Any AbortedError (fail-safe triggered) surfaces as a red error bubble in the UI
+  4. Any AbortedError (fail-safe or Stop button) surfaces as a red error bubble
+     in the UI; a fail-safe abort also drops every queued task
+  5. Thread moves straight on to the next queued task, or sleeps until one arrives
+
+The thread hosts an asyncio event loop: one long-lived AsyncAnthropic client
+(api_client.py) with retry/backoff and deadlines, and tools run as awaitables
+in worker threads so consecutive read-only tools overlap.
+
+Only part of the tool schema is sent per request (tools.TOOL_GROUPS): the
+core group, the groups intent.py predicts from the request, any group the
+model loads with request_tools, and every group already used in the
+conversation. Each request's schema size and token usage go to telemetry.
+
+Each step's model and max_tokens come from routing.py: a fast tier sized
+to the kind of step (plan, act, verify, recover), escalating to a strong
+tier on truncation, repeated tool errors or a give-up reply.
+
+Each finished task is appended to the current session's log (sessions.py)
+unless AGENT_SESSIONS=off; resume() reopens a saved session, loading its
+history on the worker thread before the next task and its screenshots
+only when a request needs them.
+
+Screenshots live in a content-addressed ScreenshotStore (screenshots.py);
+the history holds references that are Base64-encoded only while a request
+is being sent. With the screen watcher on (watcher.py), a full-screen
+take_screenshot returns the watcher's pre-encoded frame when it is newer
+than the last action, and a frame identical to the previous one is
+answered with a short text instead of the image.
 """
 
-import anthropic
-from PyQt6.QtCore import QThread, pyqtSignal
-
-from controller import AbortedError, FailSafeListener, reset_abort
-from tools import TOOL_DEFINITIONS, TOOL_FUNCTIONS
+import asyncio
+import time
+
+from PyQt6.QtCore import QThread, Qt, pyqtSignal
+
+from api_client import create_message, make_async_client
+from config import get_setting
+
+from controller import (
+    EMERGENCY_REASONS,
+    FAIL_SAFE_REASON,
+    AbortedError,
+    FailSafeListener,
+    active_window_title,
+    check_abort,
+    is_aborted,
+    request_abort,
+    reset_abort,
+    set_coordinate_origin,
+)
+import sessions
+from budget import Preflight, TokenBudget
+from compaction import compact
+import telemetry
+import verify
+from intent import needs_screen, predict_tool_groups
+from macros import MacroStore
+from perception import invalidate as invalidate_perception
+from routing import FAST_MODEL, STRONG_MODEL, Route, Router, gave_up
+from tasks import CANCELLED, DONE, FAILED, RUNNING, Task, TaskQueue
+from tools import (
+    COMPACTED_TOOLS,
+    FULL_SCHEMA_TOKENS,
+    READ_ONLY_TOOLS,
+    TOOL_FUNCTIONS,
+    TOOL_GROUPS,
+    estimate_tokens,
+    group_of,
+    select_tools,
+)
+from screenshots import ScreenshotStore
+from vision import capture_png
+from watcher import ScreenWatcher
 
 SYSTEM_PROMPT = """You are an autonomous Windows 11 AI agent on an i7-14700KF / RTX system.
 You PLAN silently then ACT immediately. Never ask permission between steps. Never say "I will now..." and wait.
@@ -25,30 +90,37 @@ You PLAN silently then ACT immediately. Never ask permission between steps. Neve
 ════ EXECUTION MODEL ════
 1. THINK: Silently form the complete plan.
 2. ACT: Run the full sequence as one uninterrupted flow.
-3. VERIFY: ONE final screenshot to confirm success.
+3. VERIFY: confirm success with verify(checks=[...]) — window, process, file, clipboard
+   or screen-region checks run locally and answer in text. Take a final screenshot only
+   when success can't be expressed as such a check.
+
+════ GOLDEN RULE: ONE run_actions CALL PER TASK ════
+Batch the ENTIRE UI sequence into a single run_actions call. Example:
 
-════ GOLDEN RULE: ONE run_command CALL PER TASK ════
-Batch the ENTIRE sequence into a single Python script. Example:
+  run_actions(steps=[
+    {"type": "hotkey", "keys": ["ctrl", "t"]}, {"type": "wait", "seconds": 0.5},
+    {"type": "hotkey", "keys": ["ctrl", "l"]},
+    {"type": "paste", "text": "https://youtube.com/results?search_query=jjk"},
+    {"type": "press", "key": "enter"}
+  ])
 
-  run_command('python -c "
-import pyautogui, pyperclip, time
-pyautogui.PAUSE = 0.02
-pyperclip.copy(\'https://youtube.com/results?search_query=jjk\')
-pyautogui.hotkey(\'ctrl\', \'t\'); time.sleep(0.5)
-pyautogui.hotkey(\'ctrl\', \'l\'); time.sleep(0.2)
-pyautogui.hotkey(\'ctrl\', \'v\'); time.sleep(0.1)
-pyautogui.press(\'enter\'); time.sleep(2)
-"')
+Use wait_for_window instead of fixed waits after launching an app.
+Use run_command only for real shell work (launching programs, files, scripts).
 
 ════ SCREENSHOT RULE ════
 • ONE screenshot at the start (see current state)
-• ONE screenshot at the end (confirm goal achieved)
-• ZERO screenshots in between — trust the code
+• At the end: verify first; a screenshot only if verify can't tell
+• ZERO screenshots in between — trust the actions
 
-════ COORDINATE SAFETY ════
-Inside run_command scripts, always sanitize coordinates before use:
-  x = int(float(str(raw_x).replace(\',\',\'\').split()[0]))
-  y = int(float(str(raw_y).replace(\',\',\'\').split()[0]))
+════ FINDING THINGS ON SCREEN ════
+To locate a button/link/label, call find_on_screen('Label') first — it answers locally
+in milliseconds. Fall back to take_screenshot only if it finds nothing.
+
+════ MORE TOOLS ════
+If a tool you need is not listed, load its group with request_tools(groups=[...]):
+mouse, keyboard, windows, search, files.
+Long run_command / search_web output comes back compacted (head, tail, errors);
+page through the full text with read_output and the handle it names.
 
 ════ WINDOW RULES ════
 • count_windows('App') → 0: open it | 1: focus_window | >1: close_duplicate_windows
@@ -56,148 +128,671 @@ Inside run_command scripts, always sanitize coordinates before use:
   run_command('python -c "import pygetwindow as g; w=g.getWindowsWithTitle(\\'Chrome\\')[0]; w.restore(); w.moveTo(0,0); w.maximize()"')
 
 ════ TEXT INPUT ════
-Always use pyperclip.copy(text) + ctrl+v. Never pyautogui.write(). Bypasses Hebrew keyboard.
+Always use a "paste" step (clipboard + ctrl+v). Never type key-by-key. Bypasses Hebrew keyboard.
 
 ════ FILE OPERATIONS ════
-Write: run_command('python -c "open(r\'C:\\\\Users\\\\User\\\\Desktop\\\\out.txt\',\'w\').write(\'content\')"')
-Read:  run_command('type "C:\\\\path\\\\file.txt"')
-Find:  run_command('dir /s /b "C:\\\\Users\\\\User" 2>nul | findstr /i resume')
+Write: write_file(path='C:\\\\Users\\\\User\\\\Desktop\\\\out.txt', content='...')
+Read:  read_file(path=...) — large files: grep_file(path, pattern) first, then read_file(start_line=, end_line=)
+Find:  find_files(query='resume') or find_files(ext='pdf', under='C:\\\\Users\\\\User\\\\Downloads')
+       — a local index; never walk the disk with dir /s | findstr
+
+════ FINAL REPLY ════
+If the task cannot be done, start the final reply with "FAILED:" and say why.
 
 FAIL-SAFE: mouse to any screen corner = immediate abort."""
 
 MAX_TOOL_ITERATIONS = 25  # enough to finish any real task
+ABORT_POLL_INTERVAL = 0.05  # seconds between abort-flag checks while awaiting
 
+# Speculative first screenshot (AGENT_SPECULATIVE_SCREENSHOT in .env):
+#   off    — never; the model asks for take_screenshot itself (default)
+#   auto   — attach one unless the request looks purely textual (intent.needs_screen)
+#   always — attach one to every task
+SPECULATIVE_MODES = ("off", "auto", "always")
+
+# Tool schema per request (AGENT_TOOL_PROFILE in .env):
+#   dynamic — core group plus the groups the task needs (default)
+#   full    — every tool on every request
+TOOL_PROFILES = ("dynamic", "full")
+
+# A resumed session loads its last sessions.PAGE_TURNS turns, then older pages while the
+# history text stays under this share of the input budget; older turns stay on disk
+RESUME_HISTORY_SHARE = 0.5
+
+WATCHER_WAIT = 1.0  # seconds take_screenshot waits for a post-action frame before capturing itself
 
-class AgentWorker(QThread):
-    message_signal = pyqtSignal(str)  # Final text response from Claude
-    action_signal  = pyqtSignal(str)  # Per-tool status shown in the UI
-    error_signal   = pyqtSignal(str)  # Error / abort messages
-    done_signal    = pyqtSignal()     # Emitted when the loop exits (success or error)
 
-    def __init__(self, api_key: str, parent=None):
+class AgentWorker(QThread):
+    message_signal = pyqtSignal(str)       # Final text response from Claude
+    action_signal  = pyqtSignal(str)       # Per-tool status shown in the UI
+    error_signal   = pyqtSignal(str)       # Error / abort messages
+    done_signal    = pyqtSignal()          # Emitted when a task finishes (success or error)
+    task_signal    = pyqtSignal(int, str)  # (task id, new state) on every transition
+    queue_signal   = pyqtSignal(int)       # Unfinished tasks (queued + running)
+
+    def __init__(self, api_key: str, parent=None, fail_safe: bool = True):
         super().__init__(parent)
-        self.client  = anthropic.Anthropic(api_key=api_key)
+        self._api_key = api_key
+        self.client = None             # AsyncAnthropic, created on the worker's event loop
         self.history: list[dict] = []
-        self._user_message = ""
-
-        # Start the fail-safe mouse listener immediately
-        self._fail_safe = FailSafeListener()
-        self._fail_safe.start()
+        self.screenshots = ScreenshotStore(load=sessions.load_image)   # PNG bytes referenced from self.history
+        self.tasks = TaskQueue(prepare=self._prepare)
+        self._reset_requested = False
+        self._resume_requested: str | None = None
+        # Session persistence (AGENT_SESSIONS=off disables; batch.py turns it off per worker)
+        self.persist = get_setting("AGENT_SESSIONS", "on").lower() != "off"
+        self.session: sessions.SessionLog | None = None   # created with the first saved turn
+        self._bubbles: list[list[str]] = []                # transcript of the running task
+        self._last_finished = 0.0      # monotonic time the previous task ended
+        mode = get_setting("AGENT_SPECULATIVE_SCREENSHOT", "off").lower()
+        self.speculative_screenshot = mode if mode in SPECULATIVE_MODES else "off"
+        # Learned macros (AGENT_MACROS=off in .env disables record and replay)
+        self.macros = MacroStore() if get_setting("AGENT_MACROS", "on").lower() != "off" else None
+        profile = get_setting("AGENT_TOOL_PROFILE", "dynamic").lower()
+        self.tool_profile = profile if profile in TOOL_PROFILES else "dynamic"
+        self.routing_policy = get_setting("AGENT_ROUTING", "tiered").lower()
+        self.fast_model = get_setting("AGENT_MODEL_FAST", FAST_MODEL)
+        self.strong_model = get_setting("AGENT_MODEL_STRONG", STRONG_MODEL)
+        # Input-token estimates, request trimming and adaptive max_tokens (budget.py)
+        self.budget = TokenBudget()
+        self._tool_groups: set[str] = set()      # optional groups loaded for the running task
+        self._history_groups: set[str] = set()   # groups of tools already called in self.history
+        # Headless runs (batch.py) restrict a task to tools that never touch the desktop
+        self.allowed_tools: frozenset[str] | None = None
+        # Per-task accounting, reset as each task starts: API usage and one entry per tool call
+        self.usage = {"requests": 0, "input_tokens": 0, "output_tokens": 0}
+        self.trace: list[dict] = []
+        # Screen pixel of the top-left corner of the last screenshot the model
+        # saw — (0, 0) unless it was a region/window/monitor-scoped capture
+        self.capture_origin: tuple[int, int] = (0, 0)
+        # Background screen watcher (AGENT_SCREEN_WATCHER=on): full-screen
+        # take_screenshot calls reuse its latest frame when it is fresh enough
+        self.watcher = ScreenWatcher() if get_setting("AGENT_SCREEN_WATCHER", "off").lower() == "on" else None
+        self._last_action_at = 0.0      # monotonic time the last screen-changing tool returned
+        self._last_full_digest = None   # last full-screen image sent in the running task
+
+        # Start the fail-safe mouse listener immediately (batch.py runs one for all its workers)
+        self._fail_safe = FailSafeListener(hotkey=get_setting("AGENT_ABORT_HOTKEY", "")) if fail_safe else None
+        if self._fail_safe is not None:
+            self._fail_safe.start()
+
+        # Record the running task's chat bubbles as they are emitted (worker thread)
+        direct = Qt.ConnectionType.DirectConnection
+        self.message_signal.connect(lambda text: self._bubbles.append(["agent", text]), direct)
+        self.error_signal.connect(lambda text: self._bubbles.append(["error", text]), direct)
 
     # ── Public API ────────────────────────────────────────────────────────────
 
-    def send_message(self, message: str) -> None:
-        """Queue a user message and start the worker thread."""
-        reset_abort()                  # clear any previous abort flag
-        self._user_message = message
+    def send_message(self, message: str) -> int:
+        """Queue a user message as a new task and return its ID."""
+        task = self.tasks.submit(message)
+        self.task_signal.emit(task.id, task.state)
+        self.queue_signal.emit(len(self.tasks))
         if not self.isRunning():
             self.start()
+        return task.id
+
+    def cancel(self, task_id: int | None = None) -> None:
+        """Cancel a queued task by ID, or the running task (no ID)."""
+        task = self.tasks.cancel(task_id)
+        if task is None:
+            return
+        if task is self.tasks.current:
+            request_abort()             # running: unwinds at the next abort check
+        else:
+            self.task_signal.emit(task.id, task.state)
+            self.queue_signal.emit(len(self.tasks))
+
+    def cancel_all(self) -> None:
+        """Drop every queued task and stop the running one."""
+        self._drop_pending()
+        if self.tasks.current is not None:
+            request_abort()
 
     def reset(self) -> None:
-        """Clear the conversation history (new chat)."""
-        self.history = []
+        """Clear the conversation history (new chat). Cancels any queued or running work."""
+        self.cancel_all()
+        # Applied on the worker thread before the next task, never mid-loop
+        self._reset_requested = True
+        self._resume_requested = None
+
+    def resume(self, session_id: str) -> None:
+        """Continue a saved session: its history replaces the current one before the next task."""
+        self.cancel_all()
+        self._resume_requested = session_id
+        self._reset_requested = False
+
+    def refresh_screen_geometry(self) -> None:
+        """Tell the fail-safe the monitor layout changed (connected to Qt's screen signals)."""
+        if self._fail_safe is not None:
+            self._fail_safe.refresh_geometry()
+
+    def shutdown(self, timeout_ms: int = 3000) -> None:
+        """Stop the worker thread (call on application exit)."""
+        self.cancel_all()
+        self.tasks.close()
+        if self._fail_safe is not None:
+            self._fail_safe.stop()
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.wait(timeout_ms)
+
+    async def execute(self, text: str, note: str = "") -> Task:
+        """
+        Run one task on the caller's event loop, outside the queue (headless
+        use). The caller sets self.client first. Returns the finished Task;
+        self.usage and self.trace describe the run.
+        """
+        task = Task(text)
+        task.state = RUNNING
+        task.started = time.time()
+        self.task_signal.emit(task.id, task.state)
+        state, error = await self._run_task(task, note)
+        self.tasks.finish(task, state, error)
+        self.task_signal.emit(task.id, state)
+        return task
 
     # ── Thread entry point ────────────────────────────────────────────────────
 
     def run(self) -> None:
+        asyncio.run(self._serve())
+
+    async def _serve(self) -> None:
+        self.client = make_async_client(self._api_key)
         try:
-            self._reasoning_loop(self._user_message)
-        except AbortedError:
-            self.error_signal.emit("⛔ Aborted — mouse moved to a screen corner.")
+            while True:
+                task = await asyncio.to_thread(self.tasks.next)
+                if task is None:
+                    return
+                if self._reset_requested:
+                    self._reset_requested = False
+                    self.history = []
+                    self.screenshots.clear()
+                    self._history_groups.clear()
+                    self._set_capture_origin(None)
+                    self.session = None
+                if self._resume_requested is not None:
+                    session_id, self._resume_requested = self._resume_requested, None
+                    await asyncio.to_thread(self._resume, session_id)
+
+                reset_abort()                  # clear any previous abort flag
+                self.task_signal.emit(task.id, task.state)
+                history_len = len(self.history)
+                self._bubbles = [["user", task.text]]
+                state, error = await self._run_task(task)
+                if self.persist:
+                    await asyncio.to_thread(self._save_turn, task, history_len, state)
+                self._last_finished = time.monotonic()
+                self.tasks.finish(task, state, error)
+                self.task_signal.emit(task.id, state)
+                self.done_signal.emit()
+                self.queue_signal.emit(len(self.tasks))
+        finally:
+            await self.client.close()
+
+    async def _run_task(self, task: Task, note: str = "") -> tuple[str, str]:
+        """Run one task to completion; returns (final state, error message)."""
+        history_len = len(self.history)
+        self.usage = {"requests": 0, "input_tokens": 0, "output_tokens": 0}
+        self.trace = []
+        self._last_full_digest = None
+        watching = self.watcher is not None and (
+            self.allowed_tools is None or "take_screenshot" in self.allowed_tools)
+        if watching:
+            self.watcher.resume()
+        try:
+            hit = self.macros.match(task.text) if self.macros is not None else None
+            if hit is not None:
+                ok, detail = await self._replay_macro(task, *hit)
+                if ok:
+                    return DONE, ""
+                note = "\n\n".join(filter(None, (note, (
+                    f"(A saved macro for this request was just replayed but did not verify: "
+                    f"{detail}. Check the current state and finish the task.)"))))
+            completed = await self._reasoning_loop(task, note)
+            if completed:
+                await self._learn_macro(task, history_len, stale=hit[0] if hit else None)
+            return DONE, ""
+        except AbortedError as e:
+            if str(e) in EMERGENCY_REASONS:
+                self._drop_pending()       # emergency stop: nothing else runs either
+                how = "mouse moved to a screen corner" if str(e) == FAIL_SAFE_REASON else "abort hotkey pressed"
+                self.error_signal.emit(f"⛔ Aborted — {how}.")
+            else:
+                self.error_signal.emit("⛔ Task cancelled.")
+            self._close_interrupted_turn(task, history_len, "cancelled")
+            return CANCELLED, str(e)
         except Exception as e:
             self.error_signal.emit(f"Agent error: {e}")
+            self._close_interrupted_turn(task, history_len, f"failed: {e}")
+            return FAILED, str(e)
         finally:
-            self.done_signal.emit()
+            if watching:
+                self.watcher.pause()
+
+    def _resume(self, session_id: str) -> None:
+        """
+        Swap in a saved session's history (reference blocks only; images load
+        on demand). The last page of turns is read first, then older pages
+        only while the history text stays under RESUME_HISTORY_SHARE of the
+        input budget — a long session is never read and parsed in full.
+        """
+        try:
+            reader = sessions.SessionReader(session_id)
+            start = max(len(reader) - sessions.PAGE_TURNS, 0)
+            history = reader.messages(start)
+            limit = self.budget.input_budget * RESUME_HISTORY_SHARE
+            while start and estimate_tokens(history) < limit:
+                first = max(start - sessions.PAGE_TURNS, 0)
+                history[:0] = reader.messages(first, start)
+                start = first
+        except (OSError, ValueError) as e:
+            self.error_signal.emit(f"Could not reopen the session: {e}")
+            return
+        self.history = history
+        self.screenshots.clear()
+        self._history_groups = {
+            group_of(block["name"]) for message in history if isinstance(message["content"], list)
+            for block in message["content"]
+            if isinstance(block, dict) and block.get("type") == "tool_use" and group_of(block["name"])
+        }
+        self._set_capture_origin(None)
+        self.session = sessions.SessionLog(session_id)
+
+    def _save_turn(self, task: Task, history_len: int, state: str) -> None:
+        """Append the finished task to the session log (best effort — never fails the task)."""
+        messages = self.history[history_len:]
+        try:
+            if self.session is None:
+                self.session = sessions.SessionLog()
+            self.session.append_turn(
+                task.text, state, task.started or time.time(), self._bubbles, messages,
+                sessions.turn_images(messages, self.screenshots.get),
+            )
+        except (OSError, TypeError, ValueError):
+            pass
+
+    def _close_interrupted_turn(self, task: Task, history_len: int, outcome: str) -> None:
+        """
+        Replace a half-finished exchange with a short summary so the history
+        never ends on an unanswered tool_use (which the API would reject).
+        """
+        del self.history[history_len:]
+        self.history.append({"role": "user", "content": task.text})
+        self.history.append({"role": "assistant", "content": f"(Task {outcome} before completion.)"})
+        self.screenshots.retain(self.history)
+
+    async def _replay_macro(self, task: Task, macro: dict, values: list[str]) -> tuple[bool, str]:
+        """Replay a saved macro locally; on success answer the task without the model."""
+        self.action_signal.emit(f"Replaying saved macro: {macro['template']}")
+        ok, detail = await self._abortable(asyncio.to_thread(
+            self.macros.replay, macro, values, self._run_tool, active_window_title,
+        ))
+        if ok:
+            reply = f"Done — replayed a saved macro ({detail})."
+            self.history.append({"role": "user", "content": task.text})
+            self.history.append({"role": "assistant", "content": reply})
+            self.message_signal.emit(reply)
+        return ok, detail
+
+    async def _learn_macro(self, task: Task, history_len: int, stale: dict | None) -> None:
+        """Record the finished task's tool calls as a macro (replaces a macro that just failed)."""
+        if self.macros is None:
+            return
+        results: dict[str, object] = {}
+        calls = []
+        for message in self.history[history_len:]:
+            content = message["content"]
+            if isinstance(content, str):
+                continue
+            if message["role"] == "user":
+                for block in content:
+                    if isinstance(block, dict) and block.get("type") == "tool_result":
+                        results[block["tool_use_id"]] = block.get("content")
+            else:
+                calls += [b for b in content if getattr(b, "type", None) == "tool_use"]
+        title = await asyncio.to_thread(active_window_title)
+        recorded = self.macros.record(
+            task.text, [(b.name, b.input, results.get(b.id, "")) for b in calls], title,
+        )
+        if not recorded and stale is not None:
+            self.macros.forget(stale["template"])
+
+    def _run_tool(self, name: str, args: dict, announce: bool = True):
+        """Blocking tool call through TOOL_FUNCTIONS (always run on a worker thread)."""
+        if name == "request_tools":
+            return self._load_tool_groups(args.get("groups", []))
+        if self.allowed_tools is not None and name not in self.allowed_tools:
+            return f"Error: {name} is not available in this headless task (no desktop access)."
+        fn = TOOL_FUNCTIONS.get(name)
+        if fn is None:
+            return f"Unknown tool: {name}"
+        if announce:
+            self.action_signal.emit(self._describe(name, args))
+        if name == "take_screenshot" and not any(args.values()):
+            frame = self._watched_frame()
+            if frame is not None:
+                return {"png": frame.png, "region": None}
+        if name in READ_ONLY_TOOLS:
+            return fn(args)
+        invalidate_perception()   # the screen is about to change
+        try:
+            return fn(args)
+        finally:
+            self._last_action_at = time.monotonic()
+            if self.watcher is not None:
+                self.watcher.poke()
+
+    def _watched_frame(self):
+        """The watcher's frame if it shows the screen as of the last action, else None."""
+        if self.watcher is None:
+            return None
+        return self.watcher.frame_after(self._last_action_at, timeout=WATCHER_WAIT)
+
+    def _drop_pending(self) -> None:
+        for task in self.tasks.cancel_pending():
+            self.task_signal.emit(task.id, task.state)
+        self.queue_signal.emit(len(self.tasks))
+
+    def _prepare(self, task: Task) -> dict:
+        """
+        Prepare the first user turn for `task` ahead of time (runs on a helper
+        thread at submit). With speculative screenshots on, the screen is
+        captured and compressed here, in parallel with queueing the message —
+        unless another task is running, in which case the capture would be
+        stale and is left to _user_content.
+        """
+        wants_screen = self._wants_screenshot(task.text)
+        prepared = {"wants_screen": wants_screen, "png": None, "screenshot_at": None}
+        if wants_screen and self.tasks.current is None:
+            prepared.update(self._speculative_capture())
+        return prepared
+
+    def _wants_screenshot(self, text: str) -> bool:
+        if self.speculative_screenshot == "always":
+            return True
+        return self.speculative_screenshot == "auto" and needs_screen(text)
+
+    @staticmethod
+    def _speculative_capture() -> dict:
+        """Full-screen PNG for the first user turn, so the model can act at once."""
+        captured_at = time.monotonic()
+        return {"png": capture_png(), "screenshot_at": captured_at}
 
     # ── Reasoning loop ────────────────────────────────────────────────────────
 
-    def _reasoning_loop(self, user_message: str) -> None:
+    async def _reasoning_loop(self, task: Task, note: str = "") -> bool:
         """
         Perception → Reasoning → Action cycle.
 
-        Step 1: Append the user's message to the conversation history.
-        Step 2: Send history + tool schema to Claude.
+        Step 1: Append the user's message (plus any `note` for the model) to the history.
+        Step 2: Send history + tool schema to the model routing.py picks for this step
+                (trimmed to the input budget and sized by budget.py).
         Step 3a: If Claude calls tools → execute each → append results → repeat.
         Step 3b: If Claude responds with text → emit it → done.
+
+        Returns True only for a real completion: a final end_turn reply that
+        is not a give-up. Step limits and unexpected stop reasons return False.
         """
-        self.history.append({"role": "user", "content": user_message})
+        content = await self._user_content(task)
+        if note:
+            if isinstance(content, str):
+                content = f"{content}\n\n{note}"
+            else:
+                content = [*content, {"type": "text", "text": note}]
+        current = len(self.history)
+        self.history.append({"role": "user", "content": content})
+        self._tool_groups = predict_tool_groups(task.text)
+        router = Router(self.routing_policy, self.fast_model, self.strong_model)
 
         for _ in range(MAX_TOOL_ITERATIONS):
             # ── Step 2: Reasoning ─────────────────────────────────────────────
-            response = self.client.messages.create(
-                model="claude-haiku-4-5-20251001",
-                max_tokens=1024,
+            tools = self._active_tools()
+            preflight = await asyncio.to_thread(
+                self.budget.fit, SYSTEM_PROMPT, tools, self.history, current, self.screenshots)
+            if preflight.steps:
+                self.action_signal.emit(f"Trimming the request to fit the token budget ({', '.join(preflight.steps)})…")
+            route = router.next_route()
+            route = route._replace(max_tokens=self.budget.max_tokens(route, preflight.estimate))
+            started = time.perf_counter()
+            response = await self._create_message(
+                model=route.model,
+                max_tokens=route.max_tokens,
                 system=SYSTEM_PROMPT,
-                tools=TOOL_DEFINITIONS,
-                messages=self.history,
+                tools=tools,
+                messages=self.screenshots.materialize(preflight.messages),
             )
+            latency = time.perf_counter() - started
+            self.budget.observe(route, route.max_tokens, preflight, response)
+
+            rejected = router.review(route, response)
+            if rejected:
+                # Cut off or gave up on the fast tier: ask the same step again, stronger
+                self._record_request(task, route, tools, preflight, response, latency, rejected)
+                self.action_signal.emit(f"Escalating to {self.strong_model} ({router.reason})…")
+                continue
 
             self.history.append({"role": "assistant", "content": response.content})
 
             # ── Step 3b: Final text response ──────────────────────────────────
             if response.stop_reason == "end_turn":
+                self._record_request(task, route, tools, preflight, response, latency, "done")
                 text_parts = [b.text for b in response.content if hasattr(b, "text")]
                 final_text = "\n".join(text_parts).strip()
                 if final_text:
                     self.message_signal.emit(final_text)
-                return
+                return not gave_up(response)
 
             # ── Step 3a: Tool execution ───────────────────────────────────────
             if response.stop_reason == "tool_use":
-                tool_results = []
-
-                for block in response.content:
-                    if block.type != "tool_use":
-                        continue
-
-                    self.action_signal.emit(self._describe(block.name, block.input))
-                    result = self._execute(block.name, block.input)
-
-                    # Screenshots are returned as image content blocks
-                    if block.name == "take_screenshot":
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": [
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/png",
-                                        "data": result,
-                                    },
-                                }
-                            ],
-                        })
-                    else:
-                        tool_results.append({
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": str(result),
-                        })
-
+                blocks = [b for b in response.content if b.type == "tool_use"]
+                tool_results = await self._execute_all(blocks)
                 self.history.append({"role": "user", "content": tool_results})
+                outcome = router.observe([b.name for b in blocks], tool_results)
+                self._record_request(task, route, tools, preflight, response, latency, outcome)
                 continue
 
+            self._record_request(task, route, tools, preflight, response, latency, response.stop_reason)
             self.error_signal.emit(f"Unexpected stop reason: {response.stop_reason}")
-            return
+            return False
 
         self.error_signal.emit(
             "Reached the maximum number of steps. The task may be incomplete."
         )
+        return False
 
     # ── Helpers ───────────────────────────────────────────────────────────────
 
-    def _execute(self, name: str, args: dict):
-        fn = TOOL_FUNCTIONS.get(name)
-        if fn is None:
-            return f"Unknown tool: {name}"
-        return fn(args)   # AbortedError propagates up naturally
+    async def _create_message(self, **request):
+        """Send one request through the retry/backoff policy; abortable at any point."""
+        def _on_retry(attempt, delay, error):
+            self.action_signal.emit(f"API busy ({type(error).__name__}) — retry {attempt} in {delay:.1f} s…")
+
+        return await self._abortable(create_message(self.client, request, on_retry=_on_retry))
+
+    async def _abortable(self, awaitable):
+        """
+        Await `awaitable`, cancelling it as soon as the abort flag is set
+        (fail-safe corner or Stop button) and raising AbortedError instead.
+        Cancelling an in-flight API call closes its HTTP request.
+        """
+        check_abort()
+        job = asyncio.ensure_future(awaitable)
+        try:
+            while True:
+                done, _ = await asyncio.wait({job}, timeout=ABORT_POLL_INTERVAL)
+                if done:
+                    return job.result()
+                if is_aborted():
+                    job.cancel()
+                    check_abort()
+        finally:
+            if not job.done():
+                job.cancel()
+
+    async def _user_content(self, task: Task):
+        """
+        The prepared first user turn, or the raw text if preparation failed or
+        was skipped. A speculative screenshot taken before the previous task
+        finished is stale and is re-captured now.
+        """
+        if task.prepared is None:
+            return task.text
+        try:
+            prepared = await asyncio.wrap_future(task.prepared)
+        except Exception:
+            return task.text
+        if not prepared["wants_screen"]:
+            return task.text
+        taken = prepared["screenshot_at"]
+        if taken is None or taken < self._last_finished:
+            prepared.update(await asyncio.to_thread(self._speculative_capture))
+        self._set_capture_origin(None)   # the attached image is the full screen
+        verify.set_baseline(prepared["png"])
+        # Stored only now: a prepared task that never runs leaves nothing in the store
+        return [
+            self.screenshots.image_block(prepared["png"]),
+            {
+                "type": "text",
+                "text": f"{task.text}\n\n(Current full screen attached — no need to call take_screenshot first.)",
+            },
+        ]
+
+    async def _execute_all(self, blocks) -> list[dict]:
+        """
+        Run the tool calls of one response and return their tool_result blocks
+        in the original order. Consecutive read-only tools (search, window
+        queries, lookups) run concurrently; anything that drives the mouse,
+        keyboard or shell runs alone, in order. Long run_command and
+        search_web output is compacted before it enters the history.
+        """
+        results: list[dict] = []
+        i = 0
+        while i < len(blocks):
+            group = [blocks[i]]
+            if blocks[i].name in READ_ONLY_TOOLS:
+                while i + len(group) < len(blocks) and blocks[i + len(group)].name in READ_ONLY_TOOLS:
+                    group.append(blocks[i + len(group)])
+            for block in group:
+                self.action_signal.emit(self._describe(block.name, block.input))
+                if group_of(block.name):
+                    self._history_groups.add(group_of(block.name))
+            outputs = await self._abortable(asyncio.gather(
+                *(self._execute(block.name, block.input) for block in group)
+            ))
+            for block, result in zip(group, outputs):
+                # Screenshots are returned as image content blocks
+                if block.name == "take_screenshot" and isinstance(result, dict):
+                    results.append(self._screenshot_result(block.id, result))
+                else:
+                    content = str(result)
+                    if block.name in COMPACTED_TOOLS:
+                        compacted = await asyncio.to_thread(compact, content)
+                        if compacted is not content:
+                            self._tool_groups.add("output")   # read_output, for the stored full text
+                        content = compacted
+                    results.append({
+                        "type": "tool_result",
+                        "tool_use_id": block.id,
+                        "content": content,
+                    })
+            i += len(group)
+        return results
+
+    async def _execute(self, name: str, args: dict):
+        # Tools are blocking; run them off the event loop so I/O-bound ones overlap
+        started = time.perf_counter()
+        result = await asyncio.to_thread(self._run_tool, name, args, False)   # AbortedError propagates
+        self.trace.append({
+            "tool": name,
+            "input": args,
+            "ms": round((time.perf_counter() - started) * 1000),
+            "result": "(screenshot)" if isinstance(result, dict) else str(result)[:500],
+        })
+        return result
+
+    # ── Tool subset ───────────────────────────────────────────────────────────
+
+    def _active_tools(self) -> list[dict]:
+        """Tool definitions for the next request of the running task."""
+        if self.tool_profile == "full":
+            tools = select_tools(TOOL_GROUPS)
+        else:
+            # Tools already in the history stay declared so past tool_use blocks remain valid
+            tools = select_tools(self._tool_groups | self._history_groups)
+        if self.allowed_tools is not None:
+            tools = [t for t in tools if t["name"] in self.allowed_tools or t["name"] == "request_tools"]
+        return tools
+
+    def _load_tool_groups(self, groups) -> str:
+        """request_tools: add optional groups to the running task's schema."""
+        if isinstance(groups, str):
+            groups = [groups]
+        unknown = [g for g in groups if g not in TOOL_GROUPS]
+        if unknown:
+            return f"Error: unknown tool group(s) {', '.join(map(str, unknown))}. Groups: {', '.join(TOOL_GROUPS)}"
+        self._tool_groups.update(groups)
+        names = [name for g in groups for name in TOOL_GROUPS[g]]
+        return f"Loaded: {', '.join(names)}. They are available from your next step."
+
+    def _record_request(self, task: Task, route: Route, tools: list[dict], preflight: Preflight,
+                        response, latency: float, outcome: str) -> None:
+        usage = getattr(response, "usage", None)
+        self.usage["requests"] += 1
+        self.usage["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+        self.usage["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+        telemetry.record(
+            "request",
+            task=task.id,
+            route=route.kind,
+            tier=route.tier,
+            model=route.model,
+            max_tokens=route.max_tokens,
+            latency_ms=round(latency * 1000),
+            outcome=outcome,
+            tools_sent=len(tools),
+            schema_tokens=estimate_tokens(tools),
+            full_schema_tokens=FULL_SCHEMA_TOKENS,
+            estimated_tokens=preflight.estimate,
+            trimmed=list(preflight.steps),
+            input_tokens=getattr(usage, "input_tokens", None),
+            output_tokens=getattr(usage, "output_tokens", None),
+            stop_reason=response.stop_reason,
+        )
+
+    def _screenshot_result(self, tool_use_id: str, shot: dict) -> dict:
+        """Build the image tool_result and remember where the capture sits on screen."""
+        region = shot.get("region")
+        self._set_capture_origin(region)
+        if region is None:
+            verify.set_baseline(shot["png"])
+            digest = self.screenshots.put(shot["png"])
+            if digest == self._last_full_digest:
+                # Pixel-identical to the full screenshot already in this task: skip the image tokens
+                return {"type": "tool_result", "tool_use_id": tool_use_id, "content": (
+                    "Screen unchanged since your last full screenshot — it is still current. "
+                    "Coordinates are full-screen.")}
+            self._last_full_digest = digest
+        content = [self.screenshots.image_block(shot["png"])]
+        if region:
+            left, top, width, height = region
+            content.append({
+                "type": "text",
+                "text": (
+                    f"Cropped capture: {width}x{height} at screen ({left}, {top}). "
+                    "Mouse coordinates are now relative to this image."
+                ),
+            })
+        return {"type": "tool_result", "tool_use_id": tool_use_id, "content": content}
+
+    def _set_capture_origin(self, region) -> None:
+        self.capture_origin = (region[0], region[1]) if region else (0, 0)
+        set_coordinate_origin(*self.capture_origin)
 
     @staticmethod
     def _describe(name: str, args: dict) -> str:
         return {
-            "take_screenshot": "Taking screenshot…",
+            "take_screenshot": "Taking screenshot…" if not args else "Taking scoped screenshot…",
             "get_screen_size": "Getting screen size…",
             "click":           f"Clicking at ({args.get('x')}, {args.get('y')})",
             "double_click":    f"Double-clicking at ({args.get('x')}, {args.get('y')})",
@@ -207,11 +802,20 @@ class AgentWorker(QThread):
             "type_text":       f"Typing: {str(args.get('text', ''))[:40]}",
             "press_key":       f"Pressing key: {args.get('key')}",
             "hotkey":          f"Hotkey: {'+'.join(args.get('keys', []))}",
+            "run_actions":             f"Running {len(args.get('steps', []))} action(s)…",
             "run_command":             f"Running: {str(args.get('command', ''))[:60]}",
             "list_windows":            f"Listing windows (filter: '{args.get('title_filter', 'all')}')",
             "count_windows":           f"Counting windows: '{args.get('title', '')}'",
             "focus_window":            f"Focusing window: '{args.get('title', '')}'",
             "close_duplicate_windows": f"Closing duplicates of: '{args.get('title', '')}'",
             "wait":                    f"Waiting {args.get('seconds', '?')} s…",
-            "search_web":      f"Searching: {str(args.get('query', ''))[:60]}",
+            "find_on_screen":  f"Looking for '{str(args.get('text', ''))[:40]}' on screen…",
+            "read_file":       f"Reading {str(args.get('path', ''))[-60:]}",
+            "write_file":      f"Writing {str(args.get('path', ''))[-60:]}",
+            "grep_file":       f"Searching {str(args.get('path', ''))[-40:]} for '{str(args.get('pattern', ''))[:30]}'",
+            "read_output":     f"Reading stored output {str(args.get('handle', ''))[:16]}",
+            "verify":          f"Verifying {len(args.get('checks') or [])} check(s)…",
+            "find_files":      f"Finding files: {str(args.get('query') or args.get('ext') or args.get('under', ''))[:60]}",
+            "search_web":      f"Searching: {str(args.get('query') or args.get('queries', ''))[:60]}",
+            "request_tools":   f"Loading tools: {', '.join(args.get('groups', []))}",
         }.get(name, f"Using tool: {name}")
@@ -0,0 +1,140 @@
+"""
+api_client.py — Long-lived async Anthropic client with retry and deadlines.
+
+Responsibilities:
+  - Build one AsyncAnthropic client per worker, on a pooled keep-alive
+    HTTP connection (HTTP/2 when the `h2` package is installed)
+  - Send Messages API requests with a per-attempt deadline and an overall
+    deadline across retries
+  - Retry transient failures (429, 5xx, 529 overloaded, timeouts, dropped
+    connections) with full-jitter exponential backoff that honors the
+    server's retry-after / rate-limit reset headers
+
+The SDK's own retries are disabled so this module is the single policy.
+"""
+
+import asyncio
+import email.utils
+import importlib.util
+import random
+import time
+from datetime import datetime, timezone
+
+import anthropic
+import httpx
+
+REQUEST_TIMEOUT = 60.0      # seconds allowed for one attempt
+TOTAL_DEADLINE = 180.0      # seconds allowed for a request including all retries
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0          # first retry waits up to this many seconds
+BACKOFF_MAX = 30.0
+MAX_CONNECTIONS = 8
+
+RETRY_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request (with retries) runs past its overall deadline."""
+
+
+def make_async_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Create the worker's single AsyncAnthropic client on a pooled keep-alive connection."""
+    http2 = importlib.util.find_spec("h2") is not None
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        http2=http2,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=10.0),
+    )
+    return anthropic.AsyncAnthropic(api_key=api_key, http_client=http_client, max_retries=0)
+
+
+async def create_message(client: anthropic.AsyncAnthropic, request: dict, on_retry=None,
+                         timeout: float = REQUEST_TIMEOUT, deadline: float = TOTAL_DEADLINE):
+    """
+    Send one Messages API request, retrying transient failures.
+
+    `on_retry(attempt, delay, error)` is called before each backoff sleep.
+    Non-retryable errors (400, 401, 403, 404, …) are raised at once.
+    """
+    give_up_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = give_up_at - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {deadline:.0f} s exceeded")
+        try:
+            return await asyncio.wait_for(client.messages.create(**request), min(timeout, remaining))
+        except Exception as e:
+            if attempt >= MAX_ATTEMPTS or not is_retryable(e):
+                raise
+            delay = retry_delay(e, attempt)
+            if time.monotonic() + delay >= give_up_at:
+                raise
+            if on_retry is not None:
+                on_retry(attempt, delay, e)
+            await asyncio.sleep(delay)
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, anthropic.APIConnectionError)):
+        return True   # APITimeoutError is a subclass of APIConnectionError
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRY_STATUSES
+    return False
+
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before the next attempt: server hint if given, else full-jitter backoff."""
+    hinted = _server_hint(error)
+    if hinted is not None:
+        # A little jitter on top so parallel clients don't return in lockstep.
+        # Not capped: retrying before the server's reset just earns another 429.
+        return hinted + random.uniform(0, 0.25 * BACKOFF_BASE)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _server_hint(error: Exception) -> float | None:
+    """Parse retry-after-ms / retry-after / anthropic-ratelimit-*-reset from an error response."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(value)   # HTTP-date form
+            except (TypeError, ValueError):
+                parsed = None
+            if parsed is not None:
+                if parsed.tzinfo is None:
+                    parsed = parsed.replace(tzinfo=timezone.utc)
+                return max((parsed - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+    # Rate-limit reset timestamps (RFC 3339); wait for the latest exhausted bucket
+    resets = []
+    for bucket in ("requests", "tokens", "input-tokens", "output-tokens"):
+        if headers.get(f"anthropic-ratelimit-{bucket}-remaining") != "0":
+            continue
+        value = headers.get(f"anthropic-ratelimit-{bucket}-reset")
+        if not value:
+            continue
+        try:
+            reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            continue
+        resets.append((reset - datetime.now(timezone.utc)).total_seconds())
+    if resets:
+        return max(max(resets), 0.0)
+    return None
@@ -0,0 +1,201 @@
+"""
+batch.py — Headless batch runner: tasks in from JSONL, results out to JSONL.
+
+Usage:
+    python batch.py tasks.jsonl [-o results.jsonl] [--workers 4]
+
+Each input line is a task, either a JSON string or an object:
+
+    {"id": "weather", "text": "what's the weather in Haifa?", "gui": false}
+
+`gui` is optional. When it is missing, intent.needs_screen() guesses it.
+
+  - GUI tasks drive the real desktop. They run one at a time behind a
+    desktop lock.
+  - Non-GUI tasks (search, shell, files) are limited to tools.HEADLESS_TOOLS.
+    They run concurrently, up to --workers at once, including while a GUI
+    task holds the desktop.
+
+Every task runs on its own AgentWorker, so each has its own conversation.
+All workers share one API client, one macro store and one fail-safe
+listener; no Qt widgets are created. Moving the mouse to a screen corner
+aborts the running tasks and skips the rest.
+
+One result line is written per task as it finishes. Each line holds the
+task's final state and reply, the tool trace, token usage and timings.
+A summary goes to stderr.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+from PyQt6.QtCore import Qt
+
+from agent_core import AgentWorker
+from api_client import make_async_client
+from config import get_api_key, get_setting
+from controller import FAIL_SAFE_REASON, FailSafeListener, is_aborted, reset_abort
+from intent import needs_screen
+from macros import MacroStore
+from tasks import CANCELLED, DONE
+from tools import HEADLESS_TOOLS
+
+DEFAULT_WORKERS = 4
+HEADLESS_NOTE = ("(Headless run: there is no screen, mouse or keyboard for this task. "
+                 "Use run_command, search_web and the file tools only.)")
+
+
+def load_tasks(path: Path) -> list[dict]:
+    """Parse the input file into [{"index", "id", "text", "gui"}]."""
+    tasks = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{number}: not valid JSON ({e})") from None
+            if isinstance(item, str):
+                item = {"text": item}
+            text = str(item.get("text") or item.get("task") or "").strip()
+            if not text:
+                raise ValueError(f"{path}:{number}: task has no text")
+            gui = item.get("gui")
+            tasks.append({
+                "index": len(tasks),
+                "id": item.get("id", number),
+                "text": text,
+                "gui": needs_screen(text) if gui is None else bool(gui),
+            })
+    return tasks
+
+
+class BatchRunner:
+    """Runs a list of tasks with a concurrency cap and a desktop lock for GUI tasks."""
+
+    def __init__(self, api_key: str, workers: int = DEFAULT_WORKERS, out=None):
+        self._api_key = api_key
+        self._slots = asyncio.Semaphore(max(workers, 1))
+        self._desktop = asyncio.Lock()
+        self._out = out
+        self._macros = MacroStore()
+        self._client = None
+        self.results: list[dict] = []
+
+    async def run(self, tasks: list[dict]) -> list[dict]:
+        self._client = make_async_client(self._api_key)
+        reset_abort()
+        try:
+            await asyncio.gather(*(self._run_one(task) for task in tasks))
+        finally:
+            await self._client.close()
+        return self.results
+
+    async def _run_one(self, spec: dict) -> None:
+        queued_at = time.perf_counter()
+        if spec["gui"]:
+            # Take the desktop before a slot so waiting GUI tasks don't starve headless ones
+            async with self._desktop, self._slots:
+                result = await self._execute(spec, queued_at)
+        else:
+            async with self._slots:
+                result = await self._execute(spec, queued_at)
+        self._emit(result)
+
+    async def _execute(self, spec: dict, queued_at: float) -> dict:
+        result = {"id": spec["id"], "index": spec["index"], "text": spec["text"], "gui": spec["gui"]}
+        if is_aborted():
+            # The fail-safe fired during an earlier task: don't start new ones
+            return {**result, "state": CANCELLED, "error": FAIL_SAFE_REASON, "wait_ms": 0, "wall_ms": 0}
+
+        worker = AgentWorker(self._api_key, fail_safe=False)
+        worker.client = self._client
+        worker.macros = self._macros if worker.macros is not None else None
+        worker.persist = False
+        if not spec["gui"]:
+            worker.allowed_tools = HEADLESS_TOOLS
+        messages, errors = [], []
+        direct = Qt.ConnectionType.DirectConnection
+        worker.message_signal.connect(messages.append, direct)
+        worker.error_signal.connect(errors.append, direct)
+
+        started = time.perf_counter()
+        try:
+            task = await worker.execute(spec["text"], note="" if spec["gui"] else HEADLESS_NOTE)
+        finally:
+            # Not worker.shutdown(): its abort would reach every task running in this process
+            worker.tasks.close()          # stops the queue's prepare thread pool
+            if worker.watcher is not None:
+                worker.watcher.stop()
+        finished = time.perf_counter()
+        return {
+            **result,
+            "state": task.state,
+            "error": task.error,
+            "reply": messages[-1] if messages else "",
+            "messages": messages,
+            "errors": errors,
+            "trace": worker.trace,
+            "usage": worker.usage,
+            "wait_ms": round((started - queued_at) * 1000),
+            "wall_ms": round((finished - started) * 1000),
+        }
+
+    def _emit(self, result: dict) -> None:
+        self.results.append(result)
+        if self._out is not None:
+            self._out.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+            self._out.flush()
+        mark = "✔" if result["state"] == DONE else "✖"
+        print(f"{mark} [{result['id']}] {result['state']} in {result['wall_ms'] / 1000:.1f} s — "
+              f"{result['text'][:60]}", file=sys.stderr, flush=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tasks", type=Path, help="JSONL file of tasks")
+    parser.add_argument("-o", "--output", type=Path, help="results JSONL (default: <tasks>.results.jsonl)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"tasks running at once (default {DEFAULT_WORKERS}); GUI tasks always run one at a time")
+    args = parser.parse_args()
+
+    api_key = get_api_key()
+    if not api_key:
+        print("No API key found — set ANTHROPIC_API_KEY in .env (or run main.py once).", file=sys.stderr)
+        return 2
+    try:
+        tasks = load_tasks(args.tasks)
+    except (OSError, ValueError) as e:
+        print(f"batch: {e}", file=sys.stderr)
+        return 2
+
+    output = args.output or args.tasks.with_suffix(".results.jsonl")
+    gui = sum(t["gui"] for t in tasks)
+    print(f"{len(tasks)} task(s): {gui} GUI (serialized), {len(tasks) - gui} headless "
+          f"(up to {args.workers} at once) → {output}", file=sys.stderr)
+
+    fail_safe = FailSafeListener(hotkey=get_setting("AGENT_ABORT_HOTKEY", ""))
+    fail_safe.start()
+    started = time.perf_counter()
+    try:
+        with open(output, "w", encoding="utf-8") as out:
+            results = asyncio.run(BatchRunner(api_key, args.workers, out).run(tasks))
+    finally:
+        fail_safe.stop()
+
+    done = sum(r["state"] == DONE for r in results)
+    tokens = sum(r.get("usage", {}).get("input_tokens", 0) + r.get("usage", {}).get("output_tokens", 0)
+                 for r in results)
+    print(f"\n{done}/{len(results)} done in {time.perf_counter() - started:.1f} s, {tokens} tokens",
+          file=sys.stderr)
+    return 0 if done == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
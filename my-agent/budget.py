@@ -0,0 +1,330 @@
+"""
+budget.py — Token budgeting for each request of the reasoning loop.
+
+Responsibilities:
+  - Estimate a request's input tokens before it is sent: system prompt,
+    tool schema and history text at ~4 characters per token, screenshots
+    from their pixel size the way the API bills them (w·h / 750 after the
+    API's own downscaling to IMAGE_MAX_EDGE / IMAGE_MAX_PIXELS)
+  - Calibrate those estimates against the usage.input_tokens each response
+    reports (a running ratio), so they track the real tokenizer
+  - Fit an over-budget request under AGENT_INPUT_BUDGET before sending it,
+    cheapest loss first:
+        1. downscale every screenshot but the newest to half size
+        2. drop screenshots from earlier tasks (a text note stays)
+        3. collapse earlier tasks to their request and final reply
+        4. drop older screenshots of the running task
+    Only the copy that is sent is trimmed — the history, the session log
+    and the images stay complete
+  - Size max_tokens per step: at least the route's budget, raised to
+    OUTPUT_HEADROOM × the largest recent output of that step kind (a reply
+    cut off at max_tokens counts as that large), capped by what is left of
+    the context window
+
+Settings (.env):
+  AGENT_INPUT_BUDGET   input tokens per request before trimming (default 60000)
+"""
+
+import json
+import math
+from collections import deque
+from typing import NamedTuple
+
+from screenshots import REF_TYPE, referenced
+
+INPUT_BUDGET = 60_000
+CONTEXT_TOKENS = 200_000
+CONTEXT_MARGIN = 2_000          # kept free when max_tokens is capped by the context window
+MAX_OUTPUT_TOKENS = 8_192
+MIN_OUTPUT_TOKENS = 256
+OUTPUT_HEADROOM = 1.5
+OUTPUT_WINDOW = 20              # recent outputs remembered per step kind
+
+# How the API bills an image: resized to fit both limits, then w·h / 750 tokens
+IMAGE_MAX_EDGE = 1568
+IMAGE_MAX_PIXELS = 1_150_000
+IMAGE_PIXELS_PER_TOKEN = 750
+
+DOWNSCALE_FACTOR = 0.5
+MIN_DOWNSCALE_EDGE = 400        # screenshots this small are not downscaled again
+CALIBRATION_WEIGHT = 0.3        # weight of the newest actual/estimate ratio
+CALIBRATION_RANGE = (0.5, 3.0)
+
+DROPPED_IMAGE_NOTE = "(earlier screenshot omitted to save tokens)"
+
+
+class Preflight(NamedTuple):
+    messages: list[dict]     # what is sent (reference blocks; materialize() follows)
+    raw: int                 # uncalibrated estimate, compared with the reported usage
+    estimate: int            # calibrated estimate
+    steps: tuple[str, ...]   # trimming steps applied, in order
+
+
+def configured_budget() -> int:
+    """AGENT_INPUT_BUDGET, or INPUT_BUDGET when it is unset or not a positive number."""
+    from config import get_setting
+    try:
+        value = int(get_setting("AGENT_INPUT_BUDGET", "") or INPUT_BUDGET)
+    except ValueError:
+        return INPUT_BUDGET
+    return value if value > 0 else INPUT_BUDGET
+
+
+class TokenBudget:
+    """Per-worker estimator and max_tokens policy; learns across tasks."""
+
+    def __init__(self, input_budget: int | None = None):
+        self.input_budget = input_budget or configured_budget()
+        self.calibration = 1.0         # reported / estimated input tokens
+        self._outputs: dict[str, deque] = {}
+        self._image_sizes: dict[str, tuple[int, int]] = {}
+        self._smaller: dict[str, str] = {}   # digest → digest of its downscaled copy
+
+    # ── Estimates ─────────────────────────────────────────────────────────────
+
+    def estimate(self, system: str, tools: list[dict], messages: list[dict], store) -> int:
+        """Uncalibrated input-token estimate of one request."""
+        fixed = (len(system) + len(json.dumps(tools, separators=(",", ":"), ensure_ascii=False))) // 4
+        return fixed + sum(self._message_tokens(m, store) for m in messages)
+
+    def _message_tokens(self, message: dict, store) -> int:
+        content = message["content"]
+        if isinstance(content, str):
+            return len(content) // 4 + 4
+        return sum(self._block_tokens(b, store) for b in content) + 4
+
+    def _block_tokens(self, block, store) -> int:
+        if not isinstance(block, dict):
+            # SDK content blocks from assistant turns
+            if getattr(block, "type", "") == "tool_use":
+                return (len(block.name) + len(json.dumps(block.input, ensure_ascii=False))) // 4 + 8
+            return len(getattr(block, "text", "") or "") // 4
+        kind = block.get("type")
+        if kind == "image":
+            source = block["source"]
+            if source.get("type") == REF_TYPE:
+                return self._image_tokens(source["digest"], store)
+            return len(source.get("data", "")) * 3 // 4 // IMAGE_PIXELS_PER_TOKEN   # rough, unseen size
+        if kind == "tool_result":
+            content = block.get("content", "")
+            if isinstance(content, list):
+                return sum(self._block_tokens(b, store) for b in content) + 8
+            return len(str(content)) // 4 + 8
+        if kind == "text":
+            return len(block.get("text", "")) // 4
+        return len(json.dumps(block, ensure_ascii=False, default=str)) // 4
+
+    def _image_tokens(self, digest: str, store) -> int:
+        size = self._image_sizes.get(digest)
+        if size is None:
+            try:
+                size = png_size(store.get(digest))
+            except KeyError:
+                return 8                      # sent as a short text note
+            self._image_sizes[digest] = size
+        return image_tokens(*size)
+
+    # ── Fitting a request ─────────────────────────────────────────────────────
+
+    def fit(self, system: str, tools: list[dict], messages: list[dict], current: int, store) -> Preflight:
+        """
+        The request for `messages` (the running task starts at index
+        `current`), trimmed step by step until its calibrated estimate is
+        within the input budget or nothing more can go.
+        """
+        raw = self.estimate(system, tools, messages, store)
+        steps = []
+        for name, trim in (
+            ("downscaled screenshots", self._downscale_older),
+            ("dropped earlier screenshots", _drop_earlier_images),
+            ("collapsed earlier tasks", _collapse_earlier_tasks),
+            ("dropped older screenshots", _drop_older_images),
+        ):
+            if self._calibrated(raw) <= self.input_budget:
+                break
+            trimmed = trim(messages, current, store)
+            if trimmed is None:
+                continue
+            messages, current = trimmed
+            raw = self.estimate(system, tools, messages, store)
+            steps.append(name)
+        return Preflight(messages, raw, self._calibrated(raw), tuple(steps))
+
+    def _calibrated(self, raw: int) -> int:
+        return int(raw * self.calibration)
+
+    def _downscale_older(self, messages: list[dict], current: int, store):
+        from vision import downscale_png
+
+        newest = _newest_image(messages)
+
+        def shrink(block):
+            digest = block["source"]["digest"]
+            if digest == newest:
+                return block
+            small = self._smaller.get(digest)
+            if small is not None:
+                try:
+                    store.get(small)          # still in the store (retain() drops unused copies)
+                except KeyError:
+                    small = None
+            if small is None:
+                try:
+                    png = store.get(digest)
+                except KeyError:
+                    return block
+                if max(png_size(png)) <= MIN_DOWNSCALE_EDGE:
+                    return block
+                small = store.put(downscale_png(png, DOWNSCALE_FACTOR))
+                self._smaller[digest] = small
+            return {**block, "source": {**block["source"], "digest": small}}
+
+        trimmed = _map_images(messages, 0, len(messages), shrink)
+        return None if trimmed is messages else (trimmed, current)
+
+    # ── max_tokens ────────────────────────────────────────────────────────────
+
+    def max_tokens(self, route, estimate: int) -> int:
+        """max_tokens for this step: the route's budget, raised by recent outputs, within the context."""
+        want = route.max_tokens
+        seen = self._outputs.get(route.kind)
+        if seen:
+            want = max(want, min(int(max(seen) * OUTPUT_HEADROOM), MAX_OUTPUT_TOKENS))
+        return max(min(want, CONTEXT_TOKENS - estimate - CONTEXT_MARGIN), MIN_OUTPUT_TOKENS)
+
+    def observe(self, route, max_tokens: int, preflight: Preflight, response) -> None:
+        """Learn from a response: calibrate input estimates, remember the output size."""
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "input_tokens", None)
+        if actual and preflight.raw:
+            ratio = min(max(actual / preflight.raw, CALIBRATION_RANGE[0]), CALIBRATION_RANGE[1])
+            self.calibration += CALIBRATION_WEIGHT * (ratio - self.calibration)
+        output = getattr(usage, "output_tokens", None)
+        if response.stop_reason == "max_tokens":
+            output = max(output or 0, max_tokens)
+        if output:
+            self._outputs.setdefault(route.kind, deque(maxlen=OUTPUT_WINDOW)).append(output)
+
+
+# ── Image sizes ───────────────────────────────────────────────────────────────
+
+def png_size(png: bytes) -> tuple[int, int]:
+    """(width, height) from the PNG header, without decoding the image."""
+    return int.from_bytes(png[16:20], "big"), int.from_bytes(png[20:24], "big")
+
+
+def image_tokens(width: int, height: int) -> int:
+    scale = min(1.0, IMAGE_MAX_EDGE / max(width, height, 1),
+                math.sqrt(IMAGE_MAX_PIXELS / max(width * height, 1)))
+    return math.ceil(width * height * scale * scale / IMAGE_PIXELS_PER_TOKEN)
+
+
+# ── Trimming steps ────────────────────────────────────────────────────────────
+# Each takes (messages, index of the running task's first message, store) and
+# returns (new messages, new index) — or None when it has nothing to remove.
+# Messages are copied where they change, never edited in place.
+
+def _map_images(messages: list[dict], start: int, stop: int, fn) -> list[dict]:
+    """`messages` with fn(block) applied to the image reference blocks of messages[start:stop]."""
+    out, changed = list(messages), False
+    for i in range(start, stop):
+        content = messages[i]["content"]
+        if isinstance(content, str):
+            continue
+        blocks = _map_blocks(content, fn)
+        if blocks is not content:
+            out[i] = {**messages[i], "content": blocks}
+            changed = True
+    return out if changed else messages
+
+
+def _map_blocks(blocks: list, fn) -> list:
+    out, changed = [], False
+    for block in blocks:
+        new = block
+        if isinstance(block, dict):
+            if block.get("type") == "image" and block["source"].get("type") == REF_TYPE:
+                new = fn(block)
+            elif block.get("type") == "tool_result" and isinstance(block.get("content"), list):
+                content = _map_blocks(block["content"], fn)
+                if content is not block["content"]:
+                    new = {**block, "content": content}
+        changed = changed or new is not block
+        out.append(new)
+    return out if changed else blocks
+
+
+def _newest_image(messages: list[dict]) -> str | None:
+    newest = None
+    for newest in referenced(messages):
+        pass
+    return newest
+
+
+def _drop(block: dict) -> dict:
+    return {"type": "text", "text": DROPPED_IMAGE_NOTE}
+
+
+def _drop_earlier_images(messages: list[dict], current: int, store):
+    trimmed = _map_images(messages, 0, current, _drop)
+    return None if trimmed is messages else (trimmed, current)
+
+
+def _drop_older_images(messages: list[dict], current: int, store):
+    newest = _newest_image(messages)
+    trimmed = _map_images(messages, current, len(messages),
+                          lambda b: b if b["source"]["digest"] == newest else _drop(b))
+    return None if trimmed is messages else (trimmed, current)
+
+
+def _collapse_earlier_tasks(messages: list[dict], current: int, store):
+    """Each earlier task as two messages: its request, and its final reply with a tool summary."""
+    starts = [i for i in range(current) if _starts_task(messages[i])] + [current]
+    if len(starts) < 2 or all(stop - start <= 2 for start, stop in zip(starts, starts[1:])):
+        return None
+    collapsed = list(messages[:starts[0]])
+    for start, stop in zip(starts, starts[1:]):
+        task = messages[start:stop]
+        if len(task) <= 2:
+            collapsed.extend(task)
+            continue
+        collapsed.append({"role": "user", "content": _text_of(task[0]["content"]) or "(request)"})
+        collapsed.append({"role": "assistant", "content": _summary(task)})
+    return collapsed + messages[current:], len(collapsed)
+
+
+def _starts_task(message: dict) -> bool:
+    """A user message that is not a batch of tool results."""
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    return isinstance(content, str) or not any(
+        isinstance(b, dict) and b.get("type") == "tool_result" for b in content)
+
+
+def _text_of(content) -> str:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for block in content:
+        if isinstance(block, dict):
+            if block.get("type") == "text":
+                parts.append(block["text"])
+        elif getattr(block, "type", "") == "text":
+            parts.append(block.text)
+    return "\n".join(parts).strip()
+
+
+def _summary(task: list[dict]) -> str:
+    calls = []
+    for message in task:
+        if message["role"] == "assistant" and not isinstance(message["content"], str):
+            for block in message["content"]:
+                name = block.get("name") if isinstance(block, dict) else getattr(block, "name", None)
+                if name:
+                    calls.append(name)
+    reply = next((_text_of(m["content"]) for m in reversed(task)
+                  if m["role"] == "assistant" and _text_of(m["content"])), "")
+    used = ", ".join(dict.fromkeys(calls))
+    note = f"[Earlier task, compacted: {len(calls)} tool call(s){' — ' + used if used else ''}]"
+    return f"{note}\n{reply}" if reply else note
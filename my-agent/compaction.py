@@ -0,0 +1,199 @@
+"""
+compaction.py — Compact long tool output before it enters the history.
+
+Responsibilities:
+  - Pass short results through untouched (up to COMPACT_CHARS)
+  - Shrink long ones (run_command, search_web — tools.COMPACTED_TOOLS)
+    without losing what matters:
+        · runs of near-identical lines (progress bars, "Copying …" lists)
+          become their first and last line plus a count
+        · long lines repeated further down are shown once
+        · the head and the tail are kept — errors tend to be at the end
+        · tracebacks and lines that look like errors are pulled out of the
+          omitted middle, with a line of context
+  - Keep the full output in .cache/outputs/<handle>.txt, named by its
+    digest, and say how to page through it with read_output — by line
+    range (numbers refer to the full output) or by pattern
+  - Keep only the newest MAX_OUTPUTS stored outputs
+"""
+
+import hashlib
+import re
+from pathlib import Path
+
+OUTPUTS_DIR = Path(__file__).parent / ".cache" / "outputs"
+COMPACT_CHARS = 3000       # results up to this long are returned as they are
+HEAD_CHARS = 800
+TAIL_CHARS = 1500
+ERROR_CHARS = 1500
+MAX_LINE_CHARS = 300
+MIN_RUN = 3                # similar consecutive lines collapsed from this many
+MIN_REPEAT_CHARS = 40      # shorter repeated lines are kept (blank lines, "}", "OK")
+MAX_OUTPUTS = 100
+
+_HANDLE_RE = re.compile(r"^[0-9a-f]{16}$")
+_DIGITS_RE = re.compile(r"\d+")
+_ERROR_RE = re.compile(
+    r"\b(error|exception|fatal|failed|failure|denied|not found|not recognized|cannot|could not)\b"
+    r"|^\s*at line:\d|^\s*\+ (CategoryInfo|FullyQualifiedErrorId)",
+    re.IGNORECASE,
+)
+_TRACEBACK_START = "Traceback (most recent call last)"
+
+
+# ── Front end ─────────────────────────────────────────────────────────────────
+
+def compact(text: str, directory: Path = OUTPUTS_DIR) -> str:
+    """`text` as is when short; otherwise a compacted version that names the stored full output."""
+    if len(text) <= COMPACT_CHARS:
+        return text
+    lines = text.splitlines()
+    entries, collapsed, repeated = _dedupe(lines)
+    if sum(len(t) + 1 for _, _, t in entries) <= COMPACT_CHARS:
+        shown, omitted, errors = entries, 0, 0
+    else:
+        shown, omitted, errors = _select(entries)
+    body = _render(shown)
+
+    notes = [f"{len(lines)} lines, {len(text)} chars"]
+    if collapsed:
+        notes.append(f"{collapsed} similar lines collapsed")
+    if repeated:
+        notes.append(f"{repeated} repeated lines dropped")
+    if omitted:
+        notes.append(f"{omitted} lines omitted")
+    if errors:
+        notes.append(f"{errors} error line(s) kept from the middle")
+    handle = _store(text, directory)
+    if handle is None:
+        where = "the full output could not be stored"
+    else:
+        where = (f'full output: read_output(handle="{handle}", start_line=N, end_line=M) '
+                 f'or read_output(handle="{handle}", pattern="…")')
+    return f"{body}\n[Compacted: {', '.join(notes)} — {where}]"
+
+
+def read_output(handle: str, start_line: int | None = None, end_line: int | None = None,
+                pattern: str = "", directory: Path = OUTPUTS_DIR) -> str:
+    """A line range of a stored output, or its lines matching `pattern` (fileio does the reading)."""
+    from fileio import grep_file, read_file
+    handle = str(handle).strip()
+    path = directory / f"{handle}.txt"
+    if not _HANDLE_RE.match(handle) or not path.exists():
+        return f"Error: no stored output {handle!r} (only the newest {MAX_OUTPUTS} are kept)."
+    if pattern:
+        return grep_file(str(path), pattern)
+    return read_file(str(path), start_line=start_line or 1, end_line=end_line)
+
+
+# ── Compaction ────────────────────────────────────────────────────────────────
+# Entries are (first, last line number in the full output it stands for, text to show).
+
+def _dedupe(lines: list[str]) -> tuple[list[tuple[int, int, str]], int, int]:
+    """Collapse runs of similar lines and drop later copies of long lines; returns entries + counts."""
+    entries, collapsed, repeated, seen = [], 0, 0, set()
+    i = 0
+    while i < len(lines):
+        key = _DIGITS_RE.sub("#", lines[i].strip())
+        j = i + 1
+        while j < len(lines) and _DIGITS_RE.sub("#", lines[j].strip()) == key:
+            j += 1
+        if j - i >= MIN_RUN and key:
+            entries.append((i + 1, i + 1, lines[i]))
+            entries.append((i + 2, j - 1, f"  … {j - i - 2} similar line(s) …"))
+            entries.append((j, j, lines[j - 1]))
+            collapsed += j - i - 2
+        else:
+            for n in range(i, j):
+                line = lines[n]
+                stripped = line.strip()
+                if len(stripped) >= MIN_REPEAT_CHARS and stripped in seen:
+                    repeated += 1
+                    if entries and entries[-1][1] == n:
+                        first, _, shown = entries[-1]
+                        entries[-1] = (first, n + 1, shown)   # covered by the line before: no "omitted" gap
+                    continue
+                seen.add(stripped)
+                entries.append((n + 1, n + 1, line))
+        i = j
+    return entries, collapsed, repeated
+
+
+def _select(entries: list[tuple[int, int, str]]) -> tuple[list[tuple[int, int, str]], int, int]:
+    """Head, tail and error blocks of `entries`; returns (shown entries, omitted count, error lines)."""
+    head = _fit(range(len(entries)), entries, HEAD_CHARS)
+    tail = _fit(range(len(entries) - 1, max(head, default=-1), -1), entries, TAIL_CHARS)
+    keep = set(head) | set(tail)
+    middle = [i for i in range(len(entries)) if i not in keep]
+    errors = _fit(_error_indexes(entries, middle), entries, ERROR_CHARS)
+    keep |= set(errors)
+    return [entries[i] for i in sorted(keep)], len(entries) - len(keep), len(errors)
+
+
+def _fit(indexes, entries, budget: int) -> list[int]:
+    """The leading `indexes` whose clipped lines fit in `budget` characters (at least one)."""
+    taken, used = [], 0
+    for i in indexes:
+        used += len(_clip(entries[i][2])) + 1
+        if used > budget and taken:
+            break
+        taken.append(i)
+    return taken
+
+
+def _error_indexes(entries, candidates: list[int]) -> list[int]:
+    """Indexes of traceback blocks and error lines (±1 line) among `candidates`, in order."""
+    wanted, pool = set(), set(candidates)
+    for i in candidates:
+        text = entries[i][2]
+        if _TRACEBACK_START in text:
+            # The traceback runs over the indented frames up to the exception line
+            j = i + 1
+            while j < len(entries) and (entries[j][2][:1].isspace() or not entries[j][2].strip()):
+                j += 1
+            wanted.update(range(i, min(j + 1, len(entries))))
+        elif _ERROR_RE.search(text):
+            wanted.update((i - 1, i, i + 1))
+    return sorted(wanted & pool)
+
+
+def _render(shown: list[tuple[int, int, str]]) -> str:
+    out, last = [], 0
+    for first, end, text in shown:
+        if first > last + 1:
+            out.append(f"… lines {last + 1}-{first - 1} omitted …")
+        out.append(_clip(text))
+        last = end
+    return "\n".join(out)
+
+
+def _clip(line: str) -> str:
+    return line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + " …"
+
+
+# ── Storage ───────────────────────────────────────────────────────────────────
+
+def _store(text: str, directory: Path) -> str | None:
+    """Write the full output once (named by its digest); returns the handle, or None on failure."""
+    data = text.encode("utf-8", errors="replace")
+    handle = hashlib.blake2b(data, digest_size=8).hexdigest()
+    path = directory / f"{handle}.txt"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            path.touch()
+        else:
+            path.write_bytes(data)
+            _rotate(directory)
+    except OSError:
+        return None
+    return handle
+
+
+def _rotate(directory: Path, keep: int = MAX_OUTPUTS) -> None:
+    files = sorted(directory.glob("*.txt"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in files[keep:]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
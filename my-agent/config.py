@@ -10,6 +10,19 @@ def get_api_key() -> str:
     return os.getenv("ANTHROPIC_API_KEY", "").strip()
 
 
+def get_setting(name: str, default: str = "") -> str:
+    """Read an optional AGENT_* setting from the environment or .env."""
+    load_dotenv(ENV_FILE)
+    return os.getenv(name, default).strip()
+
+
 def save_api_key(key: str):
+    """Write the API key to .env, keeping any other settings already there."""
+    lines = []
+    if ENV_FILE.exists():
+        lines = [
+            line for line in ENV_FILE.read_text().splitlines()
+            if not line.startswith("ANTHROPIC_API_KEY=")
+        ]
     with open(ENV_FILE, "w") as f:
-        f.write(f"ANTHROPIC_API_KEY={key}\n")
+        f.write("\n".join([f"ANTHROPIC_API_KEY={key}", *lines]) + "\n")
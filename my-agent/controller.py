@@ -3,18 +3,24 @@ controller.py — Action execution module with hardware fail-safe.
 
 Responsibilities:
   - Translate AI-issued (x, y) coordinates into physical mouse events
-  - Simulate keyboard input (typewrite, press, hotkey)
+  - Simulate keyboard input (paste, press, hotkey)
+  - Inject both through input_backend (SendInput / XTest), batched per action
   - Run shell commands
   - Monitor mouse position via pynput and abort if the user moves the cursor
     to any corner of the screen (fail-safe kill switch)
 
 FAIL-SAFE:
-  Move the mouse to any corner of the screen (top-left, top-right,
+  Move the mouse to any corner of any monitor (top-left, top-right,
   bottom-left, or bottom-right) to immediately abort the running task.
   A corner is defined as within CORNER_PX pixels of the screen edge.
+  An optional global hotkey (AGENT_ABORT_HOTKEY) does the same.
+  The UI's Stop button goes through the same abort flag (request_abort), so
+  waits, action batches and running shell commands unwind the same way.
 """
 
 import ctypes
+import os
+import signal
 import subprocess
 import threading
 import time
@@ -23,6 +29,8 @@ import pyautogui
 import pygetwindow as gw
 from pynput import mouse as _pynput_mouse
 
+from input_backend import click_events, get_backend, hotkey_events, key_events
+
 # ── DPI awareness ─────────────────────────────────────────────────────────────
 # Tell Windows this process is per-monitor DPI-aware so pyautogui coordinates
 # match the physical pixels in screenshots (fixes coordinate mismatch on scaled
@@ -41,9 +49,13 @@ pyautogui.FAILSAFE = False
 pyautogui.PAUSE = 0.0   # we manage our own timing
 
 CORNER_PX = 10       # pixels from edge that trigger abort
+CHECK_INTERVAL = 0.02     # fail-safe samples the cursor at most 50 times a second
+GEOMETRY_RECHECK = 2.0    # min seconds between monitor-layout refreshes triggered by the cursor
 MOVE_DURATION = 0.05 # near-instant cursor glide
+GLIDE_STEPS = 8      # intermediate cursor positions per glide
 TYPE_INTERVAL = 0.01 # fastest keystroke cadence
 POST_ACTION_PAUSE = 0.02  # minimal OS registration gap
+MAX_COMMAND_OUTPUT = 2_000_000  # run_command characters kept (head + tail) before compaction
 
 
 def _px(value) -> int:
@@ -56,6 +68,30 @@ def _px(value) -> int:
     return int(round(float(value)))
 
 
+# ── Coordinate origin ─────────────────────────────────────────────────────────
+# After a region/window/monitor-scoped screenshot the model sees a cropped
+# image, so the (x, y) it sends back are relative to that crop. The agent
+# records the crop's top-left corner here and every mouse action adds it
+# before touching the real cursor. A full-screen screenshot resets it.
+
+_origin = (0, 0)
+
+
+def set_coordinate_origin(x: int = 0, y: int = 0) -> None:
+    """Make subsequent mouse coordinates relative to screen pixel (x, y)."""
+    global _origin
+    _origin = (int(x), int(y))
+
+
+def get_coordinate_origin() -> tuple[int, int]:
+    return _origin
+
+
+def _to_screen(x, y) -> tuple[int, int]:
+    """Sanitize (x, y) and translate it from crop space to screen pixels."""
+    return _px(x) + _origin[0], _px(y) + _origin[1]
+
+
 # ── Abort mechanism ───────────────────────────────────────────────────────────
 
 class AbortedError(RuntimeError):
@@ -63,116 +99,284 @@ class AbortedError(RuntimeError):
 
 
 _abort_event = threading.Event()
+_abort_reason = ""
+
+FAIL_SAFE_REASON = "Task aborted — mouse moved to a screen corner."
+HOTKEY_REASON = "Task aborted — abort hotkey pressed."
+EMERGENCY_REASONS = frozenset({FAIL_SAFE_REASON, HOTKEY_REASON})   # also drop queued tasks
+CANCEL_REASON = "Task cancelled."
 
 
 def is_aborted() -> bool:
     return _abort_event.is_set()
 
 
+def request_abort(reason: str = CANCEL_REASON) -> None:
+    """Ask the running task to stop at its next abort check (used by the UI's Stop button)."""
+    global _abort_reason
+    _abort_reason = reason
+    _abort_event.set()
+
+
 def reset_abort() -> None:
     """Clear the abort flag. Call this at the start of each new user message."""
+    global _abort_reason
+    _abort_reason = ""
     _abort_event.clear()
 
 
 def check_abort() -> None:
-    """Raise AbortedError if the fail-safe has been triggered."""
+    """Raise AbortedError if the fail-safe or a cancel request has been triggered."""
     if _abort_event.is_set():
-        raise AbortedError("Task aborted — mouse moved to a screen corner.")
+        raise AbortedError(_abort_reason or FAIL_SAFE_REASON)
+
+
+def sleep_or_abort(seconds: float) -> None:
+    """time.sleep() that wakes up immediately (and raises) when an abort is requested."""
+    if _abort_event.wait(max(seconds, 0.0)):
+        check_abort()
 
 
 # ── Fail-safe listener ────────────────────────────────────────────────────────
 
 class FailSafeListener:
     """
-    Runs a pynput mouse listener in a daemon thread.
-    When the cursor enters any screen corner, the abort event is set.
+    Watches the cursor on a daemon thread and sets the abort flag when it
+    enters a screen corner, or when the optional abort hotkey is pressed.
+
+    Cost is kept near zero:
+      - Monitor geometry (every monitor of the virtual desktop) is read once
+        and cached as a handful of corner rectangles. refresh_geometry() is
+        called on display changes, and a position outside every known
+        monitor triggers a refresh too (at most every GEOMETRY_RECHECK s).
+      - Positions are checked at most every CHECK_INTERVAL seconds. On
+        Windows the cursor is sampled with GetCursorPos, so no system-wide
+        mouse hook is installed. Elsewhere, pynput's move events only store
+        the latest position, and the checker wakes only while the mouse moves.
+        The final position of a movement is always checked, and the cursor
+        rests at a corner once it gets there, so sampling can't miss a hit.
     """
 
-    def __init__(self):
+    def __init__(self, hotkey: str = ""):
+        self._hotkey = hotkey            # e.g. "ctrl+alt+end"; "" disables
+        self._corners: tuple[tuple[int, int, int, int], ...] = ()
+        self._monitors: tuple[tuple[int, int, int, int], ...] = ()
+        self._last_refresh = 0.0
+        self._pos: tuple[int, int] | None = None
+        self._moved = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
         self._listener: _pynput_mouse.Listener | None = None
+        self._hotkey_handle = None
 
     def start(self) -> None:
-        self._listener = _pynput_mouse.Listener(on_move=self._on_move)
-        self._listener.daemon = True
-        self._listener.start()
+        self.refresh_geometry()
+        self._stop.clear()
+        if _cursor_pos_win32() is not None:
+            target = self._poll_loop
+        else:
+            self._listener = _pynput_mouse.Listener(on_move=self._on_move)
+            self._listener.daemon = True
+            self._listener.start()
+            target = self._event_loop
+        self._thread = threading.Thread(target=target, name="fail-safe", daemon=True)
+        self._thread.start()
+        if self._hotkey:
+            self._register_hotkey()
 
     def stop(self) -> None:
+        self._stop.set()
+        self._moved.set()
         if self._listener:
             self._listener.stop()
             self._listener = None
-
-    @staticmethod
-    def _on_move(x: int, y: int) -> None:
-        w, h = pyautogui.size()
-        cp = CORNER_PX
-        in_corner = (
-            (x <= cp and y <= cp)           # top-left
-            or (x >= w - cp and y <= cp)    # top-right
-            or (x <= cp and y >= h - cp)    # bottom-left
-            or (x >= w - cp and y >= h - cp)  # bottom-right
-        )
-        if in_corner:
-            _abort_event.set()
+        if self._hotkey_handle is not None:
+            try:
+                import keyboard
+                keyboard.remove_hotkey(self._hotkey_handle)
+            except Exception:
+                pass
+            self._hotkey_handle = None
+
+    def refresh_geometry(self) -> None:
+        """Re-read the monitor layout (call when displays are added, removed or resized)."""
+        from vision import list_monitors
+        try:
+            monitors = tuple(list_monitors())
+        except Exception:
+            w, h = pyautogui.size()
+            monitors = ((0, 0, w, h),)
+        self._monitors = monitors
+        self._corners = _hot_corners(monitors, CORNER_PX)
+        self._last_refresh = time.monotonic()
+
+    # ── Sampling ──────────────────────────────────────────────────────────────
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(CHECK_INTERVAL):
+            pos = _cursor_pos_win32()
+            if pos is not None:
+                self._check(*pos)
+
+    def _on_move(self, x: int, y: int) -> None:
+        # Runs for every mouse event system-wide: store and return
+        self._pos = (x, y)
+        self._moved.set()
+
+    def _event_loop(self) -> None:
+        while not self._stop.is_set():
+            self._moved.wait()
+            self._moved.clear()
+            if self._pos is not None:
+                self._check(*self._pos)
+            self._stop.wait(CHECK_INTERVAL)
+
+    def _check(self, x: int, y: int) -> None:
+        for left, top, right, bottom in self._corners:
+            if left <= x < right and top <= y < bottom:
+                request_abort(FAIL_SAFE_REASON)
+                return
+        if not any(l <= x < l + w and t <= y < t + h for l, t, w, h in self._monitors):
+            # The cursor is somewhere the cached layout doesn't know: displays changed
+            if time.monotonic() - self._last_refresh > GEOMETRY_RECHECK:
+                self.refresh_geometry()
+
+    # ── Hotkey ────────────────────────────────────────────────────────────────
+
+    def _register_hotkey(self) -> None:
+        try:
+            import keyboard
+            self._hotkey_handle = keyboard.add_hotkey(self._hotkey, request_abort, args=(HOTKEY_REASON,))
+        except Exception as e:
+            print(f"Abort hotkey '{self._hotkey}' not available: {e}")
+
+
+def _hot_corners(monitors, size: int) -> tuple[tuple[int, int, int, int], ...]:
+    """
+    (left, top, right, bottom) squares, `size` px wide, at every outer corner of
+    the virtual desktop. A monitor corner that borders another monitor
+    (the cursor passes through it rather than stopping there) is not a corner.
+    """
+    def covered(x, y):
+        return any(l <= x < l + w and t <= y < t + h for l, t, w, h in monitors)
+
+    corners = []
+    for l, t, w, h in monitors:
+        r, b = l + w - 1, t + h - 1       # last pixel column / row
+        for cx, cy, dx, dy in ((l, t, -1, -1), (r, t, 1, -1), (l, b, -1, 1), (r, b, 1, 1)):
+            if covered(cx + dx, cy) or covered(cx, cy + dy):
+                continue
+            x0 = cx if dx < 0 else cx - size + 1
+            y0 = cy if dy < 0 else cy - size + 1
+            corners.append((x0, y0, x0 + size, y0 + size))
+    return tuple(corners)
+
+
+def _cursor_pos_win32() -> tuple[int, int] | None:
+    """Current cursor position via GetCursorPos, or None off Windows."""
+    try:
+        from ctypes import wintypes
+        point = wintypes.POINT()
+        if ctypes.windll.user32.GetCursorPos(ctypes.byref(point)):
+            return point.x, point.y
+    except Exception:
+        pass
+    return None
 
 
 # ── Mouse actions ─────────────────────────────────────────────────────────────
+# Every action is planned as a list of primitive input events and injected
+# through input_backend in one call. In teleport mode (AGENT_INPUT_MOTION)
+# the cursor jumps straight to its target, so an action — or a whole run of
+# input steps in run_actions — is a single batch. In glide mode (default)
+# it visibly slides there first.
+
+_motion: str | None = None
+
+
+def _teleport() -> bool:
+    global _motion
+    if _motion is None:
+        from config import get_setting
+        _motion = "teleport" if get_setting("AGENT_INPUT_MOTION", "glide").lower() == "teleport" else "glide"
+    return _motion == "teleport"
+
 
 def _glide_to(x, y) -> None:
     """Visibly slide the cursor to pixel (x, y) over MOVE_DURATION seconds."""
-    pyautogui.moveTo(_px(x), _px(y), duration=MOVE_DURATION)
+    backend = get_backend()
+    x0, y0 = backend.position()
+    for i in range(1, GLIDE_STEPS + 1):
+        t = i / GLIDE_STEPS
+        backend.send([("move", round(x0 + (x - x0) * t), round(y0 + (y - y0) * t))])
+        if i < GLIDE_STEPS:
+            time.sleep(MOVE_DURATION / GLIDE_STEPS)
 
 
-def click(x, y) -> str:
-    """Glide the cursor to (x, y), then left-click at those exact coordinates."""
-    check_abort()
-    x, y = _px(x), _px(y)
-    _glide_to(x, y)
+def _pointer_plan(x, y, events: list[tuple], done: str) -> tuple:
+    """(target, events, report) for an action at crop-space (x, y)."""
+    x, y = _to_screen(x, y)
+    return (x, y), events, done.format(x=x, y=y)
+
+
+def _key_plan(events: list[tuple], done: str) -> tuple:
+    return None, events, done
+
+
+def _perform(plans: list[tuple]) -> list[str]:
+    """Inject planned actions — as one batch when teleporting — and return their reports."""
     check_abort()
-    pyautogui.click(x, y)
+    backend = get_backend()
+    if _teleport():
+        batch = []
+        for target, events, _ in plans:
+            if target is not None:
+                batch.append(("move", *target))
+            batch.extend(events)
+        backend.send(batch)
+    else:
+        for target, events, _ in plans:
+            if target is not None:
+                _glide_to(*target)
+                check_abort()
+            backend.send(events)
     time.sleep(POST_ACTION_PAUSE)
-    return f"Clicked at ({x}, {y})"
+    return [report for _, _, report in plans]
+
+
+def _scroll_clicks(clicks) -> int:
+    return int(round(float(str(clicks).replace(",", "").strip())))
+
+
+def click(x, y) -> str:
+    """Move the cursor to (x, y), then left-click at those exact coordinates."""
+    return _perform([_pointer_plan(x, y, click_events("left"), "Clicked at ({x}, {y})")])[0]
 
 
 def double_click(x, y) -> str:
-    """Glide to (x, y) and double-click at those exact coordinates."""
-    check_abort()
-    x, y = _px(x), _px(y)
-    _glide_to(x, y)
-    check_abort()
-    pyautogui.doubleClick(x, y)
-    time.sleep(POST_ACTION_PAUSE)
-    return f"Double-clicked at ({x}, {y})"
+    """Move to (x, y) and double-click at those exact coordinates."""
+    return _perform([_pointer_plan(x, y, click_events("left", 2), "Double-clicked at ({x}, {y})")])[0]
 
 
 def right_click(x, y) -> str:
-    """Glide to (x, y) and right-click at those exact coordinates."""
-    check_abort()
-    x, y = _px(x), _px(y)
-    _glide_to(x, y)
-    check_abort()
-    pyautogui.rightClick(x, y)
-    time.sleep(POST_ACTION_PAUSE)
-    return f"Right-clicked at ({x}, {y})"
+    """Move to (x, y) and right-click at those exact coordinates."""
+    return _perform([_pointer_plan(x, y, click_events("right"), "Right-clicked at ({x}, {y})")])[0]
 
 
 def move_mouse(x, y) -> str:
-    """Glide the cursor to (x, y) without clicking."""
-    check_abort()
-    _glide_to(_px(x), _px(y))
-    time.sleep(POST_ACTION_PAUSE)
-    return f"Moved mouse to ({x}, {y})"
+    """Move the cursor to (x, y) without clicking."""
+    return _perform([_pointer_plan(x, y, [], "Moved mouse to ({x}, {y})")])[0]
 
 
 def scroll(x, y, clicks) -> str:
-    """Glide to (x, y), then scroll."""
-    check_abort()
-    x, y, clicks = _px(x), _px(y), int(round(float(str(clicks).replace(",", "").strip())))
-    _glide_to(x, y)
-    check_abort()
-    pyautogui.scroll(clicks, x=x, y=y)
-    time.sleep(POST_ACTION_PAUSE)
+    """Move to (x, y), then scroll."""
+    return _perform([_scroll_plan(x, y, clicks)])[0]
+
+
+def _scroll_plan(x, y, clicks) -> tuple:
+    clicks = _scroll_clicks(clicks)
     direction = "up" if clicks > 0 else "down"
-    return f"Scrolled {direction} {abs(clicks)} clicks at ({x}, {y})"
+    return _pointer_plan(x, y, [("wheel", clicks)], f"Scrolled {direction} {abs(clicks)} clicks at ({{x}}, {{y}})")
 
 
 # ── Keyboard actions ──────────────────────────────────────────────────────────
@@ -182,23 +386,16 @@ def type_text(text: str) -> str:
     check_abort()
     import pyperclip
     pyperclip.copy(text)
-    pyautogui.hotkey("ctrl", "v")
-    time.sleep(POST_ACTION_PAUSE)
+    _perform([_key_plan(hotkey_events(["ctrl", "v"]), "")])
     return f"Typed: {text!r}"
 
 
 def press_key(key: str) -> str:
-    check_abort()
-    pyautogui.press(key)
-    time.sleep(POST_ACTION_PAUSE)
-    return f"Pressed key: {key}"
+    return _perform([_key_plan(key_events(key), f"Pressed key: {key}")])[0]
 
 
 def hotkey(*keys: str) -> str:
-    check_abort()
-    pyautogui.hotkey(*keys)
-    time.sleep(POST_ACTION_PAUSE)
-    return f"Pressed hotkey: {'+'.join(keys)}"
+    return _perform([_key_plan(hotkey_events(keys), f"Pressed hotkey: {'+'.join(keys)}")])[0]
 
 
 # ── Wait ──────────────────────────────────────────────────────────────────────
@@ -207,7 +404,7 @@ def wait(seconds: float) -> str:
     """Pause execution for `seconds` (max 10) so a page or animation can load."""
     check_abort()
     seconds = min(float(seconds), 10.0)
-    time.sleep(seconds)
+    sleep_or_abort(seconds)
     return f"Waited {seconds:.1f} s"
 
 
@@ -275,22 +472,217 @@ def count_windows(title: str) -> str:
         return f"Error counting windows: {e}"
 
 
+def active_window_title() -> str:
+    """Title of the foreground window, or "" if there is none / it can't be read."""
+    try:
+        win = gw.getActiveWindow()
+        return win.title if win else ""
+    except Exception:
+        return ""
+
+
+def wait_for_window(title: str, timeout: float = 10.0, focus: bool = True) -> str:
+    """
+    Poll until a window whose title contains `title` exists (max `timeout`, capped at 30 s).
+    Optionally bring it to the foreground. Raises TimeoutError if it never appears.
+    """
+    deadline = time.monotonic() + min(float(timeout), 30.0)
+    while True:
+        check_abort()
+        matches = gw.getWindowsWithTitle(title)
+        if matches:
+            if focus:
+                try:
+                    matches[0].activate()
+                except Exception:
+                    pass   # activate() can fail on a still-initialising window; it exists
+            return f"Window ready: {matches[0].title}"
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"No window containing '{title}' after {timeout} s")
+        sleep_or_abort(0.1)
+
+
+# ── Batched actions ───────────────────────────────────────────────────────────
+# One tool call runs a whole typed action list in-process — no interpreter
+# spawn, no quote escaping, abort checked between every step.
+
+_ACTIONS = {
+    "click":           lambda s: click(s["x"], s["y"]),
+    "double_click":    lambda s: double_click(s["x"], s["y"]),
+    "right_click":     lambda s: right_click(s["x"], s["y"]),
+    "move":            lambda s: move_mouse(s["x"], s["y"]),
+    "scroll":          lambda s: scroll(s["x"], s["y"], s["clicks"]),
+    "hotkey":          lambda s: hotkey(*s["keys"]),
+    "press":           lambda s: press_key(s["key"]),
+    "paste":           lambda s: type_text(s["text"]),
+    "wait":            lambda s: wait(s["seconds"]),
+    "focus_window":    lambda s: focus_window(s["title"]),
+    "wait_for_window": lambda s: wait_for_window(s["title"], s.get("timeout", 10.0), s.get("focus", True)),
+}
+
+ACTION_TYPES = tuple(_ACTIONS)
+
+# Steps that are pure input events: consecutive ones are sent as one batch in teleport mode
+_PLANS = {
+    "click":        lambda s: _pointer_plan(s["x"], s["y"], click_events("left"), "Clicked at ({x}, {y})"),
+    "double_click": lambda s: _pointer_plan(s["x"], s["y"], click_events("left", 2), "Double-clicked at ({x}, {y})"),
+    "right_click":  lambda s: _pointer_plan(s["x"], s["y"], click_events("right"), "Right-clicked at ({x}, {y})"),
+    "move":         lambda s: _pointer_plan(s["x"], s["y"], [], "Moved mouse to ({x}, {y})"),
+    "scroll":       lambda s: _scroll_plan(s["x"], s["y"], s["clicks"]),
+    "hotkey":       lambda s: _key_plan(hotkey_events(s["keys"]), f"Pressed hotkey: {'+'.join(s['keys'])}"),
+    "press":        lambda s: _key_plan(key_events(s["key"]), f"Pressed key: {s['key']}"),
+}
+
+
+def run_actions(steps: list[dict], stop_on_error: bool = True) -> str:
+    """
+    Execute a list of typed steps, e.g. {"type": "hotkey", "keys": ["ctrl", "t"]}.
+
+    Returns one report with a line per step and its duration, opened by
+    "Error: step K of N failed" when any step failed. A failing step
+    stops the batch unless `stop_on_error` is False. AbortedError propagates
+    so the fail-safe still ends the whole task.
+    """
+    if not isinstance(steps, list) or not steps:
+        return "Error: 'steps' must be a non-empty list of actions."
+
+    lines = []
+    succeeded = 0
+    first_failed = None
+    batch_start = time.perf_counter()
+    i = 0
+    while i < len(steps):
+        check_abort()
+        group = _input_run(steps, i) if _teleport() else []
+        if len(group) > 1:
+            # A run of pure input steps: one injection for all of them
+            t0 = time.perf_counter()
+            try:
+                reports = _perform([plan for _, plan in group])
+                status, outcomes = "ok", reports
+            except AbortedError:
+                raise
+            except Exception as e:
+                status, outcomes = "error", [str(e)] * len(group)
+            ms = (time.perf_counter() - t0) * 1000
+            for offset, ((kind, _), outcome) in enumerate(zip(group, outcomes)):
+                lines.append(f"{i + offset + 1}. [{status}] {kind}: {outcome}")
+            lines.append(f"   (steps {i + 1}-{i + len(group)} sent as one input batch in {ms:.1f} ms)")
+            i += len(group)
+            if status == "ok":
+                succeeded += len(group)
+                continue
+            first_failed = first_failed or i - len(group) + 1
+            failed_at = i
+        else:
+            step = steps[i]
+            i += 1
+            kind = step.get("type") if isinstance(step, dict) else None
+            action = _ACTIONS.get(kind)
+            t0 = time.perf_counter()
+            try:
+                if action is None:
+                    raise ValueError(f"unknown step type {kind!r} (expected one of {', '.join(ACTION_TYPES)})")
+                outcome = action(step)
+                status = "ok"
+            except AbortedError:
+                raise
+            except KeyError as e:
+                outcome, status = f"missing field {e}", "error"
+            except Exception as e:
+                outcome, status = str(e), "error"
+            ms = (time.perf_counter() - t0) * 1000
+            lines.append(f"{i}. [{status}] {kind}: {outcome} ({ms:.0f} ms)")
+            if status == "ok":
+                succeeded += 1
+                continue
+            first_failed = first_failed or i
+            failed_at = i
+        if stop_on_error:
+            skipped = len(steps) - failed_at
+            if skipped:
+                lines.append(f"Stopped — {skipped} remaining step(s) skipped.")
+            break
+
+    total_ms = (time.perf_counter() - batch_start) * 1000
+    summary = f"{succeeded}/{len(steps)} steps succeeded in {total_ms:.0f} ms"
+    if first_failed is not None:
+        # A fixed marker on the first line, so routing and macros see the failure
+        summary = f"Error: step {first_failed} of {len(steps)} failed — {summary}"
+    return summary + "\n" + "\n".join(lines)
+
+
+def _input_run(steps: list, start: int) -> list[tuple[str, tuple]]:
+    """The consecutive input-only steps from `start`, planned; stops at the first that isn't one."""
+    group = []
+    for step in steps[start:]:
+        kind = step.get("type") if isinstance(step, dict) else None
+        if kind not in _PLANS:
+            break
+        try:
+            plan = _PLANS[kind](step)
+        except Exception:
+            break          # malformed step: run it on its own so its error is reported
+        group.append((kind, plan))
+    return group
+
+
 # ── Shell ─────────────────────────────────────────────────────────────────────
 
-def run_command(command: str) -> str:
-    """Execute a Windows shell command and return stdout + stderr (max 60 s)."""
+def run_command(command: str, timeout: float = 60.0) -> str:
+    """
+    Execute a Windows shell command and return stdout + stderr (max 60 s).
+    The process is killed if the task is aborted or cancelled while it runs.
+    A non-zero exit is reported as "Error: exit code N" above the output.
+    """
     check_abort()
     try:
-        result = subprocess.run(
+        proc = subprocess.Popen(
             command,
             shell=True,
-            capture_output=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=60,
+            # Off Windows the shell leads its own process group, so _kill_tree reaches its children
+            start_new_session=not hasattr(ctypes, "windll"),
         )
-        output = (result.stdout + result.stderr).strip()
-        return output[:3000] if output else "(no output)"
-    except subprocess.TimeoutExpired:
-        return "Command timed out after 60 seconds."
     except Exception as e:
         return f"Error running command: {e}"
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=0.1)
+            break
+        except subprocess.TimeoutExpired:
+            if is_aborted() or time.monotonic() >= deadline:
+                _kill_tree(proc)
+                proc.communicate()
+                check_abort()
+                return f"Error: command timed out after {timeout:.0f} seconds."
+        except Exception as e:
+            _kill_tree(proc)
+            return f"Error running command: {e}"
+
+    output = (stdout + stderr).strip()
+    if len(output) > MAX_COMMAND_OUTPUT:
+        # The agent compacts long output itself (compaction.py); this only bounds runaway commands
+        half = MAX_COMMAND_OUTPUT // 2
+        output = f"{output[:half]}\n… ({len(output) - 2 * half} characters cut) …\n{output[-half:]}"
+    if proc.returncode:
+        return f"Error: exit code {proc.returncode}\n{output}".rstrip()
+    return output if output else "(no output)"
+
+
+def _kill_tree(proc: subprocess.Popen) -> None:
+    """Kill a shell=True process together with the program it launched."""
+    try:
+        if hasattr(ctypes, "windll"):
+            subprocess.run(
+                f"taskkill /F /T /PID {proc.pid}",
+                shell=True, capture_output=True, timeout=5,
+            )
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)   # the /bin/sh wrapper and everything it started
+    except Exception:
+        proc.kill()
@@ -0,0 +1,301 @@
+"""
+fileindex.py — Incremental on-disk index of file paths for find_files.
+
+Responsibilities:
+  - Keep every file and folder under the index roots in one SQLite table
+    (.cache/files.sqlite3): path, parent, lower-cased name, extension,
+    size and mtime
+  - Refresh it incrementally on a background thread: a folder is listed
+    again only when its own mtime changed (adding, removing or renaming an
+    entry bumps it); unchanged folders cost one stat() each
+  - Answer substring, glob and extension queries from the table in
+    milliseconds instead of walking the disk per search
+
+Roots come from AGENT_INDEX_ROOTS (os.pathsep-separated, default: the
+user's home folder); AGENT_INDEX_ROOTS=off disables the index. Hidden
+folders and SKIP_DIRS (AppData, node_modules …) are not descended into.
+"""
+
+import os
+import sqlite3
+import stat
+import threading
+import time
+from pathlib import Path
+
+from config import get_setting
+
+INDEX_FILE = Path(__file__).parent / ".cache" / "files.sqlite3"
+RESCAN_INTERVAL = 300.0   # seconds between background refreshes
+REFRESH_ON_MISS = 10.0    # a query with no hits refreshes first if the index is older than this
+COMMIT_EVERY = 200        # folders per write transaction during a scan
+MAX_RESULTS = 50
+
+SKIP_DIRS = frozenset({
+    "appdata", "node_modules", "__pycache__", "site-packages", "venv", "env",
+    "$recycle.bin", "system volume information", "onedrivetemp",
+})
+
+_REPARSE_POINT = getattr(stat, "FILE_ATTRIBUTE_REPARSE_POINT", 0x400)
+
+
+def configured_roots() -> list[Path]:
+    """Index roots from AGENT_INDEX_ROOTS; empty when the index is disabled."""
+    value = get_setting("AGENT_INDEX_ROOTS", "")
+    if value.lower() == "off":
+        return []
+    if not value:
+        return [Path.home()]
+    return [Path(os.path.expandvars(os.path.expanduser(p))) for p in value.split(os.pathsep) if p.strip()]
+
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+
+class FileIndex:
+    """SQLite table of paths under `roots`, refreshed by update() and a background thread."""
+
+    def __init__(self, roots: list[Path], path: Path = INDEX_FILE):
+        self.roots = [str(r.resolve()) if r.exists() else str(r) for r in roots]
+        self._lock = threading.Lock()          # guards the connection
+        self._scan_lock = threading.Lock()     # one scan at a time
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.last_scan = 0.0                   # monotonic end of the last complete scan
+        self._scan_started = 0.0               # monotonic start of that scan
+        self.scanning = False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " path TEXT PRIMARY KEY, parent TEXT NOT NULL, name TEXT NOT NULL, ext TEXT NOT NULL,"
+            " is_dir INTEGER NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);"
+            "CREATE INDEX IF NOT EXISTS entries_ext ON entries (ext);"
+        )
+        self._db.commit()
+
+    # ── Background refresh ────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Scan now and every RESCAN_INTERVAL seconds on a daemon thread (idempotent)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="file-index", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.update()
+            except Exception:
+                pass                  # disk hiccup: try again next round
+            self._wake.wait(RESCAN_INTERVAL)
+            self._wake.clear()
+
+    def update(self) -> None:
+        """Bring the table up to date with the disk (incremental)."""
+        requested = time.monotonic()
+        with self._scan_lock:
+            if self._scan_started >= requested:
+                return                # a scan that started after us just finished
+            started = time.monotonic()
+            self.scanning = True
+            try:
+                self._prune_roots()
+                for root in self.roots:
+                    self._scan(root)
+            finally:
+                self.scanning = False
+            self._scan_started, self.last_scan = started, time.monotonic()
+
+    def _prune_roots(self) -> None:
+        """Drop rows left over from roots no longer configured."""
+        with self._lock:
+            rows = self._db.execute("SELECT path FROM entries WHERE parent = ''").fetchall()
+            for (path,) in rows:
+                if path not in self.roots:
+                    self._delete_tree(path)
+            for root in self.roots:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO entries VALUES (?, '', ?, '', 1, 0, -1)",
+                    (root, os.path.basename(root).lower()),
+                )
+            self._db.commit()
+
+    def _scan(self, root: str) -> None:
+        stack, pending = [root], 0
+        while stack:
+            folder = stack.pop()
+            try:
+                mtime = os.stat(folder).st_mtime
+            except OSError:
+                with self._lock:
+                    self._delete_tree(folder)
+                continue
+            with self._lock:
+                row = self._db.execute("SELECT mtime FROM entries WHERE path = ?", (folder,)).fetchone()
+                if row is not None and row[0] == mtime:
+                    # Listing unchanged: only its subfolders can hold news
+                    stack.extend(p for (p,) in self._db.execute(
+                        "SELECT path FROM entries WHERE parent = ? AND is_dir = 1", (folder,)))
+                    continue
+            files, folders = _list(folder)
+            with self._lock:
+                known = dict(self._db.execute(
+                    "SELECT path, is_dir FROM entries WHERE parent = ?", (folder,)).fetchall())
+                current = {e[0] for e in files} | {e[0] for e in folders}
+                for path in known.keys() - current:
+                    self._delete_tree(path)
+                self._db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, 0, ?, ?)", files)
+                # New folders get mtime -1 so they are listed; known ones keep theirs
+                self._db.executemany("INSERT OR IGNORE INTO entries VALUES (?, ?, ?, '', 1, 0, -1)", folders)
+                self._db.execute("UPDATE entries SET mtime = ? WHERE path = ?", (mtime, folder))
+                pending += 1
+                if pending >= COMMIT_EVERY:
+                    self._db.commit()
+                    pending = 0
+            stack.extend(e[0] for e in folders)
+        with self._lock:
+            self._db.commit()
+
+    def _delete_tree(self, path: str) -> None:
+        """Remove `path` and everything below it (caller holds the lock)."""
+        prefix = path.rstrip("\\/") + os.sep
+        upper = prefix[:-1] + chr(ord(os.sep) + 1)
+        self._db.execute("DELETE FROM entries WHERE path = ? OR (path >= ? AND path < ?)",
+                         (path, prefix, upper))
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def search(self, query: str = "", ext: str = "", under: str = "", limit: int = 20) -> list[dict]:
+        """
+        Entries whose name matches `query`:
+          - with * or ?: a glob on the name ("report*.docx")
+          - otherwise every whitespace-separated term must appear in the name
+        `ext` (".pdf" or "pdf") restricts to one extension and `under` to a
+        folder. Exact names rank first, then names starting with the first
+        term, then the most recently modified.
+        """
+        query = query.strip().lower()
+        where, params, order = [], [], []
+        if any(c in query for c in "*?["):
+            where.append("name GLOB ?")
+            params.append(query)
+        else:
+            terms = query.split()
+            where += ["instr(name, ?) > 0"] * len(terms)
+            params += terms
+            if terms:
+                order += ["name = ? DESC", "instr(name, ?) = 1 DESC"]
+        if ext:
+            where.append("ext = ?")
+            params.append("." + ext.lower().lstrip("*."))
+        if under:
+            folder = os.path.normcase(os.path.abspath(os.path.expanduser(under))).rstrip("\\/") + os.sep
+            where.append("lower(substr(path, 1, ?)) = ?")
+            params += [len(folder), folder.lower()]
+        if not where:
+            return []
+        order_params = [query, query.split()[0]] if order else []
+        sql = (f"SELECT path, is_dir, size, mtime FROM entries WHERE parent != '' AND {' AND '.join(where)} "
+               f"ORDER BY {', '.join(order + ['mtime DESC'])} LIMIT ?")
+        with self._lock:
+            rows = self._db.execute(sql, [*params, *order_params, min(limit, MAX_RESULTS)]).fetchall()
+        return [{"path": p, "is_dir": bool(d), "size": s, "mtime": m} for p, d, s, m in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def _list(folder: str) -> tuple[list[tuple], list[tuple]]:
+    """(file rows, folder rows) for one directory listing; unreadable folders list as empty."""
+    files, folders = [], []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        name = entry.name.lower()
+                        if name.startswith((".", "$")) or name in SKIP_DIRS or _is_link(entry):
+                            continue
+                        folders.append((entry.path, folder, name))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        name = entry.name.lower()
+                        files.append((entry.path, folder, name, os.path.splitext(name)[1],
+                                      st.st_size, st.st_mtime))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, folders
+
+
+def _is_link(entry) -> bool:
+    """Symlinks and Windows junctions ("Application Data", "My Documents" …) — never followed."""
+    if entry.is_symlink():
+        return True
+    attributes = getattr(entry.stat(follow_symlinks=False), "st_file_attributes", 0)
+    return bool(attributes & _REPARSE_POINT)
+
+
+# ── Front end ─────────────────────────────────────────────────────────────────
+
+_index: FileIndex | None = None
+_state_lock = threading.Lock()
+
+
+def get_index() -> FileIndex | None:
+    """The shared index, created and started on first use; None when disabled or unusable."""
+    global _index
+    with _state_lock:
+        if _index is None:
+            roots = configured_roots()
+            if not roots:
+                return None
+            try:
+                _index = FileIndex(roots)
+            except (OSError, sqlite3.Error):
+                return None
+            _index.start()
+        return _index
+
+
+def find_files(query: str = "", ext: str = "", under: str = "", limit: int = 20, refresh: bool = False) -> str:
+    """Look files up in the index and format them for the model."""
+    index = get_index()
+    if index is None:
+        return "Error: the file index is disabled (AGENT_INDEX_ROOTS=off) — use run_command."
+    if not (query.strip() or ext or under):
+        return "Error: give a query, an extension or a folder."
+    if refresh and not index.scanning:
+        index.update()
+    try:
+        hits = index.search(query, ext, under, limit)
+        if not hits and not index.scanning and time.monotonic() - index.last_scan > REFRESH_ON_MISS:
+            index.update()
+            hits = index.search(query, ext, under, limit)
+    except sqlite3.Error as e:
+        return f"Error: file index query failed: {e}"
+
+    if index.scanning and index.last_scan == 0.0:
+        note = f"(Index still being built — {len(index)} entries so far; results may be incomplete.)"
+    else:
+        note = f"(Index of {', '.join(index.roots)}, refreshed {time.monotonic() - index.last_scan:.0f} s ago.)"
+    if not hits:
+        return f"No indexed files match. {note}"
+    lines = []
+    for hit in hits:
+        if hit["is_dir"]:
+            lines.append(f"{hit['path']}{os.sep}  (folder)")
+        else:
+            modified = time.strftime("%Y-%m-%d %H:%M", time.localtime(hit["mtime"]))
+            lines.append(f"{hit['path']}  ({_size(hit['size'])}, modified {modified})")
+    return "\n".join(lines + [note])
+
+
+def _size(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
@@ -0,0 +1,256 @@
+"""
+fileio.py — Native file tools: read_file, write_file, grep_file.
+
+Responsibilities:
+  - Read a byte range or a line range of a file without loading the rest:
+    byte ranges seek straight to `offset`, line ranges stream the file in
+    chunks and stop after the last wanted line
+  - Write or append text, overwriting atomically (temp file + replace)
+  - Search a file for a string or regex and return only the matching lines
+    with a few lines of context; files over MMAP_THRESHOLD are searched
+    through a memory map instead of being read into memory
+
+Every result is capped at MAX_OUTPUT_CHARS and says how to fetch the next
+part (offset / start_line), so nothing is silently cut off. Errors come
+back as "Error: …" strings like the other tools.
+
+Relative paths are taken from the user's home folder.
+"""
+
+import mmap
+import os
+import re
+import tempfile
+from pathlib import Path
+
+MAX_OUTPUT_CHARS = 20_000
+MAX_LINE_CHARS = 400        # longer lines are clipped in line and grep output
+MMAP_THRESHOLD = 1 << 20    # bytes; bigger files are grep'd through mmap
+READ_CHUNK = 1 << 16
+BINARY_SNIFF = 8192
+
+_BOMS = (
+    (b"\xef\xbb\xbf", "utf-8-sig"),
+    (b"\xff\xfe", "utf-16"),
+    (b"\xfe\xff", "utf-16"),
+)
+
+
+def resolve(path: str) -> Path:
+    """Expand ~ and %VARS%; relative paths are taken from the home folder."""
+    p = Path(os.path.expandvars(os.path.expanduser(str(path).strip().strip('"'))))
+    return p if p.is_absolute() else Path.home() / p
+
+
+def _encoding(head: bytes) -> str | None:
+    """Text encoding from a BOM (utf-8 otherwise), or None for a binary file."""
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    return None if b"\0" in head else "utf-8"
+
+
+def _clip(line: str) -> str:
+    return line if len(line) <= MAX_LINE_CHARS else line[:MAX_LINE_CHARS] + " …"
+
+
+def _open_text(path: str):
+    """(Path, size, encoding) or an error string."""
+    p = resolve(path)
+    try:
+        size = p.stat().st_size
+        with open(p, "rb") as f:
+            head = f.read(BINARY_SNIFF)
+    except IsADirectoryError:
+        return f"Error: {p} is a folder."
+    except OSError as e:
+        return f"Error: cannot open {p}: {e.strerror or e}"
+    encoding = _encoding(head)
+    if encoding is None:
+        return f"Error: {p} looks binary ({size} bytes) — not shown."
+    return p, size, encoding
+
+
+# ── read_file ─────────────────────────────────────────────────────────────────
+
+def read_file(path: str, offset: int | None = None, length: int | None = None,
+              start_line: int | None = None, end_line: int | None = None) -> str:
+    """
+    Read part of a text file. With start_line/end_line (1-based, inclusive)
+    the lines are returned numbered; otherwise `length` bytes from byte
+    `offset` (default: the start).
+    """
+    opened = _open_text(path)
+    if isinstance(opened, str):
+        return opened
+    p, size, encoding = opened
+    if start_line is not None or end_line is not None:
+        return _read_lines(p, encoding, max(int(start_line or 1), 1), end_line)
+    return _read_bytes(p, size, encoding, max(int(offset or 0), 0), length)
+
+
+def _read_bytes(p: Path, size: int, encoding: str, offset: int, length: int | None) -> str:
+    want = MAX_OUTPUT_CHARS if length is None else min(max(int(length), 1), MAX_OUTPUT_CHARS)
+    if offset >= size:
+        return f"(offset {offset} is at or past the end — {p} is {size} bytes)"
+    with open(p, "rb") as f:
+        f.seek(offset)
+        data = f.read(want)
+    text = data.decode("utf-8" if encoding == "utf-8-sig" and offset else encoding, errors="replace")
+    end = offset + len(data)
+    header = f"{p} — bytes {offset}-{end} of {size}"
+    if end < size:
+        return f"{header}\n{text}\n(… {size - end} more bytes: read_file(path, offset={end}))"
+    return f"{header}\n{text}"
+
+
+def _read_lines(p: Path, encoding: str, start: int, end: int | None) -> str:
+    out, used, number, more = [], 0, 0, False
+    with open(p, encoding=encoding, errors="replace", newline=None, buffering=READ_CHUNK) as f:
+        for number, line in enumerate(f, 1):
+            if number < start:
+                continue
+            if end is not None and number > int(end):
+                break
+            entry = f"{number:>6}  {_clip(line.rstrip(chr(10)))}"
+            if used + len(entry) > MAX_OUTPUT_CHARS and out:
+                more = True
+                break
+            out.append(entry)
+            used += len(entry) + 1
+    if not out:
+        return f"(no lines from {start} — {p} has {number} lines)"
+    first, last = start, start + len(out) - 1
+    tail = f"\n(output limit reached: read_file(path, start_line={last + 1}) to continue)" if more else ""
+    return f"{p} — lines {first}-{last}\n" + "\n".join(out) + tail
+
+
+# ── write_file ────────────────────────────────────────────────────────────────
+
+def write_file(path: str, content: str, append: bool = False) -> str:
+    """Write `content` (UTF-8) to `path`, creating folders; overwrites atomically unless `append`."""
+    p = resolve(path)
+    data = content.encode("utf-8")
+    try:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        if append:
+            with open(p, "ab") as f:
+                f.write(data)
+        else:
+            fd, tmp = tempfile.mkstemp(dir=p.parent, prefix=f".{p.name}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, p)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+    except OSError as e:
+        return f"Error: cannot write {p}: {e.strerror or e}"
+    return f"{'Appended' if append else 'Wrote'} {len(data)} bytes to {p} (now {p.stat().st_size} bytes)."
+
+
+# ── grep_file ─────────────────────────────────────────────────────────────────
+
+def grep_file(path: str, pattern: str, regex: bool = False, ignore_case: bool = True,
+              context: int = 2, max_matches: int = 20) -> str:
+    """Matching lines of a text file, each with `context` lines around it, merged when they overlap."""
+    if not pattern:
+        return "Error: empty pattern."
+    opened = _open_text(path)
+    if isinstance(opened, str):
+        return opened
+    p, size, encoding = opened
+    if encoding == "utf-16":
+        # Searched as UTF-8 text; UTF-16 files are small in practice (.reg exports, some logs)
+        blob = p.read_text(encoding=encoding, errors="replace").encode("utf-8")
+        return _grep(p, blob, pattern, regex, ignore_case, context, max_matches)
+    if size == 0:
+        return f"No match for {pattern!r} in {p} (empty file)."
+    with open(p, "rb") as f:
+        if size < MMAP_THRESHOLD:
+            return _grep(p, f.read(), pattern, regex, ignore_case, context, max_matches)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+            return _grep(p, blob, pattern, regex, ignore_case, context, max_matches)
+
+
+def _grep(p: Path, blob, pattern: str, regex: bool, ignore_case: bool, context: int, max_matches: int) -> str:
+    try:
+        source = pattern.encode("utf-8") if regex else re.escape(pattern.encode("utf-8"))
+        compiled = re.compile(source, re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        return f"Error: bad regex {pattern!r}: {e}"
+    context = min(max(int(context), 0), 10)
+    max_matches = min(max(int(max_matches), 1), 200)
+
+    # Line numbers are counted incrementally between matches, never from the start again
+    windows, line_no, counted_to, total, line_end = [], 1, 0, 0, -1
+    for match in compiled.finditer(blob):
+        pos = match.start()
+        if pos <= line_end:
+            continue                            # another hit on a line already reported
+        total += 1
+        line_no += _count(blob, counted_to, pos)
+        counted_to = pos
+        start = blob.rfind(b"\n", 0, pos) + 1
+        line_end = blob.find(b"\n", pos)
+        line_end = len(blob) if line_end < 0 else line_end
+        if len(windows) < max_matches:
+            windows.append(_window(blob, start, line_end, line_no, context))
+
+    if not total:
+        return f"No match for {pattern!r} in {p}."
+    header = f"{p}: {total} matching line(s)" + (f", showing the first {len(windows)}" if total > len(windows) else "")
+    out, used = [header], len(header)
+    for first, lines in _merge(windows):
+        block = "\n".join(lines)
+        if used + len(block) > MAX_OUTPUT_CHARS:
+            out.append(f"(output limit reached — narrow the pattern or read_file(path, start_line={first}))")
+            break
+        out += ["--", block]
+        used += len(block) + 3
+    return "\n".join(out)
+
+
+def _count(blob, start: int, end: int) -> int:
+    """Newlines in blob[start:end] — mmap has no count(), so it is walked without copying."""
+    if isinstance(blob, bytes):
+        return blob.count(b"\n", start, end)
+    n, pos = 0, blob.find(b"\n", start, end)
+    while pos >= 0:
+        n += 1
+        pos = blob.find(b"\n", pos + 1, end)
+    return n
+
+
+def _window(blob, start: int, end: int, line_no: int, context: int) -> tuple[int, int, list[str]]:
+    """(first line number, match line number, raw lines) around one matching line."""
+    begin = start
+    for _ in range(context):
+        if begin == 0:
+            break
+        begin = blob.rfind(b"\n", 0, begin - 1) + 1
+    stop = end
+    for _ in range(context):
+        if stop + 1 >= len(blob):
+            break                               # no line after this one (or only the final newline)
+        nxt = blob.find(b"\n", stop + 1)
+        stop = len(blob) if nxt < 0 else nxt
+    raw = bytes(blob[begin:stop]).decode("utf-8", errors="replace").split("\n")
+    return line_no - _count(blob, begin, start), line_no, raw
+
+
+def _merge(windows):
+    """Join windows whose line ranges overlap or touch; yields (first line, formatted lines)."""
+    merged: list[tuple[dict[int, str], set[int]]] = []
+    for first, match, raw in windows:
+        numbered = {first + i: text for i, text in enumerate(raw)}
+        if merged and first <= max(merged[-1][0]) + 1:
+            merged[-1][0].update(numbered)
+            merged[-1][1].add(match)
+        else:
+            merged.append((numbered, {match}))
+    for numbered, matches in merged:
+        yield min(numbered), [
+            f"{n:>6}{'>' if n in matches else ' '} {_clip(numbered[n].rstrip(chr(13)))}" for n in sorted(numbered)
+        ]
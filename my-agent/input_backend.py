@@ -0,0 +1,384 @@
+"""
+input_backend.py — Batched low-level input injection.
+
+controller.py builds each action as a short list of primitive events and
+hands the whole list to the active backend in one call:
+
+    ("move", x, y)          absolute, virtual-desktop pixels
+    ("down", button)        button: "left" | "right" | "middle"
+    ("up", button)
+    ("wheel", clicks)       same units pyautogui.scroll() used on this platform
+    ("key_down", key)       key: canonical name ("ctrl", "enter", "f5") or one character
+    ("key_up", key)
+
+Backends:
+  - SendInputBackend   Windows: the whole list goes out in one SendInput call
+  - XTestBackend       Linux/X11: XTest fake_input per event, then one flush
+                       (needs python-xlib)
+  - PyAutoGuiBackend   anything else: event by event through pyautogui
+  - RecordingBackend   records events without touching the desktop (tests, dry runs)
+
+AGENT_INPUT_BACKEND selects one (auto · sendinput · xtest · pyautogui · record);
+auto picks the native backend when it loads, pyautogui otherwise.
+"""
+
+import ctypes
+import sys
+import threading
+
+BUTTONS = ("left", "right", "middle")
+
+# Alternative spellings (pyautogui's and common ones) → canonical key name
+_ALIASES = {
+    "return": "enter", "escape": "esc", "control": "ctrl", "ctrlleft": "ctrl",
+    "altleft": "alt", "option": "alt", "shiftleft": "shift",
+    "cmd": "win", "command": "win", "super": "win", "meta": "win", "winleft": "win",
+    "del": "delete", "ins": "insert", "pgup": "pageup", "page_up": "pageup",
+    "pgdn": "pagedown", "page_down": "pagedown", "prtsc": "printscreen", "prtscr": "printscreen",
+    "print": "printscreen", "prntscrn": "printscreen", "caps": "capslock", "menu": "apps",
+    "spacebar": "space", " ": "space", "\n": "enter", "\t": "tab", "back": "backspace",
+}
+
+
+def canonical_key(key: str) -> str:
+    """Normalise a key name; single characters keep their case."""
+    if len(key) == 1 and key not in _ALIASES:
+        return key
+    name = key.strip().lower().replace(" ", "")
+    return _ALIASES.get(name, name)
+
+
+# ── Event builders ────────────────────────────────────────────────────────────
+
+def click_events(button: str = "left", count: int = 1) -> list[tuple]:
+    return [ev for _ in range(count) for ev in (("down", button), ("up", button))]
+
+
+def key_events(key: str) -> list[tuple]:
+    key = canonical_key(key)
+    return [("key_down", key), ("key_up", key)]
+
+
+def hotkey_events(keys) -> list[tuple]:
+    """Press `keys` in order, release in reverse (ctrl+shift+t)."""
+    keys = [canonical_key(k) for k in keys]
+    return [("key_down", k) for k in keys] + [("key_up", k) for k in reversed(keys)]
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+
+class InputBackend:
+    """Sends a list of primitive events; see the module docstring."""
+
+    name = "base"
+
+    def send(self, events: list[tuple]) -> None:
+        raise NotImplementedError
+
+    def position(self) -> tuple[int, int]:
+        raise NotImplementedError
+
+
+class RecordingBackend(InputBackend):
+    """Keeps every batch in `batches` instead of injecting it."""
+
+    name = "record"
+
+    def __init__(self):
+        self.batches: list[list[tuple]] = []
+        self._pos = (0, 0)
+
+    def send(self, events):
+        events = list(events)
+        for event in events:
+            if event[0] == "move":
+                self._pos = (event[1], event[2])
+        self.batches.append(events)
+
+    def position(self):
+        return self._pos
+
+    @property
+    def events(self) -> list[tuple]:
+        return [event for batch in self.batches for event in batch]
+
+
+class PyAutoGuiBackend(InputBackend):
+    """Portable fallback: one pyautogui call per event."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self._gui = pyautogui
+
+    def send(self, events):
+        gui = self._gui
+        for event in events:
+            kind = event[0]
+            if kind == "move":
+                gui.moveTo(event[1], event[2])
+            elif kind == "down":
+                gui.mouseDown(button=event[1])
+            elif kind == "up":
+                gui.mouseUp(button=event[1])
+            elif kind == "wheel":
+                gui.scroll(event[1])
+            elif kind == "key_down":
+                gui.keyDown(event[1])
+            elif kind == "key_up":
+                gui.keyUp(event[1])
+            else:
+                raise ValueError(f"unknown input event {event!r}")
+
+    def position(self):
+        x, y = self._gui.position()
+        return int(x), int(y)
+
+
+# ── Windows: SendInput ────────────────────────────────────────────────────────
+
+_VK = {
+    "backspace": 0x08, "tab": 0x09, "enter": 0x0D, "shift": 0x10, "ctrl": 0x11, "alt": 0x12,
+    "pause": 0x13, "capslock": 0x14, "esc": 0x1B, "space": 0x20, "pageup": 0x21, "pagedown": 0x22,
+    "end": 0x23, "home": 0x24, "left": 0x25, "up": 0x26, "right": 0x27, "down": 0x28,
+    "printscreen": 0x2C, "insert": 0x2D, "delete": 0x2E, "win": 0x5B, "winright": 0x5C, "apps": 0x5D,
+    "numlock": 0x90, "scrolllock": 0x91, "shiftright": 0xA1, "ctrlright": 0xA3, "altright": 0xA5,
+    "volumemute": 0xAD, "volumedown": 0xAE, "volumeup": 0xAF,
+    "nexttrack": 0xB0, "prevtrack": 0xB1, "playpause": 0xB3,
+    **{f"f{i}": 0x6F + i for i in range(1, 25)},
+}
+# Keys that need KEYEVENTF_EXTENDEDKEY
+_EXTENDED_VK = frozenset({0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28, 0x2C, 0x2D, 0x2E,
+                          0x5B, 0x5C, 0x5D, 0x90, 0xA3, 0xA5})
+
+_MOUSE_FLAGS = {
+    ("down", "left"): 0x0002, ("up", "left"): 0x0004,
+    ("down", "right"): 0x0008, ("up", "right"): 0x0010,
+    ("down", "middle"): 0x0020, ("up", "middle"): 0x0040,
+}
+_MOUSEEVENTF_MOVE = 0x0001
+_MOUSEEVENTF_WHEEL = 0x0800
+_MOUSEEVENTF_VIRTUALDESK = 0x4000
+_MOUSEEVENTF_ABSOLUTE = 0x8000
+_KEYEVENTF_EXTENDEDKEY = 0x0001
+_KEYEVENTF_KEYUP = 0x0002
+
+
+class SendInputBackend(InputBackend):
+    """Windows: build an INPUT array and inject the whole batch with one SendInput call."""
+
+    name = "sendinput"
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD),
+                        ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD),
+                        ("dwExtraInfo", ctypes.c_size_t)]
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD),
+                        ("time", wintypes.DWORD), ("dwExtraInfo", ctypes.c_size_t)]
+
+        class HARDWAREINPUT(ctypes.Structure):
+            _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD), ("wParamH", wintypes.WORD)]
+
+        class _U(ctypes.Union):
+            _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _anonymous_ = ("u",)
+            _fields_ = [("type", wintypes.DWORD), ("u", _U)]
+
+        self._INPUT = INPUT
+        self._user32 = ctypes.windll.user32
+        self._user32.SendInput.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+        self._user32.VkKeyScanW.restype = ctypes.c_short
+
+    def send(self, events):
+        inputs = []
+        for event in events:
+            inputs.extend(self._translate(event))
+        if not inputs:
+            return
+        array = (self._INPUT * len(inputs))(*inputs)
+        sent = self._user32.SendInput(len(inputs), array, ctypes.sizeof(self._INPUT))
+        if sent != len(inputs):
+            raise OSError(f"SendInput injected {sent}/{len(inputs)} events (blocked by UIPI or another desktop?)")
+
+    def position(self):
+        from ctypes import wintypes
+        point = wintypes.POINT()
+        self._user32.GetCursorPos(ctypes.byref(point))
+        return point.x, point.y
+
+    def _translate(self, event) -> list:
+        kind = event[0]
+        if kind == "move":
+            # Absolute coordinates are normalised to 0..65535 across the virtual desktop
+            vx, vy = self._user32.GetSystemMetrics(76), self._user32.GetSystemMetrics(77)
+            vw, vh = self._user32.GetSystemMetrics(78), self._user32.GetSystemMetrics(79)
+            dx = round((event[1] - vx) * 65535 / max(vw - 1, 1))
+            dy = round((event[2] - vy) * 65535 / max(vh - 1, 1))
+            flags = _MOUSEEVENTF_MOVE | _MOUSEEVENTF_ABSOLUTE | _MOUSEEVENTF_VIRTUALDESK
+            return [self._mouse(dx, dy, 0, flags)]
+        if kind in ("down", "up"):
+            return [self._mouse(0, 0, 0, _MOUSE_FLAGS[(kind, event[1])])]
+        if kind == "wheel":
+            return [self._mouse(0, 0, int(event[1]) & 0xFFFFFFFF, _MOUSEEVENTF_WHEEL)]
+        if kind in ("key_down", "key_up"):
+            return self._key(event[1], up=kind == "key_up")
+        raise ValueError(f"unknown input event {event!r}")
+
+    def _mouse(self, dx, dy, data, flags):
+        item = self._INPUT(type=0)
+        item.mi.dx, item.mi.dy, item.mi.mouseData, item.mi.dwFlags = dx, dy, data, flags
+        return item
+
+    def _key(self, key: str, up: bool) -> list:
+        vk = _VK.get(key)
+        shift = False
+        if vk is None:
+            if len(key) != 1:
+                raise ValueError(f"unknown key {key!r}")
+            if key.isascii() and key.isalnum():
+                # VK codes of letters and digits are their ASCII capitals; VkKeyScanW
+                # has no answer for them on non-Latin layouts (Hebrew, Russian …)
+                vk, shift = ord(key.upper()), key.isupper()
+            else:
+                scan = self._user32.VkKeyScanW(ord(key))
+                if scan == -1:
+                    raise ValueError(f"key {key!r} is not on the current keyboard layout")
+                vk, shift = scan & 0xFF, bool(scan & 0x100)
+        flags = (_KEYEVENTF_EXTENDEDKEY if vk in _EXTENDED_VK else 0) | (_KEYEVENTF_KEYUP if up else 0)
+        items = [self._keybd(vk, flags)]
+        if shift:
+            # A shifted character ("A", "?") carries its own shift press around it
+            items = [self._keybd(0x10, 0), *items, self._keybd(0x10, _KEYEVENTF_KEYUP)] if not up else items
+        return items
+
+    def _keybd(self, vk: int, flags: int):
+        item = self._INPUT(type=1)
+        item.ki.wVk, item.ki.dwFlags = vk, flags
+        return item
+
+
+# ── Linux: XTest ──────────────────────────────────────────────────────────────
+
+_KEYSYMS = {
+    "enter": "Return", "tab": "Tab", "backspace": "BackSpace", "esc": "Escape", "space": "space",
+    "delete": "Delete", "insert": "Insert", "home": "Home", "end": "End", "pageup": "Prior",
+    "pagedown": "Next", "left": "Left", "up": "Up", "right": "Right", "down": "Down",
+    "shift": "Shift_L", "shiftright": "Shift_R", "ctrl": "Control_L", "ctrlright": "Control_R",
+    "alt": "Alt_L", "altright": "Alt_R", "win": "Super_L", "winright": "Super_R",
+    "capslock": "Caps_Lock", "numlock": "Num_Lock", "scrolllock": "Scroll_Lock",
+    "printscreen": "Print", "pause": "Pause", "apps": "Menu",
+    "volumemute": "XF86AudioMute", "volumedown": "XF86AudioLowerVolume", "volumeup": "XF86AudioRaiseVolume",
+    "nexttrack": "XF86AudioNext", "prevtrack": "XF86AudioPrev", "playpause": "XF86AudioPlay",
+    **{f"f{i}": f"F{i}" for i in range(1, 25)},
+}
+_X_BUTTONS = {"left": 1, "middle": 2, "right": 3}
+
+
+class XTestBackend(InputBackend):
+    """X11: queue XTest fake events for the whole batch and flush once."""
+
+    name = "xtest"
+
+    def __init__(self):
+        from Xlib import X, XK, display
+        from Xlib.ext import xtest
+        self._X, self._XK, self._xtest = X, XK, xtest
+        self._display = display.Display()
+        if not self._display.has_extension("XTEST"):
+            raise OSError("X server has no XTEST extension")
+        self._lock = threading.Lock()
+
+    def send(self, events):
+        X, fake = self._X, self._xtest.fake_input
+        with self._lock:
+            d = self._display
+            for event in events:
+                kind = event[0]
+                if kind == "move":
+                    fake(d, X.MotionNotify, x=int(event[1]), y=int(event[2]))
+                elif kind in ("down", "up"):
+                    fake(d, X.ButtonPress if kind == "down" else X.ButtonRelease, _X_BUTTONS[event[1]])
+                elif kind == "wheel":
+                    button = 4 if event[1] > 0 else 5
+                    for _ in range(abs(int(event[1]))):
+                        fake(d, X.ButtonPress, button)
+                        fake(d, X.ButtonRelease, button)
+                elif kind in ("key_down", "key_up"):
+                    self._key(event[1], up=kind == "key_up")
+                else:
+                    raise ValueError(f"unknown input event {event!r}")
+            d.sync()
+
+    def position(self):
+        with self._lock:
+            pointer = self._display.screen().root.query_pointer()
+        return pointer.root_x, pointer.root_y
+
+    def _key(self, key: str, up: bool) -> None:
+        X, d = self._X, self._display
+        if key in _KEYSYMS:
+            keysym = self._XK.string_to_keysym(_KEYSYMS[key])
+        elif len(key) == 1:
+            keysym = ord(key) if ord(key) < 0x100 else 0x01000000 | ord(key)   # Latin-1 / Unicode keysyms
+        else:
+            raise ValueError(f"unknown key {key!r}")
+        keycode = d.keysym_to_keycode(keysym)
+        if not keycode:
+            raise ValueError(f"key {key!r} is not on the current keyboard map")
+        shift = len(key) == 1 and d.keycode_to_keysym(keycode, 0) != keysym
+        shift_code = d.keysym_to_keycode(self._XK.string_to_keysym("Shift_L"))
+        if shift and not up:
+            self._xtest.fake_input(d, X.KeyPress, shift_code)
+        self._xtest.fake_input(d, X.KeyRelease if up else X.KeyPress, keycode)
+        if shift and not up:
+            self._xtest.fake_input(d, X.KeyRelease, shift_code)
+
+
+# ── Selection ─────────────────────────────────────────────────────────────────
+
+_BACKENDS = {
+    "sendinput": SendInputBackend,
+    "xtest": XTestBackend,
+    "pyautogui": PyAutoGuiBackend,
+    "record": RecordingBackend,
+}
+
+_backend: InputBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> InputBackend:
+    """The process-wide backend, created on first use from AGENT_INPUT_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            from config import get_setting
+            _backend = _create(get_setting("AGENT_INPUT_BACKEND", "auto").lower())
+        return _backend
+
+
+def set_backend(backend: InputBackend | None) -> None:
+    """Install a backend (e.g. a RecordingBackend in tests); None re-reads the setting."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _create(name: str) -> InputBackend:
+    if name in _BACKENDS:
+        return _BACKENDS[name]()
+    native = SendInputBackend if sys.platform == "win32" else XTestBackend if sys.platform.startswith("linux") else None
+    if native is not None:
+        try:
+            return native()
+        except Exception:
+            pass   # no python-xlib, no X display, …
+    return PyAutoGuiBackend()
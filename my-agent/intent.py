@@ -0,0 +1,84 @@
+"""
+intent.py — Cheap local classification of a user request.
+
+No model call: plain keyword matching on the request text, used to decide
+things before the first API round trip (e.g. whether to attach a speculative
+screenshot to the first user turn, or whether a saved macro matches).
+"""
+
+import re
+
+# Words that mean the task is about what is on screen or needs the desktop
+_SCREEN_WORDS = frozenset("""
+    open close click press type paste scroll drag screen screenshot window windows tab tabs
+    browser chrome edge firefox app apps application desktop taskbar notepad explorer folder
+    youtube spotify play pause minimize maximize focus switch show see look visible button
+    menu settings install launch start run move resize select copy
+""".split())
+
+# Openers of purely informational requests
+_TEXTUAL_OPENERS = (
+    "what is", "what are", "what's", "who is", "who was", "why ", "how do", "how does",
+    "how many", "how much", "explain", "define", "translate", "summarize", "summarise",
+    "calculate", "write a", "write me", "tell me", "give me", "search for", "look up",
+)
+
+_WORD_RE = re.compile(r"[a-z']+")
+
+
+def words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+_EDGE_PUNCT = ".,!?;:()[]{}"
+
+
+def tidy(text: str) -> str:
+    """Collapse whitespace and strip punctuation from word edges, keeping case and inner dots ("youtube.com")."""
+    tokens = (t.strip(_EDGE_PUNCT) for t in text.split())
+    return " ".join(t for t in tokens if t)
+
+
+def normalize(text: str) -> str:
+    """tidy() plus lower-casing — the form two requests must share to count as the same intent."""
+    return tidy(text).lower()
+
+
+def needs_screen(text: str) -> bool:
+    """
+    Best guess whether a request involves the desktop (True) or is purely
+    textual — a question, a search, a piece of writing (False).
+    """
+    tokens = set(words(text))
+    if tokens & _SCREEN_WORDS:
+        return True
+    lowered = text.strip().lower()
+    if lowered.startswith(_TEXTUAL_OPENERS) or lowered.endswith("?"):
+        return False
+    # Unknown imperative ("do X") — assume it touches the desktop
+    return True
+
+
+# ── Tool-group prediction ─────────────────────────────────────────────────────
+# Which optional tool groups (tools.TOOL_GROUPS) a request is likely to need.
+
+_GROUP_WORDS = {
+    "mouse":    {"click", "double", "drag", "scroll", "hover", "button", "icon", "right-click"},
+    "keyboard": {"type", "press", "key", "keys", "shortcut", "hotkey", "enter", "escape"},
+    "windows":  {"window", "windows", "duplicate", "duplicates", "focus", "switch", "minimize",
+                 "maximize", "close", "instance", "instances"},
+    "search":   {"search", "google", "lookup", "news", "weather", "price", "latest", "who", "when",
+                 "where", "find"},
+    "files":    {"file", "files", "folder", "folders", "document", "documents", "pdf", "docx", "xlsx",
+                 "txt", "csv", "log", "logs", "download", "downloads", "find", "locate", "save", "grep",
+                 "contents"},
+}
+
+
+def predict_tool_groups(text: str) -> set[str]:
+    """Optional tool groups the request's wording points at (core is always loaded)."""
+    tokens = set(words(text))
+    groups = {group for group, vocab in _GROUP_WORDS.items() if tokens & vocab}
+    if not needs_screen(text):
+        groups.add("search")   # informational requests usually need the web
+    return groups
@@ -0,0 +1,397 @@
+"""
+ipc.py — Local IPC between the tray instance and command-line clients.
+
+The tray instance (main.py) holds 127.0.0.1:47291 for its whole lifetime,
+both as the single-instance lock and as a task endpoint. agent.py and a
+second launch of main.py connect to it instead of starting a second copy
+of the Qt + agent stack.
+
+Protocol: newline-delimited JSON over one TCP connection.
+
+    client → {"op": "submit", "token": …, "text": "open notepad"}
+    server → {"event": "queued",  "task": 7}
+             {"event": "state",   "task": 7, "state": "running"}
+             {"event": "action",  "task": 7, "text": "Running 3 action(s)…"}
+             {"event": "message", "task": 7, "text": "Done — Notepad is open."}
+             {"event": "finished","task": 7, "state": "done", "result": "…", "error": ""}
+
+    client → {"op": "cancel", "token": …, "task": 7}   (on the same connection)
+    client → {"op": "show",   "token": …}              → {"event": "ok"}
+
+Every request carries the random token the server writes to
+.cache/ipc.token at startup, so other local users' processes can't drive
+the desktop through the port. This module imports nothing heavier than
+the standard library; the server side calls back into the GUI through
+the `submit`, `cancel` and `show` callables it is given.
+"""
+
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+HOST = "127.0.0.1"
+PORT = 47291
+TOKEN_FILE = Path(__file__).parent / ".cache" / "ipc.token"
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+MAX_UNCLAIMED = 32     # tasks whose events are buffered until a client claims them
+MAX_OUTBOX = 1000      # events queued for a client that has stopped reading before it is dropped
+
+
+class IpcError(RuntimeError):
+    """The running instance could not be reached or rejected the request."""
+
+
+class NotRunning(IpcError):
+    """No instance is listening."""
+
+
+# ── Framing ───────────────────────────────────────────────────────────────────
+
+def _send(stream, obj: dict) -> None:
+    stream.write(json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def _receive(stream) -> dict | None:
+    line = stream.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+# ── Server (tray instance) ────────────────────────────────────────────────────
+
+class _Subscriber:
+    """
+    One client connection waiting on a task — or, with no stream, the
+    buffered events of a task no client has claimed yet.
+
+    Events are queued in an outbox and written by the connection's own
+    thread (drain), never by the worker thread that produces them, so a
+    client that stops reading can't stall the agent.
+    """
+
+    def __init__(self, stream=None, conn: socket.socket | None = None):
+        self.stream = stream
+        self._conn = conn
+        self._outbox: queue.SimpleQueue = queue.SimpleQueue()   # events to write; None ends drain()
+        self.task_id: int | None = None
+        self.lock = threading.Lock()
+        self.last_message = ""
+        self.last_error = ""
+        self.backlog: list[dict] = []   # events received while there was no stream
+        self.claimed_by: _Subscriber | None = None   # a buffer forwards to its client once claimed
+        self.closed = threading.Event()
+
+    def send(self, obj: dict) -> None:
+        with self.lock:
+            target = self.claimed_by
+            if target is None:
+                self._deliver(obj)
+                return
+        target.send(obj)
+
+    def _deliver(self, obj: dict) -> None:
+        event = obj.get("event")
+        if event == "message":
+            self.last_message = obj["text"]
+        elif event == "error":
+            self.last_error = obj["text"]
+        if self.stream is None:
+            self.backlog.append(obj)
+            return
+        if self.closed.is_set():
+            return
+        if self._outbox.qsize() >= MAX_OUTBOX:
+            self.abort()        # the client stopped reading
+            return
+        self._outbox.put(obj)
+        if event == "finished":
+            self.close()
+
+    def close(self) -> None:
+        """No more events: drain() returns once the queued ones are written."""
+        self.closed.set()
+        self._outbox.put(None)
+
+    def abort(self) -> None:
+        """Drop the client, waking a drain() blocked on its full socket."""
+        self.close()
+        try:
+            self._conn.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+    def drain(self) -> None:
+        """Write queued events to the client until close() (runs on the connection thread)."""
+        while (obj := self._outbox.get()) is not None:
+            try:
+                _send(self.stream, obj)
+            except OSError:
+                self.abort()
+                return
+
+
+class IpcServer:
+    """
+    Accepts client connections on the single-instance socket.
+
+    `submit(text, on_queued)`, `cancel(task_id)` and `show()` are called on
+    connection threads; the caller makes them safe to run there. submit must
+    call `on_queued(task_id)` once the task has its ID, or
+    `on_queued(None, state, error)` if the message is dropped before it gets
+    one (state "cancelled" or "failed"). Connect the worker's signals to
+    on_task / on_action / on_message / on_error so the progress of each
+    submitted task is streamed back to its client.
+
+    A task can start, or even finish, before on_queued runs. Events for a
+    task with no client yet are buffered (for the newest MAX_UNCLAIMED
+    tasks) and replayed when the client claims it.
+    """
+
+    def __init__(self, sock: socket.socket, submit, cancel, show):
+        self._sock = sock
+        self._submit = submit
+        self._cancel = cancel
+        self._show = show
+        self._token = secrets.token_hex(16)
+        self._subscribers: dict[int, _Subscriber] = {}
+        self._unclaimed: OrderedDict[int, _Subscriber] = OrderedDict()
+        self._running: int | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        _write_token(self._token)
+        self._sock.listen(8)
+        threading.Thread(target=self._accept_loop, name="ipc-accept", daemon=True).start()
+
+    def stop(self) -> None:
+        try:
+            TOKEN_FILE.unlink()
+        except OSError:
+            pass
+        self._sock.close()
+
+    # ── Worker signal handlers (called on the worker thread) ──────────────────
+
+    def on_task(self, task_id: int, state: str) -> None:
+        with self._lock:
+            if state == "running":
+                self._running = task_id
+            elif self._running == task_id and state in FINISHED_STATES:
+                self._running = None
+            subscriber = self._subscriber(task_id)
+            if subscriber.stream is not None and state in FINISHED_STATES:
+                del self._subscribers[task_id]
+        if state in FINISHED_STATES:
+            subscriber.send({
+                "event": "finished", "task": task_id, "state": state,
+                "result": subscriber.last_message, "error": subscriber.last_error,
+            })
+        else:
+            subscriber.send({"event": "state", "task": task_id, "state": state})
+
+    def on_action(self, text: str) -> None:
+        self._forward("action", text)
+
+    def on_message(self, text: str) -> None:
+        self._forward("message", text)
+
+    def on_error(self, text: str) -> None:
+        self._forward("error", text)
+
+    def _forward(self, event: str, text: str) -> None:
+        with self._lock:
+            task_id = self._running
+            subscriber = self._subscriber(task_id) if task_id is not None else None
+        if subscriber is not None:
+            subscriber.send({"event": event, "task": task_id, "text": text})
+
+    def _subscriber(self, task_id: int) -> _Subscriber:
+        """The task's client, or its buffer until one claims it (call with self._lock held)."""
+        subscriber = self._subscribers.get(task_id) or self._unclaimed.get(task_id)
+        if subscriber is None:
+            subscriber = self._unclaimed[task_id] = _Subscriber()
+            subscriber.task_id = task_id
+            while len(self._unclaimed) > MAX_UNCLAIMED:
+                self._unclaimed.popitem(last=False)
+        return subscriber
+
+    # ── Connections ───────────────────────────────────────────────────────────
+
+    def _accept_loop(self) -> None:
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return   # socket closed on shutdown
+            threading.Thread(target=self._serve, args=(conn,), name="ipc-conn", daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        try:
+            with conn, conn.makefile("rwb") as stream:
+                try:
+                    request = _receive(stream)
+                except (OSError, ValueError):
+                    return
+                if not request or not secrets.compare_digest(str(request.get("token", "")), self._token):
+                    _try_send(stream, {"event": "error", "text": "Bad or missing IPC token."})
+                    return
+
+                op = request.get("op")
+                if op == "show":
+                    self._show()
+                    _try_send(stream, {"event": "ok"})
+                elif op == "submit" and str(request.get("text", "")).strip():
+                    self._serve_task(conn, stream, str(request["text"]).strip())
+                else:
+                    _try_send(stream, {"event": "error", "text": f"Unsupported request: {op!r}"})
+        except OSError:
+            pass   # the client went away, or was dropped with events unwritten
+
+    def _serve_task(self, conn: socket.socket, stream, text: str) -> None:
+        subscriber = _Subscriber(stream, conn)
+        try:
+            self._submit(text, lambda task_id, *dropped: self._subscribe(task_id, subscriber, *dropped))
+        except Exception as e:
+            _try_send(stream, {"event": "error", "text": f"Could not queue the task: {e}"})
+            return
+
+        threading.Thread(target=self._read_requests, args=(stream, subscriber),
+                         name="ipc-read", daemon=True).start()
+        subscriber.drain()
+        self._unsubscribe(subscriber)
+        try:
+            conn.shutdown(socket.SHUT_RDWR)   # ends the reader too
+        except OSError:
+            pass
+
+    def _read_requests(self, stream, subscriber: _Subscriber) -> None:
+        # The only thing a client sends mid-task is a cancel, and EOF
+        # (client gone, e.g. Ctrl+C) cancels the task too.
+        while not subscriber.closed.is_set():
+            try:
+                request = _receive(stream)
+            except (OSError, ValueError):
+                request = None
+            if request is None:
+                if not subscriber.closed.is_set():
+                    subscriber.close()
+                    if subscriber.task_id is not None:
+                        self._cancel(subscriber.task_id)
+                return
+            if request.get("op") == "cancel" and subscriber.task_id is not None:
+                self._cancel(subscriber.task_id)
+
+    def _unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            if self._subscribers.get(subscriber.task_id) is subscriber:
+                del self._subscribers[subscriber.task_id]
+
+    def _subscribe(self, task_id: int | None, subscriber: _Subscriber,
+                   state: str = "", error: str = "") -> None:
+        """
+        Called with the new task's ID once it is queued — or with None, a
+        final state and an error when the message was dropped before that.
+        """
+        if task_id is None:
+            subscriber.send({"event": "finished", "task": None, "state": state or "cancelled",
+                             "result": "", "error": error or "The task was dropped before it started."})
+            return
+        subscriber.task_id = task_id
+        # subscriber.lock is held until the buffered events are out, so newer
+        # events (forwarded by the buffer once it is claimed) can't overtake them
+        with subscriber.lock:
+            with self._lock:
+                early = self._unclaimed.pop(task_id, None)
+                self._subscribers[task_id] = subscriber
+            backlog = []
+            if early is not None:
+                with early.lock:
+                    backlog, early.backlog = early.backlog, []
+                    early.claimed_by = subscriber
+            for event in [{"event": "queued", "task": task_id}, *backlog]:
+                subscriber._deliver(event)
+
+
+def _try_send(stream, obj: dict) -> None:
+    try:
+        _send(stream, obj)
+    except OSError:
+        pass
+
+
+def _write_token(token: str) -> None:
+    TOKEN_FILE.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="ascii") as f:
+        f.write(token)
+
+
+# ── Client ────────────────────────────────────────────────────────────────────
+
+def connect(timeout: float = 2.0):
+    """Open a stream to the running instance (and read its token). Raises NotRunning if there is none."""
+    try:
+        token = TOKEN_FILE.read_text(encoding="ascii").strip()
+    except OSError:
+        raise NotRunning("The agent is not running (no IPC token).") from None
+    try:
+        sock = socket.create_connection((HOST, PORT), timeout=timeout)
+    except OSError as e:
+        raise NotRunning(f"The agent is not running ({e}).") from None
+    sock.settimeout(None)
+    return sock, sock.makefile("rwb"), token
+
+
+def show_window() -> bool:
+    """Ask the running instance to show its chat window. False if it can't be reached."""
+    try:
+        sock, stream, token = connect()
+    except IpcError:
+        return False
+    with sock, stream:
+        try:
+            _send(stream, {"op": "show", "token": token})
+            reply = _receive(stream)
+        except (OSError, ValueError):
+            return False
+    return bool(reply) and reply.get("event") == "ok"
+
+
+def run_task(text: str, on_event=None) -> dict:
+    """
+    Submit `text` to the running instance and block until it finishes.
+    `on_event(event)` sees every progress event. Returns the "finished" event.
+    KeyboardInterrupt cancels the task before propagating.
+    """
+    sock, stream, token = connect()
+    with sock, stream:
+        task_id = None
+        try:
+            _send(stream, {"op": "submit", "token": token, "text": text})
+            while True:
+                event = _receive(stream)
+                if event is None:
+                    raise IpcError("The agent closed the connection before the task finished.")
+                if on_event is not None:
+                    on_event(event)
+                kind = event.get("event")
+                if kind == "queued":
+                    task_id = event.get("task")
+                elif kind == "finished":
+                    return event
+                elif kind == "error" and task_id is None:
+                    raise IpcError(event.get("text", "Request rejected."))
+        except KeyboardInterrupt:
+            if task_id is not None:
+                _try_send(stream, {"op": "cancel", "token": token, "task": task_id})
+            raise
+        except (OSError, ValueError) as e:
+            raise IpcError(f"Lost the connection to the agent: {e}") from None
@@ -0,0 +1,306 @@
+"""
+macros.py — Learned macros: replay known tasks without calling the model.
+
+When a task finishes successfully, its sequence of action tool calls is
+saved under an intent template such as "open youtube and search {}".
+Parameters are slots: the text after a parameter keyword ("search",
+"type", "play", "called" …) or inside quotes, as long as it actually shows
+up in the recorded tool arguments. The next request that matches a
+template replays the steps through TOOL_FUNCTIONS with the new slot values.
+
+Only layout-independent steps are recorded — keyboard, clipboard, shell
+and window tools. Slots never reach a shell command: a task whose
+run_command used a slot value is saved as a literal macro instead. A task that clicked raw screen coordinates is never
+saved, since those coordinates are only valid for the screen it saw.
+
+A request matches a macro only if it normalizes to exactly the stored
+template — slot values are what extract_slots() finds, never text a slot
+could stretch over. Only tasks that ended in a real final reply are
+recorded (see agent_core), only if no tool call reported an error
+(tools.is_error_result — a partly failed run_actions batch counts), and
+only with a foreground window title to check: after a replay no step may
+report an error, and that title must
+match the one recorded (with the new slot values). If either fails, or a
+macro has no title to check, the caller falls back to the model.
+"""
+
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote, quote_plus
+
+from intent import normalize, tidy
+from tools import READ_ONLY_TOOLS, is_error_result
+
+MACROS_FILE = Path(__file__).parent / ".cache" / "macros.json"
+MAX_MACROS = 200
+VERIFY_TIMEOUT = 3.0      # seconds to wait for the expected foreground window
+
+# Tools whose effect doesn't depend on where things are on screen
+REPLAYABLE_TOOLS = frozenset({
+    "run_actions", "run_command", "hotkey", "press_key", "type_text",
+    "focus_window", "close_duplicate_windows", "wait", "write_file",
+})
+# run_actions step types that carry screen coordinates
+_COORDINATE_STEPS = frozenset({"click", "double_click", "right_click", "move", "scroll"})
+
+# Words that introduce a parameter: everything after them (up to "and"/"then") is a slot
+_SLOT_KEYWORDS = ("search for", "look up", "search", "type", "write", "play", "find",
+                  "called", "named", "saying", "to say")
+_SLOT_END_WORDS = frozenset({"and", "then"})
+_QUOTED_RE = re.compile(r"[\"“]([^\"“”]+)[\"”]")
+
+
+# ── Slot extraction ───────────────────────────────────────────────────────────
+
+def extract_slots(text: str) -> tuple[str, list[str]]:
+    """
+    Split a request into a template and its parameter values.
+
+    >>> extract_slots("Open YouTube and search jjk season 2")
+    ('open youtube and search {}', ['jjk season 2'])
+    """
+    values = []
+
+    def _quoted(m):
+        values.append(m.group(1).strip())
+        return " \x00 "
+
+    text = _QUOTED_RE.sub(_quoted, text)
+    tokens = tidy(text).split()
+    out, quoted_iter = [], iter(values)
+    ordered = []
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == "\x00":
+            out.append("{}")
+            ordered.append(next(quoted_iter))
+            i += 1
+            continue
+        keyword = _keyword_at(tokens, i)
+        if keyword:
+            out.extend(tokens[i:i + keyword])
+            j = i + keyword
+            end = j
+            while end < len(tokens) and tokens[end].lower() not in _SLOT_END_WORDS and tokens[end] != "\x00":
+                end += 1
+            if end > j:
+                out.append("{}")
+                ordered.append(" ".join(tokens[j:end]))
+            i = end
+            continue
+        out.append(token)
+        i += 1
+    return " ".join(out).lower(), ordered
+
+
+def _keyword_at(tokens: list[str], i: int) -> int:
+    """Length in tokens of the slot keyword starting at tokens[i], or 0."""
+    for keyword in _SLOT_KEYWORDS:
+        parts = keyword.split()
+        if [t.lower() for t in tokens[i:i + len(parts)]] == parts:
+            return len(parts)
+    return 0
+
+
+# ── Parameterizing recorded steps ─────────────────────────────────────────────
+
+def _encodings(value: str) -> list[tuple[str, str]]:
+    """(encoded form, tag) pairs to look for, most specific first; plain text is tagged ""."""
+    out = []
+    if quote_plus(value) != value:
+        out.append((quote_plus(value), "plus"))
+    if quote(value) not in (value, quote_plus(value)):
+        out.append((quote(value), "url"))
+    out.append((value, ""))
+    return out
+
+
+def _parameterize(obj, values: list[str], used: set):
+    """Replace slot values inside every string of `obj` with {slot_N[|tag]} placeholders."""
+    if isinstance(obj, str):
+        for index, value in sorted(enumerate(values), key=lambda iv: -len(iv[1])):
+            for form, tag in _encodings(value):
+                # In URLs a bare single word must still be re-encoded on replay
+                if not tag and "://" in obj and " " not in value:
+                    tag = "plus"
+                placeholder = "{slot_%d%s}" % (index, f"|{tag}" if tag else "")
+                new = re.sub(re.escape(form), placeholder.replace("\\", "\\\\"), obj, flags=re.IGNORECASE)
+                if new != obj:
+                    used.add(index)
+                    obj = new
+        return obj
+    if isinstance(obj, list):
+        return [_parameterize(item, values, used) for item in obj]
+    if isinstance(obj, dict):
+        return {key: _parameterize(item, values, used) for key, item in obj.items()}
+    return obj
+
+
+def _fill(obj, values: list[str]):
+    """Inverse of _parameterize: put concrete slot values back in."""
+    if isinstance(obj, str):
+        def _sub(m):
+            value = values[int(m.group(1))]
+            tag = m.group(2)
+            return quote_plus(value) if tag == "plus" else quote(value) if tag == "url" else value
+        return re.sub(r"\{slot_(\d+)(?:\|(plus|url))?\}", _sub, obj)
+    if isinstance(obj, list):
+        return [_fill(item, values) for item in obj]
+    if isinstance(obj, dict):
+        return {key: _fill(item, values) for key, item in obj.items()}
+    return obj
+
+
+def _slot_in_command(step: dict) -> bool:
+    return step["name"] == "run_command" and "{slot_" in json.dumps(step["input"])
+
+
+def _uses_coordinates(name: str, args: dict) -> bool:
+    if name != "run_actions":
+        return False
+    return any(isinstance(s, dict) and s.get("type") in _COORDINATE_STEPS for s in args.get("steps", []))
+
+
+# ── Store ─────────────────────────────────────────────────────────────────────
+
+class MacroStore:
+    """JSON-file store of {template → macro}, with record / match / replay."""
+
+    def __init__(self, path: Path = MACROS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._macros: dict[str, dict] = {}
+        try:
+            self._macros = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            pass
+
+    def __len__(self) -> int:
+        return len(self._macros)
+
+    # ── Recording ─────────────────────────────────────────────────────────────
+
+    def record(self, text: str, calls: list[tuple[str, dict, object]], final_title: str = "") -> bool:
+        """
+        Save a successful task. `calls` is [(tool name, input, result)] in order.
+        Returns False (and saves nothing) if the task isn't safely replayable.
+        """
+        steps = []
+        for name, args, result in calls:
+            if name not in REPLAYABLE_TOOLS:
+                if name in READ_ONLY_TOOLS:
+                    continue            # nothing to replay
+                return False            # coordinates or an unknown tool
+            if _uses_coordinates(name, args) or is_error_result(result):
+                return False
+            steps.append({"name": name, "input": args})
+        if not steps or not final_title:
+            return False                # nothing to replay, or nothing to verify a replay against
+
+        template, values = extract_slots(text)
+        used: set[int] = set()
+        steps = _parameterize(steps, values, used)
+        if len(used) != len(values) or any(_slot_in_command(step) for step in steps):
+            # A "slot" that never reached a tool argument is really part of the intent;
+            # one inside a shell command would let a replayed value (a quote, "&", "|")
+            # rewrite the command, so such tasks only replay word for word
+            template, values, used = normalize(text), [], set()
+            steps = [{"name": n, "input": a} for n, a, _ in calls if n in REPLAYABLE_TOOLS]
+
+        macro = {
+            "template": template,
+            "steps": steps,
+            "verify_title": _parameterize(final_title, values, set()) if final_title else "",
+            "hits": 0,
+            "created": time.time(),
+            "last_used": time.time(),
+        }
+        with self._lock:
+            self._macros[template] = macro
+            if len(self._macros) > MAX_MACROS:
+                oldest = min(self._macros, key=lambda k: self._macros[k]["last_used"])
+                del self._macros[oldest]
+        self._save()
+        return True
+
+    # ── Matching ──────────────────────────────────────────────────────────────
+
+    def match(self, text: str) -> tuple[dict, list[str]] | None:
+        """
+        Return (macro, slot values) for the template `text` normalizes to, or
+        None. The request must reduce to exactly the stored template, so a
+        slot never swallows extra clauses ("… type hello and then save it").
+        """
+        template, values = extract_slots(text)
+        with self._lock:
+            literal = self._macros.get(normalize(text))    # recorded without slots
+            macro = self._macros.get(template) if values else None
+        if literal is not None:
+            return literal, []
+        return (macro, values) if macro is not None else None
+
+    def forget(self, template: str) -> None:
+        with self._lock:
+            self._macros.pop(template, None)
+        self._save()
+
+    # ── Replay ────────────────────────────────────────────────────────────────
+
+    def replay(self, macro: dict, values: list[str], run_tool, active_title) -> tuple[bool, str]:
+        """
+        Run the macro's steps with `run_tool(name, input)` and verify the outcome.
+        `active_title()` returns the current foreground window title.
+        Returns (success, detail). AbortedError propagates.
+        """
+        start = time.perf_counter()
+        for step in _fill(macro["steps"], values):
+            result = run_tool(step["name"], step["input"])
+            if is_error_result(result):
+                return False, f"step {step['name']} reported: {str(result)[:200]}"
+
+        title_template = macro.get("verify_title", "")
+        if not title_template:
+            return False, "the macro has no window title to verify against"
+        expected = _fill(title_template, values)
+        # Only slots that were visible in the recorded title are expected in the new one
+        shown = [values[int(i)] for i in re.findall(r"\{slot_(\d+)", title_template)]
+        if not _wait_for_title(expected, shown, active_title):
+            return False, f"expected a window like '{expected}', found '{active_title()}'"
+
+        with self._lock:
+            macro["hits"] = macro.get("hits", 0) + 1
+            macro["last_used"] = time.time()
+        self._save()
+        return True, f"{len(macro['steps'])} step(s) in {time.perf_counter() - start:.2f} s"
+
+    def _save(self) -> None:
+        with self._lock:
+            data = json.dumps(self._macros, indent=1)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(data, encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError:
+            pass   # macros are an optimisation; never fail a task over them
+
+
+def _wait_for_title(expected: str, values: list[str], active_title) -> bool:
+    """
+    Poll the foreground window title until it looks like `expected`: same
+    application (last " - " segment) and every value in `values` present.
+    """
+    app = expected.rsplit(" - ", 1)[-1].strip().lower()
+    needles = [app] + [v.lower() for v in values]
+    deadline = time.monotonic() + VERIFY_TIMEOUT
+    while True:
+        title = active_title().lower()
+        if title and all(n in title for n in needles):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.1)
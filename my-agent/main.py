@@ -3,28 +3,42 @@ AI Agent — entry point.
 
 Usage:
     python main.py
+    python agent.py "open notepad"     (hand a task to the running instance)
 
 Hotkey: Ctrl+Shift+Space  →  toggle the chat window
 Tray icon: left-click      →  toggle the chat window
+
+Startup order is tuned for time-to-window: only Qt and the chat UI are
+imported up front. The agent stack (anthropic, pyautogui, pynput, PIL …)
+is imported on a background thread while the window is already on screen;
+messages sent before it is ready are queued and delivered once it is.
+The global hotkey and the tray icon are set up right after the window's
+first paint. Run startup_bench.py to measure it.
+
+The single-instance socket doubles as a local IPC endpoint (ipc.py): a
+second launch just brings up the existing window, and agent.py submits
+tasks to the warm instance and streams their progress.
 """
 
+import time
+
+_T0 = time.perf_counter()   # process start, for the startup benchmark
+
+import os
 import sys
 import threading
-import io
 import socket
 
-import keyboard
-import pystray
-from PIL import Image, ImageDraw
-from PyQt6.QtCore import QMetaObject, Qt, Q_ARG
+from PyQt6.QtCore import QEvent, QMetaObject, QObject, QTimer, Qt, pyqtSignal
 from PyQt6.QtWidgets import QApplication, QDialog, QDialogButtonBox, QLabel, QLineEdit, QVBoxLayout
 
-from agent_core import AgentWorker
+import ipc
 from config import get_api_key, save_api_key
 from ui import ChatWindow
 
 HOTKEY = "ctrl+shift+space"
-_SINGLE_INSTANCE_PORT = 47291  # arbitrary local port used as a mutex
+_SINGLE_INSTANCE_PORT = ipc.PORT  # local port: instance mutex and IPC endpoint
+_BENCH_ENV = "AGENT_STARTUP_BENCH"  # set by startup_bench.py: print timings, then quit
 
 
 # ── API key dialog (shown if no key is found in .env) ────────────────────────
@@ -58,8 +72,10 @@ class ApiKeyDialog(QDialog):
 
 # ── Tray icon ─────────────────────────────────────────────────────────────────
 
-def _make_tray_icon() -> Image.Image:
+def _make_tray_icon():
     """Generate a simple purple circle tray icon."""
+    from PIL import Image, ImageDraw
+
     size = 64
     img = Image.new("RGBA", (size, size), (0, 0, 0, 0))
     draw = ImageDraw.Draw(img)
@@ -68,6 +84,189 @@ def _make_tray_icon() -> Image.Image:
     return img
 
 
+# ── Startup helpers ───────────────────────────────────────────────────────────
+
+class _FirstPaint(QObject):
+    """Calls `callback` once, when the watched widget is first painted."""
+
+    def __init__(self, widget, callback):
+        super().__init__(widget)
+        self._callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event) -> bool:
+        if event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            # Let this paint reach the screen before running the callback
+            QTimer.singleShot(0, self._callback)
+        return False
+
+
+def _install_hotkey_and_tray(app: QApplication, window: ChatWindow) -> None:
+    """Global hotkey and tray icon — keyboard, pystray and PIL load here, after the first paint."""
+    import keyboard
+    import pystray
+
+    # --- Global hotkey (runs in its own daemon thread via keyboard lib) ---
+    def _toggle():
+        # Must interact with Qt from main thread
+        QMetaObject.invokeMethod(window, "toggle_visibility", Qt.ConnectionType.QueuedConnection)
+
+    keyboard.add_hotkey(HOTKEY, _toggle)
+    app.aboutToQuit.connect(keyboard.unhook_all)
+
+    # --- System tray ---
+    def _tray_show(icon, item):
+        QMetaObject.invokeMethod(window, "toggle_visibility", Qt.ConnectionType.QueuedConnection)
+
+    def _tray_quit(icon, item):
+        icon.stop()
+        app.quit()
+
+    tray_icon_img = _make_tray_icon()
+    menu = pystray.Menu(
+        pystray.MenuItem("Open / Close", _tray_show, default=True),
+        pystray.MenuItem("Quit", _tray_quit),
+    )
+    tray = pystray.Icon("AI Agent", tray_icon_img, "AI Agent", menu)
+    app.aboutToQuit.connect(tray.stop)
+
+    tray_thread = threading.Thread(target=tray.run, daemon=True)
+    tray_thread.start()
+
+
+# ── Deferred agent loading ────────────────────────────────────────────────────
+
+class AgentLoader(QObject):
+    """
+    Imports the agent stack on a daemon thread and builds the AgentWorker
+    on the Qt main thread once it is ready. Messages submitted before then
+    are held and replayed in order.
+    """
+
+    ready = pyqtSignal(object)    # the AgentWorker
+    failed = pyqtSignal(str)
+    _imported = pyqtSignal()      # emitted from the loader thread → queued to main thread
+
+    def __init__(self, api_key: str, parent=None):
+        super().__init__(parent)
+        self._api_key = api_key
+        self._error = ""
+        self.worker = None
+        self._pending: list[tuple[str, object]] = []   # (message, on_queued callback or None)
+        self._resume: str | None = None                 # session picked before the worker existed
+        self._imported.connect(self._on_imported)
+
+    def start(self) -> None:
+        threading.Thread(target=self._import_agent, name="agent-loader", daemon=True).start()
+
+    def submit(self, message: str, on_queued=None) -> None:
+        """
+        Queue a message; `on_queued(task_id)` is called once it has a task ID,
+        or `on_queued(None, state, error)` if it is dropped before then.
+        """
+        if self._error:
+            if on_queued is not None:
+                on_queued(None, "failed", self._error)
+        elif self.worker is not None:
+            task_id = self.worker.send_message(message)
+            if on_queued is not None:
+                on_queued(task_id)
+        else:
+            self._pending.append((message, on_queued))
+
+    def reset(self) -> None:
+        self._drop_pending("The conversation was reset before the agent finished loading.")
+        self._resume = None
+        if self.worker is not None:
+            self.worker.reset()
+
+    def resume(self, session_id: str) -> None:
+        self._drop_pending("Another session was resumed before the agent finished loading.")
+        if self.worker is not None:
+            self.worker.resume(session_id)
+        else:
+            self._resume = session_id
+
+    def cancel(self) -> None:
+        self._drop_pending("Cancelled before the agent finished loading.")
+        if self.worker is not None:
+            self.worker.cancel_all()
+
+    def cancel_task(self, task_id: int) -> None:
+        if self.worker is not None:
+            self.worker.cancel(task_id)
+
+    def _drop_pending(self, error: str, state: str = "cancelled") -> None:
+        """Tell the callers of the held messages that they will never run."""
+        pending, self._pending = self._pending, []
+        for _message, on_queued in pending:
+            if on_queued is not None:
+                on_queued(None, state, error)
+
+    def _import_agent(self) -> None:
+        try:
+            import agent_core  # noqa: F401 — the heavy part: anthropic, pyautogui, pynput, PIL
+        except Exception as e:
+            self._error = f"Failed to load the agent: {e}"
+        else:
+            import fileindex
+            fileindex.get_index()   # start the background file scan so find_files is warm
+        self._imported.emit()
+
+    def _on_imported(self) -> None:
+        if self._error:
+            self._drop_pending(self._error, state="failed")
+            self.failed.emit(self._error)
+            return
+        from agent_core import AgentWorker   # already in sys.modules — instant
+        self.worker = AgentWorker(self._api_key)
+        if self._resume is not None:
+            self.worker.resume(self._resume)
+        self.ready.emit(self.worker)
+        for message, on_queued in self._pending:
+            self.submit(message, on_queued)
+        self._pending.clear()
+
+
+class IpcBridge(QObject):
+    """
+    Carries IPC requests from the connection threads onto the Qt main
+    thread (queued signal connections), where the loader and window live.
+    """
+
+    _submit = pyqtSignal(str, object)
+    _cancel = pyqtSignal(int)
+    _show = pyqtSignal()
+
+    def __init__(self, loader: AgentLoader, window: ChatWindow, parent=None):
+        super().__init__(parent)
+        self._loader = loader
+        self._window = window
+        self._submit.connect(self._on_submit)
+        self._cancel.connect(loader.cancel_task)
+        self._show.connect(self._on_show)
+
+    # Called on IPC connection threads
+    def submit(self, text: str, on_queued) -> None:
+        self._submit.emit(text, on_queued)
+
+    def cancel(self, task_id: int) -> None:
+        self._cancel.emit(task_id)
+
+    def show(self) -> None:
+        self._show.emit()
+
+    # Main thread
+    def _on_submit(self, text: str, on_queued) -> None:
+        self._window.show_external_message(text)
+        self._loader.submit(text, on_queued)
+
+    def _on_show(self) -> None:
+        if not self._window.isVisible() or self._window.isMinimized():
+            self._window.toggle_visibility()
+
+
 # ── Main ──────────────────────────────────────────────────────────────────────
 
 def _acquire_single_instance_lock() -> socket.socket | None:
@@ -82,11 +281,24 @@ def _acquire_single_instance_lock() -> socket.socket | None:
         return None
 
 
+def _watch_screens(app: QApplication, on_change) -> None:
+    """Call `on_change()` whenever a monitor is added, removed or changes geometry."""
+    def _watch(screen):
+        screen.geometryChanged.connect(lambda _rect: on_change())
+
+    for screen in app.screens():
+        _watch(screen)
+    app.screenAdded.connect(lambda screen: (_watch(screen), on_change()))
+    app.screenRemoved.connect(lambda _screen: on_change())
+
+
 def main():
     # ── Single-instance guard ────────────────────────────────────────────────
     _lock_socket = _acquire_single_instance_lock()
     if _lock_socket is None:
-        # Another instance is already running — show a quick Qt message and exit
+        # Another instance is already running — bring up its window and exit
+        if ipc.show_window():
+            sys.exit(0)
         _app = QApplication(sys.argv)
         from PyQt6.QtWidgets import QMessageBox
         QMessageBox.information(None, "AI Agent", "AI Agent is already running.\nFind it in the system tray.")
@@ -108,52 +320,58 @@ def main():
             print("No API key provided. Exiting.")
             sys.exit(1)
 
-    # --- Agent worker ---
-    worker = AgentWorker(api_key)
-
-    # --- Chat window ---
+    # --- Chat window (first — everything else loads behind it) ---
     window = ChatWindow()
-    window.send_message.connect(worker.send_message)
-    window.new_chat_requested.connect(worker.reset)
+    bench = os.environ.get(_BENCH_ENV)
 
-    worker.message_signal.connect(window.on_agent_message)
-    worker.action_signal.connect(window.on_action)
-    worker.error_signal.connect(window.on_error)
-    worker.done_signal.connect(window.on_done)
+    def _on_first_paint():
+        if bench:
+            print(f"time-to-window {time.perf_counter() - _T0:.3f}", flush=True)
+        _install_hotkey_and_tray(app, window)
 
+    _FirstPaint(window, _on_first_paint)
     window.show()
 
-    # --- Global hotkey (runs in its own daemon thread via keyboard lib) ---
-    def _toggle():
-        # Must interact with Qt from main thread
-        QMetaObject.invokeMethod(window, "toggle_visibility", Qt.ConnectionType.QueuedConnection)
-
-    keyboard.add_hotkey(HOTKEY, _toggle)
-
-    # --- System tray ---
-    def _tray_show(icon, item):
-        QMetaObject.invokeMethod(window, "toggle_visibility", Qt.ConnectionType.QueuedConnection)
-
-    def _tray_quit(icon, item):
-        icon.stop()
-        app.quit()
-
-    tray_icon_img = _make_tray_icon()
-    menu = pystray.Menu(
-        pystray.MenuItem("Open / Close", _tray_show, default=True),
-        pystray.MenuItem("Quit", _tray_quit),
-    )
-    tray = pystray.Icon("AI Agent", tray_icon_img, "AI Agent", menu)
-
-    tray_thread = threading.Thread(target=tray.run, daemon=True)
-    tray_thread.start()
+    # --- Agent worker (imported in the background) ---
+    loader = AgentLoader(api_key)
+    window.send_message.connect(loader.submit)
+    window.new_chat_requested.connect(loader.reset)
+    window.resume_requested.connect(loader.resume)
+    window.cancel_requested.connect(loader.cancel)
+    # Before the worker exists nothing else reports the (now empty) queue
+    window.cancel_requested.connect(lambda: loader.worker is None and window.on_queue_changed(0))
+
+    # --- Local IPC endpoint on the instance socket (agent.py) ---
+    bridge = IpcBridge(loader, window)
+    server = ipc.IpcServer(_lock_socket, submit=bridge.submit, cancel=bridge.cancel, show=bridge.show)
+    server.start()
+    app.aboutToQuit.connect(server.stop)
+
+    def _connect_worker(worker):
+        # Direct connections: the server only queues events on the worker thread;
+        # each client's connection thread writes them
+        worker.task_signal.connect(server.on_task, Qt.ConnectionType.DirectConnection)
+        worker.action_signal.connect(server.on_action, Qt.ConnectionType.DirectConnection)
+        worker.message_signal.connect(server.on_message, Qt.ConnectionType.DirectConnection)
+        worker.error_signal.connect(server.on_error, Qt.ConnectionType.DirectConnection)
+        worker.message_signal.connect(window.on_agent_message)
+        worker.action_signal.connect(window.on_action)
+        worker.error_signal.connect(window.on_error)
+        worker.done_signal.connect(window.on_done)
+        worker.queue_signal.connect(window.on_queue_changed)
+        app.aboutToQuit.connect(worker.shutdown)
+        _watch_screens(app, worker.refresh_screen_geometry)
+        if bench:
+            print(f"agent-ready {time.perf_counter() - _T0:.3f}", flush=True)
+            app.quit()
+
+    loader.ready.connect(_connect_worker)
+    loader.failed.connect(window.on_error)
+    loader.failed.connect(lambda _msg: window.on_queue_changed(0))
+    loader.start()
 
     # --- Run Qt event loop ---
-    exit_code = app.exec()
-
-    keyboard.unhook_all()
-    tray.stop()
-    sys.exit(exit_code)
+    sys.exit(app.exec())
 
 
 if __name__ == "__main__":
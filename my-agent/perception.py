@@ -0,0 +1,200 @@
+"""
+perception.py — Local on-screen text / UI-element index.
+
+Responsibilities:
+  - Build an index of what is visible on screen without asking the model:
+      • OCR word boxes (pytesseract, optional)
+      • Accessibility-tree elements of the foreground window (pywinauto UIA, optional)
+  - Answer "where is X?" queries against that index in milliseconds
+
+Both backends are optional — whichever is installed contributes elements,
+and a missing one is simply skipped. The index is cached for INDEX_MAX_AGE
+seconds so several lookups in a row reuse one capture.
+"""
+
+import difflib
+import threading
+import time
+
+from vision import capture_screenshot
+
+INDEX_MAX_AGE = 2.0       # seconds before a query triggers a rebuild
+MIN_OCR_CONFIDENCE = 60   # tesseract word confidence (0–100)
+MAX_UIA_ELEMENTS = 400    # cap the accessibility walk on huge windows
+MATCH_THRESHOLD = 0.6     # fuzzy-match ratio below which an element is ignored
+
+_lock = threading.Lock()
+_index: list[dict] = []
+_index_time = 0.0
+_index_region: tuple[int, int, int, int] | None = None
+
+
+# ── Index construction ────────────────────────────────────────────────────────
+
+def build_index(region: tuple[int, int, int, int] | None = None) -> list[dict]:
+    """
+    Rebuild the element index for the whole primary screen or `region`.
+
+    Each element is {"text", "kind", "source", "left", "top", "width", "height"}
+    in screen pixels. Returns the new index.
+    """
+    global _index, _index_time, _index_region
+    elements = _ocr_elements(region) + _uia_elements()
+    with _lock:
+        _index = elements
+        _index_time = time.monotonic()
+        _index_region = region
+    return elements
+
+
+def _ocr_elements(region) -> list[dict]:
+    """OCR the screen into word boxes, merged into lines. Empty if tesseract is missing."""
+    try:
+        import pytesseract
+    except ImportError:
+        return []
+
+    image = capture_screenshot(region)
+    off_x, off_y = (region[0], region[1]) if region else (0, 0)
+    try:
+        data = pytesseract.image_to_data(image.convert("L"), output_type=pytesseract.Output.DICT)
+    except Exception:
+        return []   # tesseract binary not installed / not on PATH
+
+    # Group words by (block, paragraph, line) so "Save as" is one element
+    lines: dict[tuple, dict] = {}
+    for i, word in enumerate(data["text"]):
+        word = word.strip()
+        if not word or float(data["conf"][i]) < MIN_OCR_CONFIDENCE:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        left, top = data["left"][i] + off_x, data["top"][i] + off_y
+        right, bottom = left + data["width"][i], top + data["height"][i]
+        line = lines.get(key)
+        if line is None:
+            lines[key] = {"words": [word], "box": [left, top, right, bottom]}
+        else:
+            line["words"].append(word)
+            box = line["box"]
+            box[0], box[1] = min(box[0], left), min(box[1], top)
+            box[2], box[3] = max(box[2], right), max(box[3], bottom)
+
+    elements = []
+    for line in lines.values():
+        left, top, right, bottom = line["box"]
+        elements.append(_element(" ".join(line["words"]), "text", "ocr", left, top, right, bottom))
+    return elements
+
+
+def _uia_elements() -> list[dict]:
+    """Named accessibility elements of the foreground window. Empty if pywinauto is missing."""
+    try:
+        from pywinauto import Desktop
+    except ImportError:
+        return []
+
+    try:
+        window = Desktop(backend="uia").window(active_only=True).wrapper_object()
+    except Exception:
+        return []
+
+    elements = []
+    try:
+        for ctrl in window.descendants():
+            if len(elements) >= MAX_UIA_ELEMENTS:
+                break
+            info = ctrl.element_info
+            name = (info.name or "").strip()
+            if not name or not info.visible:
+                continue
+            r = info.rectangle
+            if r.width() <= 0 or r.height() <= 0:
+                continue
+            elements.append(_element(name, info.control_type or "element", "uia",
+                                     r.left, r.top, r.right, r.bottom))
+    except Exception:
+        pass   # windows can close mid-walk; keep what we have
+    return elements
+
+
+def _element(text: str, kind: str, source: str, left, top, right, bottom) -> dict:
+    return {
+        "text": text,
+        "kind": kind,
+        "source": source,
+        "left": int(left),
+        "top": int(top),
+        "width": int(right - left),
+        "height": int(bottom - top),
+    }
+
+
+# ── Queries ───────────────────────────────────────────────────────────────────
+
+def get_index(max_age: float = INDEX_MAX_AGE, region=None) -> list[dict]:
+    """Return the cached index, rebuilding it if it is stale or for another region."""
+    with _lock:
+        fresh = time.monotonic() - _index_time <= max_age and _index_region == region
+        cached = _index
+    return cached if fresh else build_index(region)
+
+
+def invalidate() -> None:
+    """Force the next query to rebuild (call after any action that changes the screen)."""
+    global _index_time
+    with _lock:
+        _index_time = 0.0
+
+
+def find_elements(query: str, limit: int = 5, refresh: bool = False, region=None) -> list[dict]:
+    """
+    Return up to `limit` indexed elements whose text best matches `query`.
+
+    Exact substring matches rank first (accessibility elements before OCR
+    text, shorter labels before longer ones), then fuzzy matches above
+    MATCH_THRESHOLD. Each result gains "x", "y" (its centre) and "score".
+    """
+    needle = query.strip().lower()
+    if not needle:
+        return []
+    elements = build_index(region) if refresh else get_index(region=region)
+
+    scored = []
+    for el in elements:
+        text = el["text"].lower()
+        if needle in text:
+            score = 1.0 + len(needle) / max(len(text), 1)
+        else:
+            score = difflib.SequenceMatcher(None, needle, text).ratio()
+            if score < MATCH_THRESHOLD:
+                continue
+        if el["source"] == "uia":
+            score += 0.05
+        scored.append((score, el))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    results = []
+    for score, el in scored[:limit]:
+        results.append({
+            **el,
+            "x": el["left"] + el["width"] // 2,
+            "y": el["top"] + el["height"] // 2,
+            "score": round(score, 2),
+        })
+    return results
+
+
+def available_backends() -> list[str]:
+    """Names of the perception backends importable in this environment."""
+    backends = []
+    try:
+        import pytesseract  # noqa: F401
+        backends.append("ocr")
+    except ImportError:
+        pass
+    try:
+        import pywinauto  # noqa: F401
+        backends.append("uia")
+    except ImportError:
+        pass
+    return backends
@@ -0,0 +1,175 @@
+"""
+routing.py — Per-step model and token-budget selection.
+
+Every step of the reasoning loop is classified by what it has to do:
+
+    plan     — first request of a task: read the goal, lay out the actions
+    act      — the last tool batch changed something; carry on with the plan
+    verify   — the last batch only looked (screenshot, find, window queries)
+               after actions ran; usually just "done" or one small fix
+    recover  — the last batch reported an error
+
+Each kind gets a token budget on the fast tier. A task escalates to the
+strong tier, and stays there, when:
+
+  - a response is cut off at max_tokens (the step is re-asked, not kept)
+  - ESCALATE_AFTER_ERRORS consecutive tool batches report errors
+  - the fast model ends the task with a give-up reply, one opening with "FAILED:" (re-asked once)
+
+Every step is logged to telemetry as a "request" event carrying its route,
+tier, model, latency and outcome. route_stats() summarises those events so
+the budgets can be tuned. Run `python routing.py` to print the summary.
+
+Settings (.env):
+  AGENT_ROUTING       tiered (default) · fast · strong
+  AGENT_MODEL_FAST    default claude-haiku-4-5-20251001
+  AGENT_MODEL_STRONG  default claude-sonnet-4-5-20250929
+"""
+
+import statistics
+from typing import NamedTuple
+
+from tools import READ_ONLY_TOOLS, is_error_result
+
+FAST_MODEL = "claude-haiku-4-5-20251001"
+STRONG_MODEL = "claude-sonnet-4-5-20250929"
+POLICIES = ("tiered", "fast", "strong")
+
+# max_tokens per step kind on the fast tier
+BUDGETS = {
+    "plan":    1024,
+    "act":     768,
+    "verify":  512,
+    "recover": 1024,
+}
+STRONG_BUDGET = 2048          # every step once a task has escalated
+ESCALATE_AFTER_ERRORS = 2     # consecutive failing tool batches
+
+# How a final reply declares the task failed (SYSTEM_PROMPT asks for it)
+GIVE_UP_PREFIX = "FAILED:"
+
+# Step outcomes that count as success in route_stats()
+SUCCESS_OUTCOMES = frozenset({"done", "ok"})
+
+
+class Route(NamedTuple):
+    kind: str        # plan / act / verify / recover
+    tier: str        # fast / strong
+    model: str
+    max_tokens: int
+
+
+class Router:
+    """Routing state for one task. Create a new one per task."""
+
+    def __init__(self, policy: str = "tiered", fast_model: str = FAST_MODEL, strong_model: str = STRONG_MODEL):
+        self.policy = policy if policy in POLICIES else "tiered"
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.escalated = self.policy == "strong"
+        self.reason = ""              # why the task escalated, for the UI
+        self._kind = "plan"
+        self._acted = False           # any state-changing tool has run in this task
+        self._error_streak = 0
+        self._reasked = False         # a give-up reply was already re-asked
+
+    def next_route(self) -> Route:
+        if self.policy == "fast":
+            return Route(self._kind, "fast", self.fast_model, BUDGETS["plan"])
+        if self.escalated:
+            return Route(self._kind, "strong", self.strong_model, STRONG_BUDGET)
+        return Route(self._kind, "fast", self.fast_model, BUDGETS[self._kind])
+
+    def review(self, route: Route, response) -> str | None:
+        """
+        Check a response before it is kept. Returns an outcome ("truncated" or
+        "gave_up") if the step must be re-asked on the strong tier, else None.
+        """
+        if route.tier == "strong" or self.policy != "tiered":
+            return None
+        if response.stop_reason == "max_tokens":
+            self._escalate("response cut off")
+            return "truncated"
+        if response.stop_reason == "end_turn" and not self._reasked and gave_up(response):
+            self._reasked = True
+            self._escalate("fast model gave up")
+            return "gave_up"
+        return None
+
+    def observe(self, names: list[str], results: list[dict]) -> str:
+        """Record one executed tool batch; sets the next step's kind. Returns the step outcome."""
+        failed = any(
+            r.get("type") == "tool_result" and isinstance(r.get("content"), str) and is_error_result(r["content"])
+            for r in results
+        )
+        if any(name not in READ_ONLY_TOOLS for name in names):
+            self._acted = True
+        if failed:
+            self._error_streak += 1
+            self._kind = "recover"
+            if self._error_streak >= ESCALATE_AFTER_ERRORS and self.policy == "tiered":
+                self._escalate(f"{self._error_streak} failing steps in a row")
+            return "tool_error"
+        self._error_streak = 0
+        looked_only = all(name in READ_ONLY_TOOLS for name in names)
+        self._kind = "verify" if looked_only and self._acted else "act"
+        return "ok"
+
+    def _escalate(self, reason: str) -> None:
+        if not self.escalated:
+            self.escalated = True
+            self.reason = reason
+
+
+def gave_up(response) -> bool:
+    """True if a final reply reads as giving up rather than finishing."""
+    text = " ".join(getattr(b, "text", "") for b in response.content)
+    return text.lstrip().upper().startswith(GIVE_UP_PREFIX)
+
+
+# ── Tuning report ─────────────────────────────────────────────────────────────
+
+def route_stats(events: list[dict] | None = None) -> list[dict]:
+    """
+    Aggregate "request" telemetry per (route kind, tier): steps, success rate,
+    median / p90 latency and mean input tokens.
+    """
+    if events is None:
+        from telemetry import read_events
+        events = read_events("request")
+    groups: dict[tuple[str, str], list[dict]] = {}
+    for event in events:
+        if "route" in event:
+            groups.setdefault((event["route"], event.get("tier", "?")), []).append(event)
+
+    stats = []
+    for (kind, tier), items in sorted(groups.items()):
+        latencies = sorted(e["latency_ms"] for e in items if e.get("latency_ms") is not None)
+        tokens = [e["input_tokens"] for e in items if e.get("input_tokens") is not None]
+        stats.append({
+            "route": kind,
+            "tier": tier,
+            "steps": len(items),
+            "success": sum(e.get("outcome") in SUCCESS_OUTCOMES for e in items) / len(items),
+            "median_ms": statistics.median(latencies) if latencies else None,
+            "p90_ms": latencies[int(0.9 * (len(latencies) - 1))] if latencies else None,
+            "input_tokens": statistics.mean(tokens) if tokens else None,
+        })
+    return stats
+
+
+def main():
+    stats = route_stats()
+    if not stats:
+        print("No routed requests in telemetry yet.")
+        return
+    print(f"{'route':<8} {'tier':<7} {'steps':>6} {'success':>8} {'median':>9} {'p90':>9} {'in tok':>8}")
+    for s in stats:
+        median = f"{s['median_ms']:.0f} ms" if s["median_ms"] is not None else "-"
+        p90 = f"{s['p90_ms']:.0f} ms" if s["p90_ms"] is not None else "-"
+        tokens = f"{s['input_tokens']:.0f}" if s["input_tokens"] is not None else "-"
+        print(f"{s['route']:<8} {s['tier']:<7} {s['steps']:>6} {s['success']:>8.0%} {median:>9} {p90:>9} {tokens:>8}")
+
+
+if __name__ == "__main__":
+    main()
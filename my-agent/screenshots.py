@@ -0,0 +1,133 @@
+"""
+screenshots.py — Content-addressed screenshot store for the conversation.
+
+The history never holds image data. Each screenshot's PNG bytes are kept
+once in a ScreenshotStore, keyed by their BLAKE2 digest, and the history
+holds a small reference block in their place:
+
+    {"type": "image", "source": {"type": "screenshot_ref", "digest": "…", "media_type": "image/png"}}
+
+materialize() turns a message list into the API form just before a
+request is sent, Base64-encoding each referenced image into a throw-away
+copy. So the history pays for raw PNG bytes (no Base64 overhead, no copy
+per request), and identical frames are stored once however often they recur.
+
+retain() drops images no longer referenced by the history (after a turn
+is trimmed or the chat is reset).
+
+A store created with `load` (sessions.load_image for a resumed session)
+fetches unknown digests through it on first use, so a resumed history
+costs no image reads until a request needs them. A reference whose image
+is gone altogether is sent as a short text note instead.
+"""
+
+import base64
+import hashlib
+import threading
+
+REF_TYPE = "screenshot_ref"
+
+
+class ScreenshotStore:
+    """Thread-safe {digest → PNG bytes} with reference blocks for the history."""
+
+    def __init__(self, load=None):
+        self._images: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._load = load              # digest → PNG bytes or None, for images not in memory
+
+    def put(self, png: bytes) -> str:
+        """Store `png` (once) and return its digest."""
+        digest = hashlib.blake2b(png, digest_size=16).hexdigest()
+        with self._lock:
+            self._images.setdefault(digest, png)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with self._lock:
+            png = self._images.get(digest)
+        if png is None and self._load is not None:
+            png = self._load(digest)
+            if png is not None:
+                with self._lock:
+                    png = self._images.setdefault(digest, png)
+        if png is None:
+            raise KeyError(digest)
+        return png
+
+    def image_block(self, png: bytes, media_type: str = "image/png") -> dict:
+        """Store `png` and return the history block that refers to it."""
+        return {"type": "image", "source": {"type": REF_TYPE, "digest": self.put(png), "media_type": media_type}}
+
+    # ── Request serialization ─────────────────────────────────────────────────
+
+    def materialize(self, messages: list[dict]) -> list[dict]:
+        """
+        API-ready copy of `messages`, with every reference block replaced by
+        a Base64 image block. Messages without images are passed through as is.
+        """
+        return [self._message(m) for m in messages]
+
+    def _message(self, message: dict) -> dict:
+        content = message["content"]
+        if isinstance(content, str) or not _has_ref(content):
+            return message
+        return {**message, "content": [self._block(b) for b in content]}
+
+    def _block(self, block):
+        if not isinstance(block, dict):
+            return block               # SDK content blocks from assistant turns
+        if block.get("type") == "image" and block["source"].get("type") == REF_TYPE:
+            source = block["source"]
+            try:
+                png = self.get(source["digest"])
+            except KeyError:
+                return {"type": "text", "text": "(screenshot no longer available)"}
+            data = base64.b64encode(png).decode("ascii")
+            return {"type": "image", "source": {"type": "base64", "media_type": source["media_type"], "data": data}}
+        if block.get("type") == "tool_result" and isinstance(block.get("content"), list):
+            return {**block, "content": [self._block(b) for b in block["content"]]}
+        return block
+
+    # ── Housekeeping ──────────────────────────────────────────────────────────
+
+    def retain(self, messages: list[dict]) -> None:
+        """Forget every image `messages` no longer refers to."""
+        keep = set(referenced(messages))
+        with self._lock:
+            for digest in [d for d in self._images if d not in keep]:
+                del self._images[digest]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(len(png) for png in self._images.values())
+
+
+def referenced(messages: list[dict]):
+    """Yield the digest of every reference block in `messages`."""
+    for message in messages:
+        content = message["content"]
+        if not isinstance(content, str):
+            yield from _refs(content)
+
+
+def _refs(blocks):
+    for block in blocks:
+        if not isinstance(block, dict):
+            continue
+        if block.get("type") == "image" and block["source"].get("type") == REF_TYPE:
+            yield block["source"]["digest"]
+        elif block.get("type") == "tool_result" and isinstance(block.get("content"), list):
+            yield from _refs(block["content"])
+
+
+def _has_ref(blocks) -> bool:
+    return next(_refs(blocks), None) is not None
@@ -0,0 +1,213 @@
+"""
+search.py — Web search layer with a persistent result cache.
+
+Responsibilities:
+  - Keep one long-lived search client instead of opening a session per query
+  - Cache results on disk (SQLite) keyed by a normalized query, with a TTL
+    and least-recently-used eviction
+  - Run several queries concurrently and merge their results
+
+The backend is any object with `text(query, max_results) -> list[dict]`
+returning {"title", "body", "href"} dicts. DuckDuckGo is the default;
+call set_backend() to swap in a local stand-in (e.g. for tests).
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CACHE_FILE = Path(__file__).parent / ".cache" / "search.sqlite3"
+CACHE_TTL = 6 * 3600      # seconds a cached result stays valid
+CACHE_MAX_ENTRIES = 500   # LRU eviction beyond this many queries
+MAX_PARALLEL_QUERIES = 4
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace so near-identical queries share a key."""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+
+class DuckDuckGoBackend:
+    """DuckDuckGo text search over a single reused DDGS session."""
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def text(self, query: str, max_results: int) -> list[dict]:
+        client = self._get_client()
+        try:
+            return list(client.text(query, max_results=max_results))
+        except Exception:
+            # A dropped session is rebuilt once before giving up
+            self._reset_client()
+            return list(self._get_client().text(query, max_results=max_results))
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from duckduckgo_search import DDGS
+                self._client = DDGS()
+            return self._client
+
+    def _reset_client(self) -> None:
+        with self._lock:
+            self._client = None
+
+
+# ── On-disk cache ─────────────────────────────────────────────────────────────
+
+class SearchCache:
+    """SQLite-backed {normalized query → results} store with TTL and LRU eviction."""
+
+    def __init__(self, path: Path = CACHE_FILE, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, payload TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key: str) -> list[dict] | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT payload, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, results: list[dict]) -> None:
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, payload, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now),
+            )
+            # LRU eviction: keep only the most recently accessed entries
+            self._db.execute(
+                "DELETE FROM results WHERE key NOT IN "
+                "(SELECT key FROM results ORDER BY accessed DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+            self._db.commit()
+
+
+# ── Search front end ──────────────────────────────────────────────────────────
+
+_backend = None
+_cache: SearchCache | None = None
+_state_lock = threading.Lock()
+
+
+def set_backend(backend, cache: SearchCache | None = None) -> None:
+    """Replace the search backend (and optionally the cache) — used to plug in local stand-ins."""
+    global _backend, _cache
+    with _state_lock:
+        _backend = backend
+        if cache is not None:
+            _cache = cache
+
+
+def _get_backend():
+    global _backend
+    with _state_lock:
+        if _backend is None:
+            _backend = DuckDuckGoBackend()
+        return _backend
+
+
+def _get_cache() -> SearchCache | None:
+    global _cache
+    with _state_lock:
+        if _cache is None:
+            try:
+                _cache = SearchCache()
+            except (OSError, sqlite3.Error):
+                return None   # read-only install dir etc. — search still works uncached
+        return _cache
+
+
+def search_one(query: str, max_results: int = 5) -> list[dict]:
+    """Return results for one query, from the cache when fresh."""
+    key = f"{normalize_query(query)}|{max_results}"
+    cache = _get_cache()
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    results = [
+        {"title": r.get("title", ""), "body": r.get("body", ""), "href": r.get("href", "")}
+        for r in _get_backend().text(query, max_results)
+    ]
+    if cache is not None and results:
+        cache.put(key, results)
+    return results
+
+
+def search_many(queries: list[str], max_results: int = 5) -> list[dict]:
+    """
+    Run several queries concurrently and merge their results.
+
+    Results keep query order, then rank order; duplicate URLs are dropped.
+    A failing query contributes nothing — it does not sink the others,
+    unless every query fails, in which case the first error is raised.
+    """
+    # One request per normalized query — "Foo bar" and "foo bar!" share a fetch
+    unique = {}
+    for q in queries:
+        unique.setdefault(normalize_query(q), q.strip())
+    queries = [q for key, q in unique.items() if key]
+    if not queries:
+        return []
+
+    def _run(q):
+        try:
+            return search_one(q, max_results), None
+        except Exception as e:
+            return [], e
+
+    workers = min(len(queries), MAX_PARALLEL_QUERIES)
+    if workers == 1:
+        outcomes = [_run(queries[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(_run, queries))
+
+    errors = [e for _, e in outcomes if e is not None]
+    if len(errors) == len(outcomes):
+        raise errors[0]
+
+    merged, seen = [], set()
+    for results, _ in outcomes:
+        for r in results:
+            key = r["href"] or r["title"]
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(r)
+    return merged
@@ -0,0 +1,203 @@
+"""
+sessions.py — Persistent chat sessions: append-only turn logs, images out of line.
+
+Layout under .cache/sessions/:
+
+    <id>.jsonl     one JSON line per finished task ("turn"), appended, never rewritten:
+                   {"text", "state", "started", "bubbles": [[role, text], …], "messages": […]}
+    <id>.json      small sidecar rewritten after each turn:
+                   {"id", "title", "created", "updated", "turns": [byte offset of each line]}
+    images/<digest>.png
+                   screenshots, shared by all sessions and keyed by the same digest the
+                   ScreenshotStore uses — a turn's "messages" only hold reference blocks
+
+Listing sessions reads only the sidecars. A reader seeks straight to the
+turns it wants (the last page first, older pages on demand), and images
+are read from disk only when a request actually needs them
+(ScreenshotStore(load=load_image)). So reopening a long session never
+parses every turn or touches every screenshot up front.
+
+Only the newest MAX_SESSIONS sessions are kept; images no session refers
+to any more are deleted along with the old sessions.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from screenshots import referenced
+
+SESSIONS_DIR = Path(__file__).parent / ".cache" / "sessions"
+IMAGES_DIR = SESSIONS_DIR / "images"
+MAX_SESSIONS = 50
+PAGE_TURNS = 10          # turns shown when a session is opened, and per "earlier" page
+TITLE_CHARS = 60
+
+_DIGEST_RE = re.compile(rb'"digest":\s*"([0-9a-f]{32})"')
+_rotate_lock = threading.Lock()
+
+
+def new_session_id() -> str:
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + os.urandom(2).hex()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _jsonable(obj):
+    """json.dumps default: SDK content blocks (pydantic models) as plain dicts."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"not JSON serializable: {type(obj).__name__}")
+
+
+# ── Writing ───────────────────────────────────────────────────────────────────
+
+class SessionLog:
+    """Appends turns to one session (new, or an existing one being resumed)."""
+
+    def __init__(self, session_id: str | None = None, directory: Path = SESSIONS_DIR):
+        self.id = session_id or new_session_id()
+        self._dir = directory
+        self._log = directory / f"{self.id}.jsonl"
+        self._meta_file = directory / f"{self.id}.json"
+        self.meta = _read_meta(self._meta_file) or {
+            "id": self.id, "title": "", "created": time.time(), "updated": time.time(), "turns": [],
+        }
+
+    def append_turn(self, text: str, state: str, started: float, bubbles: list,
+                    messages: list[dict], images: dict[str, bytes]) -> None:
+        """Persist one finished task: its images first, then the log line, then the sidecar."""
+        new = not self.meta["turns"]
+        images_dir = self._dir / IMAGES_DIR.name
+        images_dir.mkdir(parents=True, exist_ok=True)
+        for digest, png in images.items():
+            path = images_dir / f"{digest}.png"
+            if not path.exists():
+                _write_atomic(path, png)
+
+        line = json.dumps(
+            {"text": text, "state": state, "started": started, "bubbles": bubbles, "messages": messages},
+            ensure_ascii=False, default=_jsonable,
+        ).encode("utf-8") + b"\n"
+        with open(self._log, "ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(line)
+
+        self.meta["turns"].append(offset)
+        self.meta["updated"] = time.time()
+        if not self.meta["title"]:
+            self.meta["title"] = " ".join(text.split())[:TITLE_CHARS]
+        _write_atomic(self._meta_file, json.dumps(self.meta).encode("utf-8"))
+        if new:
+            rotate(self._dir)
+
+
+# ── Reading ───────────────────────────────────────────────────────────────────
+
+class SessionReader:
+    """Random access to a session's turns by index, via the sidecar's offsets."""
+
+    def __init__(self, session_id: str, directory: Path = SESSIONS_DIR):
+        self.id = session_id
+        self._log = directory / f"{session_id}.jsonl"
+        meta = _read_meta(directory / f"{session_id}.json")
+        if meta is None:
+            raise FileNotFoundError(f"no session {session_id}")
+        self.meta = meta
+        self._offsets = meta["turns"]
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def turns(self, start: int, stop: int) -> list[dict]:
+        """Turns [start, stop) — one seek, then only those lines are read and parsed."""
+        start, stop = max(start, 0), min(stop, len(self._offsets))
+        if start >= stop:
+            return []
+        with open(self._log, "rb") as f:
+            f.seek(self._offsets[start])
+            return [json.loads(f.readline()) for _ in range(stop - start)]
+
+    def messages(self, start: int = 0, stop: int | None = None) -> list[dict]:
+        """Model-side history of turns [start, stop) — all by default (reference blocks only, no image data)."""
+        history = []
+        for turn in self.turns(start, len(self) if stop is None else stop):
+            history.extend(turn["messages"])
+        return history
+
+
+def _read_meta(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def list_sessions(limit: int = 20, directory: Path = SESSIONS_DIR) -> list[dict]:
+    """Sidecars of the most recently updated sessions, newest first (no logs are read)."""
+    metas = [m for m in map(_read_meta, directory.glob("*.json")) if m and m.get("turns")]
+    metas.sort(key=lambda m: m["updated"], reverse=True)
+    return metas[:limit]
+
+
+def load_image(digest: str) -> bytes | None:
+    """PNG bytes of a persisted screenshot (ScreenshotStore's loader), or None."""
+    try:
+        return (IMAGES_DIR / f"{digest}.png").read_bytes()
+    except OSError:
+        return None
+
+
+def turn_images(messages: list[dict], get) -> dict[str, bytes]:
+    """{digest: png} for every screenshot `messages` refer to, fetched through `get`."""
+    images = {}
+    for digest in referenced(messages):
+        if digest not in images:
+            try:
+                images[digest] = get(digest)
+            except KeyError:
+                pass
+    return images
+
+
+# ── Housekeeping ──────────────────────────────────────────────────────────────
+
+def rotate(directory: Path = SESSIONS_DIR, keep: int = MAX_SESSIONS) -> None:
+    """Delete sessions beyond the newest `keep`, then images no remaining session refers to."""
+    with _rotate_lock:
+        metas = sorted(filter(None, map(_read_meta, directory.glob("*.json"))),
+                       key=lambda m: m["updated"], reverse=True)
+        if len(metas) <= keep:
+            return
+        for meta in metas[keep:]:
+            for suffix in (".json", ".jsonl"):
+                try:
+                    (directory / f"{meta['id']}{suffix}").unlink()
+                except OSError:
+                    pass
+        used = set()
+        for log in directory.glob("*.jsonl"):
+            try:
+                used.update(m.decode() for m in _DIGEST_RE.findall(log.read_bytes()))
+            except OSError:
+                return                 # can't tell what is still referenced: keep every image
+        for image in (directory / IMAGES_DIR.name).glob("*.png"):
+            if image.stem not in used:
+                try:
+                    image.unlink()
+                except OSError:
+                    pass
@@ -0,0 +1,103 @@
+"""
+startup_bench.py — Cold-start benchmark for the agent.
+
+Measures two things, each in fresh interpreter processes:
+
+  1. Import cost: `python -X importtime` breakdown of the modules on the
+     window path (ui, config) versus the deferred agent path (agent_core),
+     listing the slowest top-level imports of each.
+  2. Wall time: launches main.py with AGENT_STARTUP_BENCH=1, which prints
+     "time-to-window" once the chat window is first painted and
+     "agent-ready" once the background import has finished, then quits.
+
+Usage:
+    python startup_bench.py [--runs N] [--top K]
+
+Close any running tray instance first (the single-instance guard would
+otherwise turn the launch into an "already running" message).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+
+def import_breakdown(module: str) -> tuple[float, list[tuple[float, str]]]:
+    """Return (total seconds, [(cumulative seconds, top-level module)]) for importing `module`."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    top_level = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, raw_name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level after the "| " separator
+        if len(raw_name) - len(raw_name.lstrip()) > 1:
+            continue
+        top_level.append((int(cumulative) / 1e6, raw_name.strip()))
+        total_us += int(cumulative)
+    top_level.sort(reverse=True)
+    return total_us / 1e6, top_level
+
+
+def launch_timings(runs: int) -> dict[str, list[float]]:
+    """Launch main.py `runs` times in bench mode and collect its printed timings."""
+    env = dict(os.environ, **{"AGENT_STARTUP_BENCH": "1"})
+    env.setdefault("ANTHROPIC_API_KEY", "bench")   # skip the first-run key dialog
+    timings: dict[str, list[float]] = {"time-to-window": [], "agent-ready": []}
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "main.py"], cwd=HERE, env=env,
+            capture_output=True, text=True, timeout=120,
+        )
+        for line in proc.stdout.splitlines():
+            label, _, value = line.partition(" ")
+            if label in timings:
+                timings[label].append(float(value))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="main.py launches to average (default 5)")
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to list per module (default 8)")
+    parser.add_argument("--imports-only", action="store_true", help="skip launching main.py")
+    args = parser.parse_args()
+
+    print("── Import cost (-X importtime, cumulative) ──")
+    for label, module in (("window path", "ui"), ("window path", "config"), ("deferred", "agent_core")):
+        try:
+            total, breakdown = import_breakdown(module)
+        except RuntimeError as e:
+            print(f"\n{module}: {e}")
+            continue
+        print(f"\n{module} ({label}): {total * 1000:.0f} ms")
+        for seconds, name in breakdown[:args.top]:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    if args.imports_only:
+        return
+
+    print(f"\n── main.py wall time ({args.runs} runs) ──")
+    for label, values in launch_timings(args.runs).items():
+        if not values:
+            print(f"{label}: no data (is another instance running?)")
+            continue
+        print(f"{label}: median {statistics.median(values) * 1000:.0f} ms, "
+              f"min {min(values) * 1000:.0f} ms, max {max(values) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+tasks.py — FIFO task queue for the agent worker.
+
+Every user message becomes a Task with its own ID and state:
+
+    queued → running → done | failed | cancelled
+
+A task cancelled while still queued is skipped when it reaches the front.
+Cancelling the running task is cooperative: the worker is told through the
+controller's abort flag and unwinds at its next check (polled while an
+API response is awaited, and between tool steps, subprocess polls and
+waits).
+
+Tasks can be prepared ahead of time (prompt assembly, and later a
+speculative screenshot) on a single helper thread, so the next task is
+ready the moment the current one finishes.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = frozenset({DONE, FAILED, CANCELLED})
+
+_ids = itertools.count(1)
+
+
+class Task:
+    """One submitted user message and its lifecycle."""
+
+    def __init__(self, text: str):
+        self.id = next(_ids)
+        self.text = text
+        self.state = QUEUED
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.error = ""
+        self.prepared: Future | None = None   # resolves to the first user turn's inputs
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def __repr__(self) -> str:
+        return f"Task(#{self.id} {self.state} {self.text[:30]!r})"
+
+
+class TaskQueue:
+    """Thread-safe FIFO of Tasks with cancellation and ahead-of-time preparation."""
+
+    def __init__(self, prepare=None):
+        """`prepare(task)` (optional) is run on a helper thread right after submit."""
+        self._prepare = prepare
+        self._pending: deque[Task] = deque()
+        self._current: Task | None = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._preparer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-prep") if prepare else None
+
+    # ── Producer side ─────────────────────────────────────────────────────────
+
+    def submit(self, text: str) -> Task:
+        task = Task(text)
+        if self._preparer is not None:
+            task.prepared = self._preparer.submit(self._prepare, task)
+        with self._cond:
+            self._pending.append(task)
+            self._cond.notify()
+        return task
+
+    def cancel(self, task_id: int | None = None) -> Task | None:
+        """
+        Cancel a queued task by ID, or the running one (task_id None or its ID).
+        Returns the task that was cancelled, or None if nothing matched.
+        The caller is responsible for interrupting a running task.
+        """
+        with self._cond:
+            if task_id is None or (self._current and self._current.id == task_id):
+                return self._current
+            for task in self._pending:
+                if task.id == task_id:
+                    self._pending.remove(task)
+                    self._finish(task, CANCELLED)
+                    return task
+        return None
+
+    def cancel_pending(self) -> list[Task]:
+        """Cancel every queued (not yet running) task."""
+        with self._cond:
+            cancelled = list(self._pending)
+            self._pending.clear()
+        for task in cancelled:
+            self._finish(task, CANCELLED)
+        return cancelled
+
+    def close(self) -> None:
+        """Wake the consumer with no task so it can exit."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._preparer is not None:
+            self._preparer.shutdown(wait=False, cancel_futures=True)
+
+    # ── Consumer side ─────────────────────────────────────────────────────────
+
+    def next(self) -> Task | None:
+        """Block until a task is available and mark it running. None once closed."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            task = self._pending.popleft()
+            task.state = RUNNING
+            task.started = time.time()
+            self._current = task
+            return task
+
+    def finish(self, task: Task, state: str, error: str = "") -> None:
+        with self._cond:
+            if self._current is task:
+                self._current = None
+        self._finish(task, state, error)
+
+    @staticmethod
+    def _finish(task: Task, state: str, error: str = "") -> None:
+        task.state = state
+        task.error = error
+        task.finished = time.time()
+        if task.prepared is not None:
+            task.prepared.cancel()
+
+    # ── Introspection ─────────────────────────────────────────────────────────
+
+    @property
+    def current(self) -> Task | None:
+        return self._current
+
+    def pending(self) -> list[Task]:
+        with self._cond:
+            return list(self._pending)
+
+    def __len__(self) -> int:
+        """Unfinished tasks: queued plus the one running."""
+        with self._cond:
+            return len(self._pending) + (self._current is not None)
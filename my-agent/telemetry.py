@@ -0,0 +1,62 @@
+"""
+telemetry.py — Local, append-only event log for tuning the agent.
+
+Each event is one JSON line in .cache/telemetry.jsonl:
+
+    {"ts": 1760000000.0, "event": "request", "input_tokens": 1830, ...}
+
+Nothing leaves the machine. Set AGENT_TELEMETRY=off in .env to disable.
+read_events() loads the log back for analysis.
+"""
+
+import json
+import threading
+import time
+from pathlib import Path
+
+TELEMETRY_FILE = Path(__file__).parent / ".cache" / "telemetry.jsonl"
+MAX_BYTES = 5 * 1024 * 1024   # rotate to telemetry.jsonl.1 beyond this
+
+_lock = threading.Lock()
+_enabled: bool | None = None
+
+
+def _is_enabled() -> bool:
+    global _enabled
+    if _enabled is None:
+        from config import get_setting
+        _enabled = get_setting("AGENT_TELEMETRY", "on").lower() != "off"
+    return _enabled
+
+
+def record(event: str, **fields) -> None:
+    """Append one event. Never raises — telemetry must not break a task."""
+    if not _is_enabled():
+        return
+    line = json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str)
+    try:
+        with _lock:
+            TELEMETRY_FILE.parent.mkdir(parents=True, exist_ok=True)
+            if TELEMETRY_FILE.exists() and TELEMETRY_FILE.stat().st_size > MAX_BYTES:
+                TELEMETRY_FILE.replace(TELEMETRY_FILE.with_suffix(".jsonl.1"))
+            with open(TELEMETRY_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError:
+        pass
+
+
+def read_events(event: str | None = None) -> list[dict]:
+    """Load logged events (optionally only one kind), oldest first."""
+    events = []
+    try:
+        with open(TELEMETRY_FILE, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                if event is None or item.get("event") == event:
+                    events.append(item)
+    except OSError:
+        pass
+    return events
@@ -0,0 +1,91 @@
+"""Input batches: what run_actions hands the backend, and the key codes SendInput gets."""
+
+import ctypes
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from input_backend import RecordingBackend, SendInputBackend, get_backend, hotkey_events, set_backend  # noqa: E402
+
+
+@pytest.fixture
+def recorder():
+    backend = RecordingBackend()
+    set_backend(backend)
+    yield backend
+    set_backend(None)
+
+
+def test_hotkey_presses_in_order_and_releases_in_reverse(recorder):
+    get_backend().send(hotkey_events(["Control", "Shift", "t"]))
+    assert recorder.batches == [[
+        ("key_down", "ctrl"), ("key_down", "shift"), ("key_down", "t"),
+        ("key_up", "t"), ("key_up", "shift"), ("key_up", "ctrl"),
+    ]]
+
+
+def test_run_actions_sends_input_steps_as_one_batch(recorder, monkeypatch):
+    controller = pytest.importorskip("controller")   # needs pyautogui, pygetwindow, pynput
+    monkeypatch.setattr(controller, "_motion", "teleport")
+    monkeypatch.setattr(controller, "POST_ACTION_PAUSE", 0)
+    report = controller.run_actions([
+        {"type": "hotkey", "keys": ["ctrl", "l"]},
+        {"type": "press", "key": "enter"},
+    ])
+    assert report.startswith("2/2 steps succeeded")
+    assert recorder.batches == [[
+        ("key_down", "ctrl"), ("key_down", "l"), ("key_up", "l"), ("key_up", "ctrl"),
+        ("key_down", "enter"), ("key_up", "enter"),
+    ]]
+
+
+def test_run_actions_marks_a_failed_step(recorder, monkeypatch):
+    controller = pytest.importorskip("controller")
+    monkeypatch.setattr(controller, "_motion", "teleport")
+    monkeypatch.setattr(controller, "POST_ACTION_PAUSE", 0)
+    report = controller.run_actions([{"type": "press", "key": "enter"}, {"type": "levitate"}])
+    assert report.startswith("Error: step 2 of 2 failed")
+
+
+# ── SendInput key codes ───────────────────────────────────────────────────────
+
+@pytest.fixture
+def sendinput(monkeypatch):
+    """A SendInputBackend over a fake user32 whose layout (like Hebrew) has no Latin letters."""
+    sent = []
+
+    def send_input(count, array, size):
+        sent.extend((array[i].ki.wVk, array[i].ki.dwFlags) for i in range(count))
+        return count
+
+    user32 = SimpleNamespace(SendInput=send_input, VkKeyScanW=lambda char: -1)
+    monkeypatch.setattr(ctypes, "windll", SimpleNamespace(user32=user32), raising=False)
+    backend = SendInputBackend()
+    backend.sent = sent
+    return backend
+
+
+def test_ctrl_v_maps_letters_without_the_layout(sendinput):
+    sendinput.send(hotkey_events(["ctrl", "v"]))
+    assert sendinput.sent == [(0x11, 0), (ord("V"), 0), (ord("V"), 2), (0x11, 2)]
+
+
+@pytest.mark.parametrize("key, vk", [("a", 0x41), ("z", 0x5A), ("0", 0x30), ("9", 0x39)])
+def test_letters_and_digits_map_to_their_vk_codes(sendinput, key, vk):
+    sendinput.send([("key_down", key)])
+    assert sendinput.sent == [(vk, 0)]
+
+
+def test_capital_letters_carry_shift(sendinput):
+    sendinput.send([("key_down", "A")])
+    assert sendinput.sent == [(0x10, 0), (0x41, 0), (0x10, 2)]
+
+
+def test_other_characters_still_need_the_layout(sendinput):
+    with pytest.raises(ValueError, match="not on the current keyboard layout"):
+        sendinput.send([("key_down", "?")])
+
@@ -0,0 +1,66 @@
+"""Macro matching must not let a slot swallow clauses the recorded task never did."""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from macros import MacroStore  # noqa: E402
+
+NOTEPAD_STEPS = [
+    ("run_command", {"command": "start notepad"}, "(no output)"),
+    ("type_text", {"text": "hello"}, "Typed 5 characters."),
+]
+
+
+def _store(tmp_path):
+    store = MacroStore(tmp_path / "macros.json")
+    assert store.record("open notepad and type hello", NOTEPAD_STEPS, "Untitled - Notepad")
+    return store
+
+
+def test_same_intent_matches_with_new_slot(tmp_path):
+    macro, values = _store(tmp_path).match("Open Notepad and type goodbye")
+    assert macro["template"] == "open notepad and type {}"
+    assert values == ["goodbye"]
+
+
+def test_trailing_clauses_do_not_match(tmp_path):
+    store = _store(tmp_path)
+    assert store.match("open notepad and type hello and then save it to desktop as notes.txt") is None
+    assert store.match("Open Notepad and type goodbye, then close it") is None
+
+
+def test_task_without_window_title_is_not_recorded(tmp_path):
+    store = MacroStore(tmp_path / "macros.json")
+    assert not store.record("open notepad and type hello", NOTEPAD_STEPS, "")
+    assert store.match("open notepad and type hello") is None
+
+
+def test_partly_failed_batch_is_not_recorded(tmp_path):
+    store = MacroStore(tmp_path / "macros.json")
+    steps = [("run_actions", {"steps": [{"type": "press", "key": "enter"}]},
+              "Error: step 1 of 1 failed — 0/1 steps succeeded in 3 ms\n1. [error] press: no window")]
+    assert not store.record("open notepad and type hello", steps, "Untitled - Notepad")
+
+
+def test_slot_in_shell_command_is_recorded_literally(tmp_path):
+    store = MacroStore(tmp_path / "macros.json")
+    steps = [("run_command", {"command": "mkdir reports"}, "(no output)")]
+    assert store.record('make a folder called "reports"', steps, "Explorer")
+    assert store.match('make a folder called "x & del /q *"') is None
+    macro, values = store.match('make a folder called "reports"')
+    assert values == [] and macro["steps"][0]["input"]["command"] == "mkdir reports"
+
+
+def test_replay_stops_at_a_partly_failed_batch(tmp_path):
+    store = _store(tmp_path)
+    macro, values = store.match("open notepad and type goodbye")
+    ran = []
+
+    def run_tool(name, args):
+        ran.append(name)
+        return "Error: step 2 of 3 failed — 1/3 steps succeeded in 9 ms"
+
+    ok, detail = store.replay(macro, values, run_tool, lambda: "Untitled - Notepad")
+    assert not ok and ran == ["run_command"]
@@ -0,0 +1,56 @@
+"""Search front end over a stand-in backend: cache hits and concurrent fan-out."""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import search  # noqa: E402
+
+
+class StubBackend:
+    """Answers every query with two results; optionally waits for `barrier` first."""
+
+    def __init__(self, barrier: threading.Barrier | None = None):
+        self.barrier = barrier
+        self.calls: list[str] = []
+        self._lock = threading.Lock()
+
+    def text(self, query: str, max_results: int) -> list[dict]:
+        with self._lock:
+            self.calls.append(query)
+        if self.barrier is not None:
+            self.barrier.wait()     # times out unless the queries run at the same time
+        return [{"title": f"{query} {i}", "body": "", "href": f"https://example.com/{query}/{i}"}
+                for i in range(2)]
+
+
+@pytest.fixture
+def use_backend(tmp_path, monkeypatch):
+    # Put the module's own backend and cache back afterwards
+    monkeypatch.setattr(search, "_backend", search._backend)
+    monkeypatch.setattr(search, "_cache", search._cache)
+
+    def install(backend):
+        search.set_backend(backend, search.SearchCache(tmp_path / "search.sqlite3"))
+        return backend
+
+    return install
+
+
+def test_repeated_query_is_served_from_the_cache(use_backend):
+    backend = use_backend(StubBackend())
+    first = search.search_one("Weather in Haifa", max_results=2)
+    again = search.search_one("weather in haifa?", max_results=2)
+    assert again == first
+    assert backend.calls == ["Weather in Haifa"]
+
+
+def test_queries_fan_out_in_parallel_and_merge_in_order(use_backend):
+    backend = use_backend(StubBackend(threading.Barrier(3, timeout=5)))
+    results = search.search_many(["alpha", "beta", "gamma", "Alpha!"], max_results=2)
+    assert sorted(backend.calls) == ["alpha", "beta", "gamma"]     # "Alpha!" shares alpha's fetch
+    assert [r["title"] for r in results] == ["alpha 0", "alpha 1", "beta 0", "beta 1", "gamma 0", "gamma 1"]
@@ -4,42 +4,119 @@ tools.py — Claude API tool schema + dispatcher.
 This module is intentionally thin: it delegates all implementation to:
   • vision.py     — screen capture and encoding
   • controller.py — mouse, keyboard, and shell actions
+  • perception.py — local OCR / accessibility index for find_on_screen
+  • search.py     — cached, concurrent web search for search_web
+  • fileindex.py  — incremental file-path index for find_files
+  • fileio.py     — ranged reads, atomic writes and searches for the file tools
+  • verify.py     — local window / process / file / clipboard / screen checks
+  • compaction.py — stored full output of compacted results for read_output
 
-The TOOL_DEFINITIONS list is sent verbatim to the Anthropic API so Claude
-knows what functions are available. TOOL_FUNCTIONS maps each tool name to
-a callable that accepts the dict of arguments Claude provides.
+The TOOL_DEFINITIONS list is the full schema Claude can be given.
+TOOL_FUNCTIONS maps each tool name to a callable that accepts the dict of
+arguments Claude provides.
+
+TOOL_GROUPS splits the schema into a compact "core" set that is always sent
+and optional groups (mouse, keyboard, windows, search, files, output) that are
+added per task — when intent.predict_tool_groups() expects them, when the model
+asks via the request_tools meta-tool, or when the history already uses them.
+The output group (read_output) is also loaded as soon as a result is compacted.
+select_tools() builds the list actually sent with a request.
 """
 
 # ── Implementation imports ────────────────────────────────────────────────────
+# Resolved on first call, not at import time: importing tools.py (e.g. just for
+# TOOL_DEFINITIONS) must not drag in pyautogui, pynput, PIL or DuckDuckGo.
+
+import importlib
+import json
+import re
+
+
+def _lazy(module: str, name: str):
+    """Return a stand-in for `module.name` that imports the module on first call."""
+    def call(*args, **kwargs):
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+capture_scoped = _lazy("vision", "capture_scoped")
+get_screen_size = _lazy("vision", "get_screen_size")
+
+available_backends = _lazy("perception", "available_backends")
+find_elements = _lazy("perception", "find_elements")
+
+search_many = _lazy("search", "search_many")
+
+find_files = _lazy("fileindex", "find_files")
+read_file = _lazy("fileio", "read_file")
+write_file = _lazy("fileio", "write_file")
+grep_file = _lazy("fileio", "grep_file")
+
+verify = _lazy("verify", "verify")
 
-from vision import capture_and_encode, get_screen_size
-
-from controller import (
-    click,
-    double_click,
-    right_click,
-    move_mouse,
-    scroll,
-    type_text,
-    press_key,
-    hotkey,
-    run_command,
-    wait,
-    list_windows,
-    focus_window,
-    close_duplicate_windows,
-    count_windows,
-)
+read_output = _lazy("compaction", "read_output")
+
+click = _lazy("controller", "click")
+double_click = _lazy("controller", "double_click")
+right_click = _lazy("controller", "right_click")
+move_mouse = _lazy("controller", "move_mouse")
+scroll = _lazy("controller", "scroll")
+type_text = _lazy("controller", "type_text")
+press_key = _lazy("controller", "press_key")
+hotkey = _lazy("controller", "hotkey")
+run_command = _lazy("controller", "run_command")
+wait = _lazy("controller", "wait")
+list_windows = _lazy("controller", "list_windows")
+focus_window = _lazy("controller", "focus_window")
+close_duplicate_windows = _lazy("controller", "close_duplicate_windows")
+count_windows = _lazy("controller", "count_windows")
+get_coordinate_origin = _lazy("controller", "get_coordinate_origin")
+run_actions = _lazy("controller", "run_actions")
+
+
+# ── Screenshot ────────────────────────────────────────────────────────────────
+
+def take_screenshot(bbox=None, window_title: str = "", monitor=None) -> dict | str:
+    """Capture the (optionally scoped) screen; returns an error string for a bad scope."""
+    try:
+        return capture_scoped(bbox=bbox, window_title=window_title, monitor=monitor)
+    except ValueError as e:
+        return f"Error: screenshot failed: {e}"
+
+
+# ── Local element lookup ──────────────────────────────────────────────────────
+
+def find_on_screen(text: str, refresh: bool = False, limit: int = 5) -> str:
+    """Look up on-screen text / UI elements locally and return their click coordinates."""
+    if not available_backends():
+        return "Local lookup unavailable (install pytesseract or pywinauto) — use take_screenshot."
+    try:
+        matches = find_elements(text, limit=limit, refresh=refresh)
+    except Exception as e:
+        return f"Error: local lookup failed: {e}"
+    if not matches:
+        return f"No on-screen element matching '{text}'. Try take_screenshot."
+
+    # Report coordinates in the same space click() expects (see set_coordinate_origin)
+    ox, oy = get_coordinate_origin()
+    lines = [
+        f"{i + 1}. '{m['text'][:60]}' ({m['kind']}, {m['source']}) at ({m['x'] - ox}, {m['y'] - oy}) "
+        f"size {m['width']}x{m['height']} score {m['score']}"
+        for i, m in enumerate(matches)
+    ]
+    return "\n".join(lines)
 
 
 # ── Web search (standalone — no hardware access needed) ───────────────────────
 
-def search_web(query: str) -> str:
-    """Search DuckDuckGo and return the top 5 results."""
+def search_web(query: str = "", queries: list[str] | None = None) -> str:
+    """Search DuckDuckGo (cached) for one or several queries and return the merged results."""
+    all_queries = ([query] if query else []) + list(queries or [])
+    if not all_queries:
+        return "No query given."
     try:
-        from duckduckgo_search import DDGS
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=5))
+        results = search_many(all_queries, max_results=5)
         if not results:
             return "No results found."
         lines = [
@@ -48,7 +125,7 @@ def search_web(query: str) -> str:
         ]
         return "\n\n".join(lines)
     except Exception as e:
-        return f"Search failed: {e}"
+        return f"Error: search failed: {e}"
 
 
 # ── Claude API tool schema ────────────────────────────────────────────────────
@@ -59,9 +136,31 @@ TOOL_DEFINITIONS = [
         "description": (
             "Capture the current screen as an image. "
             "Use ONLY at the start of a task (to see the screen) and at the very end (to confirm the goal). "
-            "Do NOT call between actions — trust run_command to execute the full sequence."
+            "Do NOT call between actions — trust run_command to execute the full sequence. "
+            "Optionally scope the capture to a bounding box, a window or a monitor — smaller "
+            "images come back faster. After a scoped capture, x/y given to click, double_click, "
+            "right_click, move_mouse and scroll are relative to the cropped image until the "
+            "next full-screen screenshot."
         ),
-        "input_schema": {"type": "object", "properties": {}, "required": []},
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "bbox": {
+                    "type": "array",
+                    "items": {"type": "integer"},
+                    "description": "Optional [left, top, width, height] in screen pixels",
+                },
+                "window_title": {
+                    "type": "string",
+                    "description": "Optional partial window title — capture only that window",
+                },
+                "monitor": {
+                    "type": "integer",
+                    "description": "Optional monitor index (0 = primary) — capture only that monitor",
+                },
+            },
+            "required": [],
+        },
     },
     {
         "name": "get_screen_size",
@@ -178,13 +277,52 @@ TOOL_DEFINITIONS = [
             "required": ["keys"],
         },
     },
+    {
+        "name": "run_actions",
+        "description": (
+            "Run a whole UI sequence in ONE call, in-process and instantly — the MAIN tool for "
+            "desktop automation. Steps run in order; the first failing step stops the batch. "
+            "Returns per-step results and timings, opened by \"Error: step K of N failed\" if a step failed. Step types: "
+            "click/double_click/right_click/move {x, y}; scroll {x, y, clicks}; "
+            "hotkey {keys: [..]}; press {key}; paste {text} (clipboard, layout-safe); "
+            "wait {seconds}; focus_window {title}; wait_for_window {title, timeout?, focus?}. "
+            "Example: [{\"type\": \"hotkey\", \"keys\": [\"ctrl\", \"l\"]}, "
+            "{\"type\": \"paste\", \"text\": \"youtube.com\"}, {\"type\": \"press\", \"key\": \"enter\"}]"
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "steps": {
+                    "type": "array",
+                    "description": "Ordered list of typed action steps",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "type": {"type": "string", "description": "Step type (see tool description)"},
+                            "x": {"type": "integer"},
+                            "y": {"type": "integer"},
+                            "clicks": {"type": "integer"},
+                            "keys": {"type": "array", "items": {"type": "string"}},
+                            "key": {"type": "string"},
+                            "text": {"type": "string"},
+                            "seconds": {"type": "number"},
+                            "title": {"type": "string"},
+                            "timeout": {"type": "number"},
+                            "focus": {"type": "boolean"},
+                        },
+                        "required": ["type"],
+                    },
+                },
+            },
+            "required": ["steps"],
+        },
+    },
     {
         "name": "run_command",
         "description": (
-            "Run a Windows shell command or a full Python automation script. "
-            "Use this as the MAIN action tool — batch the entire sequence into one call. "
-            "Example: python -c \"import pyautogui, pyperclip, time; ...\" "
-            "Returns stdout + stderr."
+            "Run a Windows shell command (start an app, file operations, scripts). "
+            "For clicks, keystrokes and typing use run_actions instead — it is faster and "
+            "needs no quoting. Returns stdout + stderr; a non-zero exit is reported as \"Error: exit code N\"."
         ),
         "input_schema": {
             "type": "object",
@@ -194,6 +332,30 @@ TOOL_DEFINITIONS = [
             "required": ["command"],
         },
     },
+    {
+        "name": "verify",
+        "description": (
+            "Confirm the task succeeded with local checks instead of a final screenshot. "
+            "Each check is an object with a 'type': "
+            "window {title, foreground?} · process {name} · "
+            "file {path, contains?, modified_within? (seconds), min_size?} · "
+            "clipboard {equals? | contains?} · "
+            "screen {bbox: [left, top, width, height]} — the region changed since the last full screenshot. "
+            "Add \"not\": true to invert a check. With timeout, retries until all pass."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "checks": {
+                    "type": "array",
+                    "items": {"type": "object"},
+                    "description": "Checks that must all hold",
+                },
+                "timeout": {"type": "number", "description": "Seconds to keep retrying (max 10, default 0)"},
+            },
+            "required": ["checks"],
+        },
+    },
     {
         "name": "list_windows",
         "description": "List all open window titles, optionally filtered by a substring. Use to check what is currently open before opening a new app.",
@@ -252,18 +414,156 @@ TOOL_DEFINITIONS = [
             "required": ["seconds"],
         },
     },
+    {
+        "name": "find_on_screen",
+        "description": (
+            "Find a button, link, label or any visible text on screen WITHOUT a screenshot. "
+            "Uses a local OCR + accessibility index and returns matching elements with the "
+            "(x, y) to pass to click. Much faster than take_screenshot — try this first "
+            "when you only need to locate something."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "text": {"type": "string", "description": "Text or label to look for (case-insensitive, fuzzy)"},
+                "refresh": {"type": "boolean", "description": "Force a fresh scan instead of the cached index"},
+            },
+            "required": ["text"],
+        },
+    },
+    {
+        "name": "request_tools",
+        "description": (
+            "Load an extra tool group for the rest of this task. Groups: "
+            "mouse (click, double_click, right_click, move_mouse, scroll, get_screen_size), "
+            "keyboard (type_text, press_key, hotkey), "
+            "windows (list_windows, count_windows, focus_window, close_duplicate_windows), "
+            "search (search_web), "
+            "files (find_files, read_file, write_file, grep_file), "
+            "output (read_output)."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "groups": {
+                    "type": "array",
+                    "items": {"type": "string", "enum": ["mouse", "keyboard", "windows", "search", "files", "output"]},
+                },
+            },
+            "required": ["groups"],
+        },
+    },
     {
         "name": "search_web",
         "description": (
-            "Search the web with DuckDuckGo and return the top 5 results "
-            "(title, snippet, URL)."
+            "Search the web with DuckDuckGo and return the top 5 results per query "
+            "(title, snippet, URL). Pass several related queries in 'queries' to run them "
+            "concurrently and get one merged, de-duplicated list. Results are cached."
         ),
         "input_schema": {
             "type": "object",
             "properties": {
                 "query": {"type": "string", "description": "Search query"},
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Optional extra queries to run in parallel",
+                },
             },
-            "required": ["query"],
+            "required": [],
+        },
+    },
+    {
+        "name": "find_files",
+        "description": (
+            "Find files and folders by name in the local file index (the user's home folder, "
+            "kept up to date in the background) — answers in milliseconds. Use this instead of "
+            "dir /s or findstr. 'query' matches names: plain words must all appear in the name, "
+            "or use a glob like 'report*.docx'. Results show full path, size and modified time."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Words in the name, or a glob pattern"},
+                "ext": {"type": "string", "description": "Only this extension, e.g. 'pdf'"},
+                "under": {"type": "string", "description": "Only inside this folder"},
+                "limit": {"type": "integer", "description": "Max results (default 20, max 50)"},
+                "refresh": {"type": "boolean", "description": "Rescan changed folders first (after creating files)"},
+            },
+            "required": [],
+        },
+    },
+    {
+        "name": "read_file",
+        "description": (
+            "Read a text file directly (no shell). By default returns up to 20000 characters from "
+            "the start; pass start_line/end_line for numbered lines, or offset/length for a byte "
+            "range. The result says how to continue when there is more."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path (absolute, or relative to the home folder)"},
+                "start_line": {"type": "integer", "description": "First line, 1-based"},
+                "end_line": {"type": "integer", "description": "Last line, inclusive"},
+                "offset": {"type": "integer", "description": "Byte offset to start at"},
+                "length": {"type": "integer", "description": "Bytes to read"},
+            },
+            "required": ["path"],
+        },
+    },
+    {
+        "name": "write_file",
+        "description": (
+            "Write text to a file (UTF-8), creating missing folders. Replaces the file atomically, "
+            "or appends with append=true."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path (absolute, or relative to the home folder)"},
+                "content": {"type": "string", "description": "Text to write"},
+                "append": {"type": "boolean", "description": "Append instead of replacing"},
+            },
+            "required": ["path", "content"],
+        },
+    },
+    {
+        "name": "grep_file",
+        "description": (
+            "Search one text file (any size — large logs are memory-mapped) and return only the "
+            "matching lines, numbered, with a few lines of context. Follow up with read_file "
+            "start_line/end_line for more."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "path": {"type": "string", "description": "File path"},
+                "pattern": {"type": "string", "description": "Text to find (or a regex with regex=true)"},
+                "regex": {"type": "boolean", "description": "Treat pattern as a regular expression"},
+                "ignore_case": {"type": "boolean", "description": "Case-insensitive (default true)"},
+                "context": {"type": "integer", "description": "Lines of context per match (default 2)"},
+                "max_matches": {"type": "integer", "description": "Matching lines to show (default 20)"},
+            },
+            "required": ["path", "pattern"],
+        },
+    },
+    {
+        "name": "read_output",
+        "description": (
+            "Page through the full output of a compacted tool result, by the handle it names. "
+            "Give start_line/end_line (line numbers of the full output) or a pattern to list "
+            "only the matching lines with context."
+        ),
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "Handle from the [Compacted: …] note"},
+                "start_line": {"type": "integer", "description": "First line (1-based)"},
+                "end_line": {"type": "integer", "description": "Last line (inclusive)"},
+                "pattern": {"type": "string", "description": "Text to find instead of a line range"},
+            },
+            "required": ["handle"],
         },
     },
 ]
@@ -272,7 +572,9 @@ TOOL_DEFINITIONS = [
 # ── Tool dispatcher ───────────────────────────────────────────────────────────
 
 TOOL_FUNCTIONS: dict = {
-    "take_screenshot":  lambda args: capture_and_encode(),
+    "take_screenshot":  lambda args: take_screenshot(
+        args.get("bbox"), args.get("window_title", ""), args.get("monitor"),
+    ),
     "get_screen_size":  lambda args: str(get_screen_size()),
     "click":            lambda args: click(args["x"], args["y"]),
     "double_click":     lambda args: double_click(args["x"], args["y"]),
@@ -282,11 +584,97 @@ TOOL_FUNCTIONS: dict = {
     "type_text":        lambda args: type_text(args["text"]),
     "press_key":        lambda args: press_key(args["key"]),
     "hotkey":           lambda args: hotkey(*args["keys"]),
+    "run_actions":              lambda args: run_actions(args["steps"]),
     "run_command":              lambda args: run_command(args["command"]),
     "list_windows":             lambda args: list_windows(args.get("title_filter", "")),
     "count_windows":            lambda args: count_windows(args["title"]),
     "focus_window":             lambda args: focus_window(args["title"]),
     "close_duplicate_windows":  lambda args: close_duplicate_windows(args["title"]),
     "wait":                     lambda args: wait(args["seconds"]),
-    "search_web":       lambda args: search_web(args["query"]),
+    "find_on_screen":   lambda args: find_on_screen(args["text"], args.get("refresh", False)),
+    "search_web":       lambda args: search_web(args.get("query", ""), args.get("queries")),
+    "verify":           lambda args: verify(args["checks"], args.get("timeout", 0)),
+    "find_files":       lambda args: find_files(
+        args.get("query", ""), args.get("ext", ""), args.get("under", ""),
+        args.get("limit", 20), args.get("refresh", False),
+    ),
+    "read_file":        lambda args: read_file(
+        args["path"], args.get("offset"), args.get("length"), args.get("start_line"), args.get("end_line"),
+    ),
+    "write_file":       lambda args: write_file(args["path"], args["content"], args.get("append", False)),
+    "grep_file":        lambda args: grep_file(
+        args["path"], args["pattern"], args.get("regex", False), args.get("ignore_case", True),
+        args.get("context", 2), args.get("max_matches", 20),
+    ),
+    "read_output":      lambda args: read_output(
+        args["handle"], args.get("start_line"), args.get("end_line"), args.get("pattern", ""),
+    ),
+}
+
+# Tools that never change what is on screen — the perception index survives them
+READ_ONLY_TOOLS = frozenset({
+    "take_screenshot", "get_screen_size", "list_windows", "count_windows",
+    "find_on_screen", "search_web", "request_tools", "find_files", "read_file", "grep_file", "verify",
+    "read_output",
+})
+
+
+# Tools that never drive the mouse, keyboard or screen — a headless task
+# limited to these can run alongside a GUI task (batch.py)
+HEADLESS_TOOLS = frozenset({
+    "run_command", "search_web", "wait", "list_windows", "count_windows",
+    "find_files", "read_file", "write_file", "grep_file", "verify", "read_output",
+})
+
+# Tools whose long text results are compacted (compaction.py) before they enter the history
+COMPACTED_TOOLS = frozenset({"run_command", "search_web"})
+
+# ── Tool registry ─────────────────────────────────────────────────────────────
+
+TOOL_GROUPS: dict[str, tuple[str, ...]] = {
+    "core":     ("take_screenshot", "run_actions", "run_command", "find_on_screen", "wait", "verify",
+                 "request_tools"),
+    "mouse":    ("click", "double_click", "right_click", "move_mouse", "scroll", "get_screen_size"),
+    "keyboard": ("type_text", "press_key", "hotkey"),
+    "windows":  ("list_windows", "count_windows", "focus_window", "close_duplicate_windows"),
+    "search":   ("search_web",),
+    "files":    ("find_files", "read_file", "write_file", "grep_file"),
+    "output":   ("read_output",),
 }
+
+_DEFINITIONS_BY_NAME = {d["name"]: d for d in TOOL_DEFINITIONS}
+_GROUP_OF = {name: group for group, names in TOOL_GROUPS.items() for name in names}
+
+
+def group_of(tool_name: str) -> str | None:
+    return _GROUP_OF.get(tool_name)
+
+
+def select_tools(groups) -> list[dict]:
+    """Tool definitions for the core set plus `groups`, in TOOL_DEFINITIONS order."""
+    wanted = {"core", *groups}
+    return [d for d in TOOL_DEFINITIONS if _GROUP_OF.get(d["name"]) in wanted]
+
+
+def estimate_tokens(obj) -> int:
+    """Rough token count of a JSON-serialisable object (~4 characters per token)."""
+    return len(json.dumps(obj, separators=(",", ":"), ensure_ascii=False)) // 4
+
+
+FULL_SCHEMA_TOKENS = estimate_tokens(TOOL_DEFINITIONS)
+
+
+# How tools mark a failure (they report errors as text): the result opens with
+# "Error" — run_actions when a step failed, run_command on a non-zero exit or a
+# timeout, every tool on a bad call — or "Unknown tool:", or ends with verify's
+# "Verification failed:" line. Anything else is output, whatever words it contains.
+_ERROR_START_RE = re.compile(r"Error\b|Unknown tool:")
+_VERIFY_FAILED = "Verification failed:"
+
+
+def is_error_result(result) -> bool:
+    """True if a tool's return value is an error report."""
+    if not isinstance(result, str):
+        return False
+    text = result.strip()
+    return bool(_ERROR_START_RE.match(text)) or text.rpartition("\n")[2].startswith(_VERIFY_FAILED)
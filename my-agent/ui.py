@@ -1,3 +1,5 @@
+import time
+
 from PyQt6.QtCore import Qt, QPoint, pyqtSignal
 from PyQt6.QtGui import QColor, QFont, QKeyEvent, QPainter, QPainterPath, QPixmap
 from PyQt6.QtWidgets import (
@@ -6,6 +8,7 @@ from PyQt6.QtWidgets import (
     QHBoxLayout,
     QLabel,
     QMainWindow,
+    QMenu,
     QPushButton,
     QScrollArea,
     QSizePolicy,
@@ -14,6 +17,10 @@ from PyQt6.QtWidgets import (
     QWidget,
 )
 
+import sessions
+
+HISTORY_MENU_SIZE = 15   # saved chats listed under "History"
+
 # ── Colours ───────────────────────────────────────────────────────────────────
 BG_DARK = "#0f0f1a"
 BG_PANEL = "#1a1a2e"
@@ -200,6 +207,8 @@ class ChatWindow(QMainWindow):
 
     send_message = pyqtSignal(str)
     new_chat_requested = pyqtSignal()
+    resume_requested = pyqtSignal(str)   # session id picked from the History menu
+    cancel_requested = pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -211,6 +220,8 @@ class ChatWindow(QMainWindow):
         self.resize(480, 700)
         self.setStyleSheet(GLOBAL_STYLE)
         self._is_busy = False
+        self._session: sessions.SessionReader | None = None   # reopened session being paged
+        self._loaded_from = 0                                  # first turn index on screen
         self._build_ui()
         self._center_on_screen()
 
@@ -243,8 +254,7 @@ class ChatWindow(QMainWindow):
         btn_layout.setContentsMargins(12, 6, 12, 6)
         btn_layout.addStretch()
 
-        new_btn = QPushButton("+ New Chat")
-        new_btn.setStyleSheet(f"""
+        row_btn_style = f"""
             QPushButton {{
                 background: transparent;
                 color: {TEXT_SECONDARY};
@@ -254,7 +264,19 @@ class ChatWindow(QMainWindow):
                 font-size: 12px;
             }}
             QPushButton:hover {{ color: {TEXT_PRIMARY}; border-color: {ACCENT}; }}
-        """)
+            QPushButton::menu-indicator {{ width: 0; }}
+        """
+
+        # Saved chats — the menu is filled from the session sidecars each time it opens
+        history_btn = QPushButton("History ▾")
+        history_btn.setStyleSheet(row_btn_style)
+        self._history_menu = QMenu(history_btn)
+        self._history_menu.aboutToShow.connect(self._fill_history_menu)
+        history_btn.setMenu(self._history_menu)
+        btn_layout.addWidget(history_btn)
+
+        new_btn = QPushButton("+ New Chat")
+        new_btn.setStyleSheet(row_btn_style)
         new_btn.clicked.connect(self._on_new_chat)
         btn_layout.addWidget(new_btn)
         vbox.addWidget(btn_row)
@@ -278,7 +300,24 @@ class ChatWindow(QMainWindow):
         self._messages_layout.addStretch()
 
         self._scroll.setWidget(self._messages_widget)
+
+        # Older turns of a reopened session are paged in on demand
+        self._earlier_btn = QPushButton("↑ Earlier messages")
+        self._earlier_btn.setStyleSheet(f"""
+            QPushButton {{
+                background: {BG_DARK};
+                color: {TEXT_SECONDARY};
+                border: none;
+                padding: 4px;
+                font-size: 12px;
+            }}
+            QPushButton:hover {{ color: {TEXT_PRIMARY}; }}
+        """)
+        self._earlier_btn.clicked.connect(self._load_earlier)
+        self._earlier_btn.hide()
+        vbox.addWidget(self._earlier_btn)
         vbox.addWidget(self._scroll, stretch=1)
+        self._scroll.verticalScrollBar().valueChanged.connect(self._on_scrolled)
 
         # Action status bar (single line, updates in-place — no bubble spam)
         self._action_bar = QLabel("")
@@ -339,6 +378,24 @@ class ChatWindow(QMainWindow):
             QPushButton:disabled {{ background: {BORDER}; color: {TEXT_ACTION}; }}
         """)
         self._send_btn.clicked.connect(self._on_send)
+
+        # Stop button — cancels the running task and everything queued behind it
+        self._stop_btn = QPushButton("■ Stop")
+        self._stop_btn.setFixedHeight(36)
+        self._stop_btn.setStyleSheet(f"""
+            QPushButton {{
+                background: transparent;
+                color: {TEXT_SECONDARY};
+                border: 1px solid {BORDER};
+                border-radius: 8px;
+                padding: 0 14px;
+                font-size: 13px;
+            }}
+            QPushButton:hover {{ color: #ef4444; border-color: #ef4444; }}
+        """)
+        self._stop_btn.clicked.connect(self.cancel_requested)
+        self._stop_btn.hide()
+        send_row.addWidget(self._stop_btn)
         send_row.addWidget(self._send_btn)
         input_layout.addLayout(send_row)
 
@@ -348,8 +405,9 @@ class ChatWindow(QMainWindow):
         self._add_bubble("Hello! I'm your AI agent. I can control your computer, search the web, run commands, and help with anything you need. What can I do for you?", "agent")
 
     def _on_send(self):
+        # Sending while busy is allowed — the message queues behind the running task
         text = self._input.toPlainText().strip()
-        if not text or self._is_busy:
+        if not text:
             return
         self._input.clear()
         self._add_bubble(text, "user")
@@ -357,13 +415,69 @@ class ChatWindow(QMainWindow):
         self.send_message.emit(text)
 
     def _on_new_chat(self):
-        # Clear messages
+        self._clear_bubbles()
+        self._add_bubble("New conversation started. What can I do for you?", "agent")
+        self.new_chat_requested.emit()
+
+    def _clear_bubbles(self):
         while self._messages_layout.count() > 1:  # keep the stretch
             item = self._messages_layout.takeAt(0)
             if item.widget():
                 item.widget().deleteLater()
-        self._add_bubble("New conversation started. What can I do for you?", "agent")
-        self.new_chat_requested.emit()
+        self._session = None
+        self._earlier_btn.hide()
+
+    # ── Saved sessions ────────────────────────────────────────────────────────
+
+    def _fill_history_menu(self):
+        self._history_menu.clear()
+        saved = sessions.list_sessions(HISTORY_MENU_SIZE)
+        if not saved:
+            self._history_menu.addAction("No saved chats yet").setEnabled(False)
+            return
+        for meta in saved:
+            when = time.strftime("%d %b %H:%M", time.localtime(meta["updated"]))
+            label = f"{when} · {meta['title'] or 'Untitled'} ({len(meta['turns'])})"
+            action = self._history_menu.addAction(label)
+            action.triggered.connect(lambda _checked=False, sid=meta["id"]: self._open_session(sid))
+
+    def _open_session(self, session_id: str):
+        """Show the last page of a saved chat and ask the worker to continue it."""
+        try:
+            reader = sessions.SessionReader(session_id)
+        except (OSError, ValueError) as e:
+            self.on_error(f"Could not open the saved chat: {e}")
+            return
+        self._clear_bubbles()
+        self._session = reader
+        self._loaded_from = len(reader)
+        self._load_earlier()
+        self.resume_requested.emit(session_id)
+
+    def _load_earlier(self):
+        """Insert the previous page of turns above what is shown, keeping the view in place."""
+        if self._session is None or self._loaded_from == 0:
+            return
+        first = len(self._session) == self._loaded_from
+        start = max(self._loaded_from - sessions.PAGE_TURNS, 0)
+        try:
+            turns = self._session.turns(start, self._loaded_from)
+        except (OSError, ValueError) as e:
+            self.on_error(f"Could not read the saved chat: {e}")
+            return
+        self._loaded_from = start
+        vsb = self._scroll.verticalScrollBar()
+        from_bottom = vsb.maximum() - vsb.value()
+        bubbles = [(role, text) for turn in turns for role, text in turn["bubbles"]]
+        for i, (role, text) in enumerate(bubbles):
+            self._messages_layout.insertWidget(i, ChatBubble(text, role))
+        self._earlier_btn.setVisible(start > 0)
+        QApplication.processEvents()
+        vsb.setValue(vsb.maximum() if first else vsb.maximum() - from_bottom)
+
+    def _on_scrolled(self, value: int):
+        if value == 0 and self._session is not None and self._loaded_from > 0:
+            self._load_earlier()
 
     def _add_bubble(self, text: str, role: str):
         bubble = ChatBubble(text, role)
@@ -375,6 +489,11 @@ class ChatWindow(QMainWindow):
         vsb = self._scroll.verticalScrollBar()
         vsb.setValue(vsb.maximum())
 
+    def show_external_message(self, text: str):
+        """A task submitted from outside the window (agent.py); shown like a sent message."""
+        self._add_bubble(text, "user")
+        self._set_busy(True)
+
     def on_agent_message(self, text: str):
         self._add_bubble(text, "agent")
 
@@ -384,18 +503,24 @@ class ChatWindow(QMainWindow):
 
     def on_error(self, msg: str):
         self._add_bubble(msg, "error")
-        self._set_busy(False)
 
     def on_done(self):
         self._action_bar.hide()
         self._action_bar.setText("")
-        self._set_busy(False)
 
-    def _set_busy(self, busy: bool):
+    def on_queue_changed(self, unfinished: int):
+        """Worker's count of queued + running tasks; 0 means idle."""
+        self._set_busy(unfinished > 0, queued=max(unfinished - 1, 0))
+
+    def _set_busy(self, busy: bool, queued: int = 0):
         self._is_busy = busy
-        self._send_btn.setEnabled(not busy)
-        self._send_btn.setText("Thinking…" if busy else "Send ▶")
-        self._input.setEnabled(not busy)
+        self._stop_btn.setVisible(busy)
+        if not busy:
+            self._send_btn.setText("Send ▶")
+        elif queued:
+            self._send_btn.setText(f"Queue ▶ ({queued} waiting)")
+        else:
+            self._send_btn.setText("Queue ▶")
 
     def _center_on_screen(self):
         screen = QApplication.primaryScreen().availableGeometry()
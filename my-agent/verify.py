@@ -0,0 +1,205 @@
+"""
+verify.py — Local success checks for the verify tool.
+
+Confirming a task used to mean one more full screenshot round trip. The
+verify tool instead evaluates a list of assertions on this machine and
+returns a few lines of text:
+
+    window     {"title": "Notepad", "foreground": true}
+    process    {"name": "notepad.exe"}
+    file       {"path": "…\\out.txt", "contains": "hello", "modified_within": 60}
+    clipboard  {"contains": "…"} or {"equals": "…"}
+    screen     {"bbox": [left, top, width, height]} — the region differs from the
+               last full screenshot the model was shown (set_baseline)
+
+Any check can be inverted with "not": true (window closed, process gone,
+region unchanged). With a timeout the checks are re-evaluated every
+POLL_INTERVAL seconds until all pass, so "wait until saved" needs no
+separate wait.
+
+Optional: psutil for the process check (falls back to tasklist / ps).
+"""
+
+import fnmatch
+import io
+import mmap
+import os
+import subprocess
+import threading
+import time
+
+MAX_TIMEOUT = 10.0
+POLL_INTERVAL = 0.25
+MAX_CONTAINS_BYTES = 256 << 20   # file "contains" checks stop after this much
+
+CHECK_TYPES = ("window", "process", "file", "clipboard", "screen")
+
+_baseline_lock = threading.Lock()
+_baseline_png: bytes | None = None
+_baseline_thumbs: dict[tuple, object] = {}
+
+
+def set_baseline(png: bytes) -> None:
+    """Remember the full screenshot the model just received (screen checks compare against it)."""
+    global _baseline_png
+    with _baseline_lock:
+        _baseline_png = png
+        _baseline_thumbs.clear()
+
+
+# ── Front end ─────────────────────────────────────────────────────────────────
+
+def verify(checks: list[dict], timeout: float = 0.0) -> str:
+    """Evaluate `checks` (retrying up to `timeout` s until all pass) and report each one."""
+    if not isinstance(checks, list) or not checks:
+        return "Error: verify needs a non-empty list of checks."
+    deadline = time.monotonic() + min(max(float(timeout or 0), 0.0), MAX_TIMEOUT)
+    while True:
+        results = [_evaluate(check) for check in checks]
+        passed = sum(ok for ok, _ in results)
+        if passed == len(results) or time.monotonic() >= deadline:
+            break
+        from controller import sleep_or_abort
+        sleep_or_abort(POLL_INTERVAL)
+
+    lines = [f"{'✔' if ok else '✖'} {text}" for ok, text in results]
+    if passed == len(results):
+        lines.append(f"All {len(results)} check(s) passed.")
+    else:
+        lines.append(f"Verification failed: {len(results) - passed} of {len(results)} check(s).")
+    return "\n".join(lines)
+
+
+def _evaluate(check) -> tuple[bool, str]:
+    if not isinstance(check, dict) or check.get("type") not in CHECK_TYPES:
+        kind = check.get("type") if isinstance(check, dict) else check
+        return False, f"unknown check {kind!r} (types: {', '.join(CHECK_TYPES)})"
+    try:
+        ok, what, detail = _CHECKS[check["type"]](check)
+    except Exception as e:
+        return False, f"{check['type']} check could not run: {e}"
+    if check.get("not"):
+        ok, what = not ok, f"NOT ({what})"
+    return ok, what if ok or not detail else f"{what} — {detail}"
+
+
+# ── Checks ────────────────────────────────────────────────────────────────────
+# Each returns (condition holds, description, detail shown when the check fails).
+
+def _check_window(check: dict) -> tuple[bool, str, str]:
+    import pygetwindow as gw
+    title = str(check.get("title", "")).strip()
+    if not title:
+        raise ValueError("window check needs a title")
+    needle = title.lower()
+    if check.get("foreground"):
+        active = gw.getActiveWindow()
+        current = active.title if active else ""
+        return needle in current.lower(), f"window '{title}' is in the foreground", f"foreground is '{current}'"
+    titles = [t for t in gw.getAllTitles() if t.strip()]
+    found = [t for t in titles if needle in t.lower()]
+    return bool(found), f"window '{title}' is open" + (f" ({found[0]})" if found else ""), "no such window"
+
+
+def _check_process(check: dict) -> tuple[bool, str, str]:
+    name = str(check.get("name", "")).strip().lower()
+    if not name:
+        raise ValueError("process check needs a name")
+    wanted = {name, name[:-4] if name.endswith(".exe") else name + ".exe"}
+    running = _process_names()
+    hits = [n for n in running if n in wanted or fnmatch.fnmatch(n, name)]
+    return bool(hits), f"process '{name}' is running", "not running"
+
+
+def _process_names() -> set[str]:
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return {(p.info["name"] or "").lower() for p in psutil.process_iter(["name"])}
+    if os.name == "nt":
+        out = subprocess.run(["tasklist", "/FO", "CSV", "/NH"], capture_output=True, text=True,
+                             timeout=10, creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)).stdout
+        return {line.split('","')[0].strip('"').lower() for line in out.splitlines() if line}
+    out = subprocess.run(["ps", "-A", "-o", "comm="], capture_output=True, text=True, timeout=10).stdout
+    return {os.path.basename(line.strip()).lower() for line in out.splitlines() if line.strip()}
+
+
+def _check_file(check: dict) -> tuple[bool, str, str]:
+    from fileio import resolve
+    path = resolve(check.get("path", ""))
+    what = f"file {path} exists"
+    try:
+        st = path.stat()
+    except OSError:
+        return False, what, "not found"
+    if "min_size" in check:
+        what += f", ≥ {int(check['min_size'])} bytes"
+        if st.st_size < int(check["min_size"]):
+            return False, what, f"size is {st.st_size}"
+    if "modified_within" in check:
+        age = time.time() - st.st_mtime
+        what += f", modified in the last {float(check['modified_within']):.0f} s"
+        if age > float(check["modified_within"]):
+            return False, what, f"last modified {age:.0f} s ago"
+    if check.get("contains"):
+        needle = str(check["contains"])
+        what += f", contains {needle!r}"
+        if not _file_contains(path, st.st_size, needle.encode("utf-8")):
+            return False, what, "text not found"
+    return True, what, ""
+
+
+def _file_contains(path, size: int, needle: bytes) -> bool:
+    if size == 0:
+        return False
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+            return blob.find(needle, 0, min(size, MAX_CONTAINS_BYTES)) >= 0
+
+
+def _check_clipboard(check: dict) -> tuple[bool, str, str]:
+    import pyperclip
+    text = pyperclip.paste() or ""
+    preview = text[:80].replace("\n", "⏎")
+    if "equals" in check:
+        expected = str(check["equals"])
+        return text.strip() == expected.strip(), f"clipboard equals {expected[:80]!r}", f"clipboard is {preview!r}"
+    expected = str(check.get("contains", ""))
+    return expected in text, f"clipboard contains {expected[:80]!r}", f"clipboard is {preview!r}"
+
+
+def _check_screen(check: dict) -> tuple[bool, str, str]:
+    from PIL import Image
+
+    from vision import capture_screenshot, thumbnail, thumbnails_differ
+    bbox = check.get("bbox")
+    if not (isinstance(bbox, list) and len(bbox) == 4):
+        raise ValueError("screen check needs bbox [left, top, width, height]")
+    left, top, width, height = (int(v) for v in bbox)
+    key = (left, top, width, height)
+    with _baseline_lock:
+        png, before = _baseline_png, _baseline_thumbs.get(key)
+    if png is None:
+        raise ValueError("no full screenshot yet to compare against")
+    if before is None:
+        image = Image.open(io.BytesIO(png))
+        if left < 0 or top < 0 or left + width > image.width or top + height > image.height:
+            raise ValueError(f"bbox lies outside the last screenshot ({image.width}x{image.height})")
+        before = thumbnail(image.crop((left, top, left + width, top + height)))
+        with _baseline_lock:
+            if _baseline_png is png:
+                _baseline_thumbs[key] = before
+    after = thumbnail(capture_screenshot(key))
+    return (thumbnails_differ(before, after),
+            f"screen region {list(key)} changed since the last screenshot", "looks the same")
+
+
+_CHECKS = {
+    "window": _check_window,
+    "process": _check_process,
+    "file": _check_file,
+    "clipboard": _check_clipboard,
+    "screen": _check_screen,
+}
@@ -2,27 +2,68 @@
 vision.py — Perception / screen-capture module.
 
 Responsibilities:
-  - Capture a screenshot of the primary monitor
-  - Compress and encode it as Base64 PNG for the Anthropic API
+  - Capture a screenshot of the primary monitor, one monitor, one window or
+    an arbitrary bounding box
+  - Compress it to PNG bytes (screenshots.py stores them; Base64 only
+    happens when a request is serialized)
+
+Scoped captures are cropped straight out of the grab, before PNG encoding,
+so a small region costs a fraction of a full-frame encode and upload.
+
+thumbnail() / thumbnails_differ() are the cheap "did this change?" test
+shared by the screen watcher and the verify tool: a small grayscale copy,
+compared with a per-pixel tolerance so a blinking caret or a clock tick
+inside a large area doesn't count.
+
+downscale_png() shrinks an already-encoded screenshot for budget.py.
 """
 
 import base64
+import ctypes
 import io
 
 import pyautogui
-from PIL import Image
+from PIL import Image, ImageChops, ImageGrab
 
+THUMB_SIZE = (96, 54)   # change-detection thumbnail
+CHANGE_LEVEL = 8        # thumbnail pixel delta (0-255) that counts as a change
 
-def capture_screenshot() -> Image.Image:
-    """Return a PIL Image of the entire primary monitor."""
-    return pyautogui.screenshot()
 
+def capture_screenshot(region: tuple[int, int, int, int] | None = None) -> Image.Image:
+    """
+    Return a PIL Image of the entire primary monitor, or of `region`.
 
-def encode_to_base64(image: Image.Image) -> str:
-    """Compress a PIL Image to PNG and return a Base64-encoded string."""
+    `region` is (left, top, width, height) in virtual-desktop pixels and may
+    lie on any monitor (negative coordinates included).
+    """
+    if region is None:
+        return pyautogui.screenshot()
+    left, top, width, height = region
+    return ImageGrab.grab(bbox=(left, top, left + width, top + height), all_screens=True)
+
+
+def encode_png(image: Image.Image) -> bytes:
+    """Compress a PIL Image to PNG bytes."""
     buf = io.BytesIO()
     image.save(buf, format="PNG", optimize=True)
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
+    return buf.getvalue()
+
+
+def downscale_png(png: bytes, factor: float) -> bytes:
+    """Re-encode a PNG at `factor` of its size (older screenshots, when a request runs over budget)."""
+    image = Image.open(io.BytesIO(png))
+    size = (max(int(image.width * factor), 1), max(int(image.height * factor), 1))
+    return encode_png(image.resize(size, Image.LANCZOS))
+
+
+def encode_to_base64(image: Image.Image) -> str:
+    """Compress a PIL Image to PNG and return a Base64-encoded string."""
+    return base64.b64encode(encode_png(image)).decode("utf-8")
+
+
+def capture_png() -> bytes:
+    """Capture the screen and return it as PNG bytes (one-liner helper)."""
+    return encode_png(capture_screenshot())
 
 
 def capture_and_encode() -> str:
@@ -30,6 +71,122 @@ def capture_and_encode() -> str:
     return encode_to_base64(capture_screenshot())
 
 
+def capture_scoped(
+    bbox: list | None = None,
+    window_title: str = "",
+    monitor: int | None = None,
+) -> dict:
+    """
+    Capture a region chosen by bounding box, window title or monitor index.
+
+    Returns {"png": <PNG bytes>, "region": (left, top, width, height) | None}.
+    "region" is None for a plain full-screen capture; otherwise it is the
+    screen rectangle the image was cropped from, so callers can map
+    image-relative coordinates back to screen pixels.
+    """
+    region = resolve_region(bbox=bbox, window_title=window_title, monitor=monitor)
+    return {"png": encode_png(capture_screenshot(region)), "region": region}
+
+
+# ── Change detection ──────────────────────────────────────────────────────────
+
+def thumbnail(image: Image.Image) -> Image.Image:
+    """Small grayscale copy of `image` for thumbnails_differ() (never larger than the image)."""
+    size = (min(THUMB_SIZE[0], image.width), min(THUMB_SIZE[1], image.height))
+    return image.convert("L").resize(size)
+
+
+def thumbnails_differ(a: Image.Image, b: Image.Image) -> bool:
+    """True if any thumbnail pixel moved by more than CHANGE_LEVEL (or the sizes differ)."""
+    if a.size != b.size:
+        return True
+    return ImageChops.difference(a, b).point(lambda v: 255 if v > CHANGE_LEVEL else 0).getbbox() is not None
+
+
+# ── Region resolution ─────────────────────────────────────────────────────────
+
+def resolve_region(
+    bbox: list | None = None,
+    window_title: str = "",
+    monitor: int | None = None,
+) -> tuple[int, int, int, int] | None:
+    """
+    Turn the optional screenshot scope arguments into (left, top, width, height).
+
+    Precedence: bbox, then window_title, then monitor. Returns None when no
+    scope was requested. Raises ValueError for an unknown window or monitor.
+    """
+    if bbox:
+        left, top, width, height = (int(round(float(v))) for v in bbox)
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Bounding box must have a positive size, got {bbox}")
+        return left, top, width, height
+
+    if window_title:
+        import pygetwindow as gw
+        matches = [w for w in gw.getWindowsWithTitle(window_title) if w.width > 0 and w.height > 0]
+        if not matches:
+            raise ValueError(f"No window found with title containing '{window_title}'")
+        win = matches[0]
+        return win.left, win.top, win.width, win.height
+
+    if monitor is not None:
+        monitors = list_monitors()
+        index = int(monitor)
+        if not 0 <= index < len(monitors):
+            raise ValueError(f"Monitor {index} does not exist ({len(monitors)} connected)")
+        return monitors[index]
+
+    return None
+
+
+def list_monitors() -> list[tuple[int, int, int, int]]:
+    """
+    Return every monitor as (left, top, width, height), primary first.
+
+    Uses EnumDisplayMonitors on Windows; elsewhere only the primary monitor
+    is reported.
+    """
+    try:
+        return _list_monitors_win32()
+    except Exception:
+        w, h = pyautogui.size()
+        return [(0, 0, w, h)]
+
+
+def _list_monitors_win32() -> list[tuple[int, int, int, int]]:
+    from ctypes import wintypes
+
+    class _MonitorInfo(ctypes.Structure):
+        _fields_ = [
+            ("cbSize", wintypes.DWORD),
+            ("rcMonitor", wintypes.RECT),
+            ("rcWork", wintypes.RECT),
+            ("dwFlags", wintypes.DWORD),
+        ]
+
+    user32 = ctypes.windll.user32
+    found: list[tuple[bool, tuple[int, int, int, int]]] = []
+
+    def _callback(hmonitor, _hdc, _rect, _data):
+        info = _MonitorInfo()
+        info.cbSize = ctypes.sizeof(_MonitorInfo)
+        user32.GetMonitorInfoW(hmonitor, ctypes.byref(info))
+        r = info.rcMonitor
+        is_primary = bool(info.dwFlags & 1)  # MONITORINFOF_PRIMARY
+        found.append((is_primary, (r.left, r.top, r.right - r.left, r.bottom - r.top)))
+        return True
+
+    proc = ctypes.WINFUNCTYPE(
+        ctypes.c_int, wintypes.HMONITOR, wintypes.HDC, ctypes.POINTER(wintypes.RECT), wintypes.LPARAM
+    )
+    user32.EnumDisplayMonitors(None, None, proc(_callback), 0)
+    if not found:
+        raise OSError("EnumDisplayMonitors returned no monitors")
+    found.sort(key=lambda item: not item[0])   # primary first, then OS order
+    return [rect for _, rect in found]
+
+
 def get_screen_size() -> dict:
     """Return the primary screen resolution as {width, height}."""
     w, h = pyautogui.size()
@@ -0,0 +1,137 @@
+"""
+watcher.py — Background screen watcher (opt-in: AGENT_SCREEN_WATCHER=on).
+
+While a task runs, a daemon thread grabs the full screen at a low,
+adaptive rate:
+
+  - each grab is reduced to a small grayscale thumbnail and compared with
+    the previous one (vision.thumbnails_differ); only a frame that actually
+    changed is PNG-encoded
+  - the interval starts at MIN_INTERVAL after a change or a poke() (the
+    agent pokes after every action) and doubles on each unchanged grab, up
+    to MAX_INTERVAL, so an idle screen costs a grab every couple of seconds
+
+The last RING_SIZE distinct frames are kept, already encoded, in a ring
+buffer. frame_after(t) hands the agent a frame known to be current as of
+time t, usually at once.
+
+All times are time.monotonic() values.
+"""
+
+import threading
+import time
+from collections import deque
+
+MIN_INTERVAL = 0.25     # seconds between grabs right after a change
+MAX_INTERVAL = 2.0      # seconds between grabs on an idle screen
+RING_SIZE = 4           # distinct encoded frames kept
+
+
+class Frame:
+    """One distinct screen state."""
+
+    __slots__ = ("png", "thumb", "changed_at", "confirmed_at")
+
+    def __init__(self, png: bytes, thumb, grabbed_at: float):
+        self.png = png
+        self.thumb = thumb
+        self.changed_at = grabbed_at      # first grab that showed this state
+        self.confirmed_at = grabbed_at    # latest grab that still showed it
+
+
+class ScreenWatcher:
+    """Captures in the background while resumed; see the module docstring."""
+
+    def __init__(self):
+        self._frames: deque[Frame] = deque(maxlen=RING_SIZE)
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._active = threading.Event()
+        self._stopped = False
+        self._interval = MIN_INTERVAL
+        self._thread: threading.Thread | None = None
+
+    # ── Control ───────────────────────────────────────────────────────────────
+
+    def resume(self) -> None:
+        """Start (or continue) watching — call when a task starts."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="screen-watcher", daemon=True)
+            self._thread.start()
+        self._interval = MIN_INTERVAL
+        self._active.set()
+        self._wake.set()
+
+    def pause(self) -> None:
+        """Stop grabbing until the next resume() — call when a task ends."""
+        self._active.clear()
+
+    def poke(self) -> None:
+        """Something on screen is probably changing: grab again now and stay fast."""
+        self._interval = MIN_INTERVAL
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._active.set()
+        self._wake.set()
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def latest(self) -> Frame | None:
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def frame_after(self, t: float, timeout: float = 1.0) -> Frame | None:
+        """
+        A frame whose content was still on screen at or after `t`, waiting up
+        to `timeout` seconds for the next grab. None if the watcher is paused
+        or too slow — the caller then captures on its own.
+        """
+        if not self._active.is_set():
+            return None
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            frame = self._frames[-1] if self._frames else None
+            if frame is not None and frame.confirmed_at >= t:
+                return frame
+            self.poke()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+                frame = self._frames[-1] if self._frames else None
+                if frame is not None and frame.confirmed_at >= t:
+                    return frame
+
+    # ── Thread ────────────────────────────────────────────────────────────────
+
+    def _loop(self) -> None:
+        from vision import capture_screenshot, encode_png, thumbnail, thumbnails_differ
+
+        while not self._stopped:
+            self._active.wait()
+            if self._stopped:
+                return
+            self._wake.clear()
+            grabbed_at = time.monotonic()
+            try:
+                image = capture_screenshot()
+                thumb = thumbnail(image)
+                previous = self.latest()
+                if previous is not None and not thumbnails_differ(previous.thumb, thumb):
+                    with self._cond:
+                        previous.confirmed_at = grabbed_at
+                        self._cond.notify_all()
+                    self._interval = min(self._interval * 2, MAX_INTERVAL)
+                else:
+                    frame = Frame(encode_png(image), thumb, grabbed_at)
+                    with self._cond:
+                        self._frames.append(frame)
+                        self._cond.notify_all()
+                    self._interval = MIN_INTERVAL
+            except Exception:
+                self._interval = MAX_INTERVAL   # locked screen, UAC prompt …: back off
+            self._wake.wait(self._interval)
+